@@ -0,0 +1,277 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+from datetime import datetime
+from time import mktime
+from urllib.parse import urlparse, urlencode
+from wsgiref.handlers import format_date_time
+import aiohttp
+from mock_server import MockAIServer
+from tts_pool import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# 请求参数的默认值，同时也是回答缓存键的一部分
+CHAT_TEMPERATURE = 0.5
+CHAT_MAX_TOKENS = 4096
+
+
+class AIBackend:
+    """AI后端接口
+
+    stream(prompt, on_delta, temperature, max_tokens) 是在共享 AIClient 事件循环中运行的协程：
+    每收到一段增量文本就回调 on_delta，返回完整回答。chat() 在其外面套上本后端的限制：
+    同时进行的请求数（max_concurrency）、每秒发起的请求数（max_qps，0 为不限）和单次请求的超时（timeout 秒）。
+    cache_id 区分不同的后端和模型，作为回答缓存键的一部分。
+    """
+
+    def __init__(self, config, client):
+        """config 为该模型在配置文件中的一项，client 为共享的 AIClient"""
+        self.config = config
+        self.client = client
+        self.max_concurrency = max(1, int(config.get("max_concurrency", 3)))
+        self.max_qps = float(config.get("max_qps", 0) or 0)
+        self.timeout = float(config.get("timeout", 120))
+        self._slots = None
+        self.limiter = RateLimiter(self.max_qps)
+
+    @property
+    def cache_id(self):
+        return self.config.get("backend", "")
+
+    async def chat(self, prompt, on_delta=None, temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS):
+        """在本后端的并发、频率和超时限制下执行一次请求，返回完整回答"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        async with self._slots:
+            delay = self.limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                return await asyncio.wait_for(self.stream(prompt, on_delta, temperature, max_tokens), self.timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"请求超时（{self.timeout:g} 秒）") from None
+
+    async def stream(self, prompt, on_delta=None, temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS):
+        """发出请求并以流式接收回答"""
+        raise NotImplementedError
+
+
+class Ws_Param(object):
+    """WebSocket参数类"""
+
+    def __init__(self, APPID, APIKey, APISecret, gpt_url):
+        """初始化WebSocket参数"""
+        self.APPID = APPID
+        self.APIKey = APIKey
+        self.APISecret = APISecret
+        self.host = urlparse(gpt_url).netloc
+        self.path = urlparse(gpt_url).path
+        self.gpt_url = gpt_url
+
+    def create_url(self):
+        """生成WebSocket连接URL"""
+        now = datetime.now()
+        date = format_date_time(mktime(now.timetuple()))
+
+        signature_origin = "host: " + self.host + "\n"
+        signature_origin += "date: " + date + "\n"
+        signature_origin += "GET " + self.path + " HTTP/1.1"
+
+        signature_sha = hmac.new(self.APISecret.encode('utf-8'),
+                               signature_origin.encode('utf-8'),
+                               digestmod=hashlib.sha256).digest()
+
+        signature_sha_base64 = base64.b64encode(signature_sha).decode(encoding='utf-8')
+
+        authorization_origin = f'api_key="{self.APIKey}", algorithm="hmac-sha256", headers="host date request-line", signature="{signature_sha_base64}"'
+
+        authorization = base64.b64encode(authorization_origin.encode('utf-8')).decode(encoding='utf-8')
+
+        v = {
+            "authorization": authorization,
+            "date": date,
+            "host": self.host
+        }
+        url = self.gpt_url + '?' + urlencode(v)
+        logger.debug(f"Generated URL: {url}")
+        return url
+
+
+class SparkBackend(AIBackend):
+    """讯飞星火（WebSocket 接口）
+
+    每次回答结束后由服务端关闭连接，连接本身无法复用，复用的是 DNS 解析结果。
+    """
+
+    def __init__(self, config, client):
+        """读取 app_id、api_key、api_secret、api_url 和 domain，去掉首尾空白并补上默认接口地址"""
+        super().__init__(config, client)
+        self.app_id = config.get("app_id", "").strip()
+        self.api_key = config.get("api_key", "").strip()
+        self.api_secret = config.get("api_secret", "").strip()
+        self.api_url = config.get("api_url", "").strip() or "wss://spark-api.xf-yun.com/v1.1/chat"
+        self.domain = config.get("domain", "lite")
+
+    @property
+    def cache_id(self):
+        # 与按模型区分缓存之前的键保持一致，已有的缓存继续有效
+        return self.domain
+
+    async def stream(self, prompt, on_delta=None, temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS):
+        """调用讯飞星火API，返回完整回答；传入 on_delta 时每收到一段增量文本就立即回调"""
+        wsParam = Ws_Param(
+            APPID=self.app_id,
+            APIKey=self.api_key,
+            APISecret=self.api_secret,
+            gpt_url=self.api_url
+        )
+        response_content = []
+        ws = await self.client.open_websocket(wsParam.create_url())
+        try:
+            await ws.send_str(json.dumps(gen_params(
+                appid=self.app_id,
+                query=prompt,
+                domain=self.domain,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )))
+            while True:
+                message = await ws.receive()
+                if message.type == aiohttp.WSMsgType.ERROR:
+                    raise ValueError(f"WebSocket连接出错: {ws.exception()}")
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    raise ValueError("WebSocket连接在回答结束前关闭")
+                data = json.loads(message.data)
+                code = data['header']['code']
+                if code != 0:
+                    raise ValueError(f'请求错误: {code}, {data}')
+
+                choices = data["payload"]["choices"]
+                content = choices["text"][0]["content"]
+                response_content.append(content)
+                if on_delta is not None and content:
+                    on_delta(content)
+                if choices["status"] == 2:
+                    break
+        finally:
+            await ws.close()
+            logger.debug("WebSocket连接关闭")
+        return "".join(response_content)
+
+
+class OpenAICompatibleBackend(AIBackend):
+    """OpenAI 兼容的 HTTP 接口（/v1/chat/completions，SSE 流式返回），例如本机的 llama.cpp server"""
+
+    def __init__(self, config, client):
+        """读取 api_url（完整的 chat/completions 地址）、api_key 和 model"""
+        super().__init__(config, client)
+        self.api_url = config.get("api_url", "").strip() or "http://127.0.0.1:8080/v1/chat/completions"
+        self.api_key = config.get("api_key", "").strip()
+        self.model = config.get("model", "").strip()
+
+    @property
+    def cache_id(self):
+        return f"openai/{self.api_url}/{self.model}"
+
+    async def stream(self, prompt, on_delta=None, temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS):
+        """发送流式对话请求，逐个解析 SSE 事件中的增量文本"""
+        body = json.dumps({
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }, ensure_ascii=False).encode('utf-8')
+        headers = {"Accept": "text/event-stream"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+
+        response_content = []
+        async for line in self.client.post_lines(self.api_url, body, headers):
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+            data = json.loads(payload)
+            if "error" in data:
+                raise ValueError(f"请求错误: {data['error']}")
+            choices = data.get("choices") or [{}]
+            content = (choices[0].get("delta") or {}).get("content") or ""
+            response_content.append(content)
+            if on_delta is not None and content:
+                on_delta(content)
+        return "".join(response_content)
+
+
+class MockBackend(OpenAICompatibleBackend):
+    """本地模拟服务：第一次请求时在共享事件循环中启动 MockAIServer，再按 OpenAI 兼容接口访问它
+
+    不需要网络和账号，回答由提示词确定；latency、tokens_per_second、response_tokens 控制模拟的首字延迟、
+    输出速度和回答长度，用于离线测试和压测。
+    """
+
+    def __init__(self, config, client):
+        """读取模拟服务的参数"""
+        super().__init__(config, client)
+        self.server = MockAIServer(latency=float(config.get("latency", 0.2)),
+                                   tokens_per_second=float(config.get("tokens_per_second", 50)),
+                                   response_tokens=int(config.get("response_tokens", 64)),
+                                   max_concurrency=int(config.get("server_concurrency", 8)))
+        self.model = "mock"
+        self._started = None
+
+    @property
+    def cache_id(self):
+        return f"mock/{self.server.response_tokens}"
+
+    async def stream(self, prompt, on_delta=None, temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS):
+        """按需启动模拟服务后发送请求"""
+        if self._started is None:
+            self._started = asyncio.ensure_future(self.server.start())
+        await asyncio.shield(self._started)
+        self.api_url = self.server.url
+        return await super().stream(prompt, on_delta, temperature, max_tokens)
+
+
+# 后端类型 -> 后端类，配置项中的 "backend" 字段选择其中之一
+BACKENDS = {
+    "spark": SparkBackend,
+    "openai": OpenAICompatibleBackend,
+    "mock": MockBackend,
+}
+
+
+def create_backend(config, client):
+    """按配置创建后端，没有 backend 字段的旧配置视为讯飞星火"""
+    kind = config.get("backend", "spark")
+    if kind not in BACKENDS:
+        raise ValueError(f"未知的AI后端类型: {kind}")
+    return BACKENDS[kind](config, client)
+
+
+def gen_params(appid, query, domain, temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS):
+    """生成请求参数"""
+    return {
+        "header": {
+            "app_id": appid,
+            "uid": "1234",
+        },
+        "parameter": {
+            "chat": {
+                "domain": domain,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "auditing": "default",
+            }
+        },
+        "payload": {
+            "message": {
+                "text": [{"role": "user", "content": query}]
+            }
+        }
+    }
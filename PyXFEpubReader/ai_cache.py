@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class AIResponseCache:
+    """AI回答的磁盘缓存（SQLite）：以提示词、模型标识、temperature 和 max_tokens 的哈希为键
+
+    超过 ttl 秒的回答视为过期；总大小超过 max_bytes 时按最近使用时间淘汰。
+    """
+
+    def __init__(self, db_path, ttl=7 * 24 * 3600, max_bytes=64 * 1024 * 1024):
+        """打开（必要时创建）缓存数据库"""
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self.conn.commit()
+
+    @staticmethod
+    def key_of(prompt, model, temperature, max_tokens):
+        """由提示词和模型参数生成缓存键，model 区分不同的后端和模型"""
+        payload = json.dumps([prompt, model, temperature, max_tokens], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """读取未过期的回答并更新最近使用时间，没有时返回 None"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created = row
+            if now - created > self.ttl:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            return response
+
+    def put(self, key, response):
+        """写入回答，之后清理过期项并在超出大小上限时淘汰最久未使用的回答"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now))
+            self.conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                target = self.max_bytes * 3 // 4
+                rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+                for old_key, old_size in rows:
+                    if total <= target:
+                        break
+                    self.conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= old_size
+            self.conn.commit()
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
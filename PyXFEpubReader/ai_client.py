@@ -0,0 +1,128 @@
+import asyncio
+import ssl
+import threading
+import aiohttp
+
+
+class AIClient:
+    """共享的异步AI请求客户端：所有请求都在同一个后台事件循环中执行
+
+    submit() 提交一个协程函数，排队中和进行中的请求总数不超过 max_pending，
+    队列满时阻塞调用方（或立即报错），形成背压；返回的 Future 可以随时 cancel() 中断该请求。
+    open_websocket() 和 post_lines() 供各个AI后端使用，底层是同一个 aiohttp 会话，
+    TCP/TLS 连接和 DNS 解析结果在请求之间复用，并遵循系统的代理设置；同时进行的请求数由各个后端自行限制。
+    """
+
+    # DNS 解析结果的复用时长（秒）
+    RESOLVE_TTL = 300
+    # 建立连接的超时秒数
+    CONNECT_TIMEOUT = 10
+    # 单条 WebSocket 消息的大小上限（字节）
+    MAX_MESSAGE_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, max_pending=16):
+        """max_pending 为排队和进行中的请求总数上限"""
+        self.pending = threading.BoundedSemaphore(max(1, max_pending))
+        # 星火 WebSocket 接口沿用原来 websocket-client 的 sslopt={"cert_reqs": ssl.CERT_NONE}；
+        # HTTP 接口的请求头带有 API 密钥，使用 aiohttp 默认的证书和主机名校验
+        self.websocket_ssl_context = ssl.create_default_context()
+        self.websocket_ssl_context.check_hostname = False
+        self.websocket_ssl_context.verify_mode = ssl.CERT_NONE
+        self.loop = None
+        self._session = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        """按需启动后台事件循环线程"""
+        with self._lock:
+            if self.loop is not None:
+                return self.loop
+            started = threading.Event()
+
+            def run():
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                self.loop = loop
+                started.set()
+                loop.run_forever()
+                loop.close()
+
+            self._thread = threading.Thread(target=run, name="ai-client", daemon=True)
+            self._thread.start()
+            started.wait()
+            return self.loop
+
+    def submit(self, coroutine_function, *args, block=True, timeout=None):
+        """在后台事件循环中执行 coroutine_function(*args)，返回 concurrent.futures.Future
+
+        队列已满时：block 为 True 则等待空位（最多 timeout 秒），否则立即抛出异常。
+        不能在事件循环线程中以阻塞方式调用。
+        """
+        if block:
+            acquired = self.pending.acquire(timeout=timeout)
+        else:
+            acquired = self.pending.acquire(blocking=False)
+        if not acquired:
+            raise Exception("AI请求队列已满，请稍后再试")
+        try:
+            loop = self._ensure_loop()
+            future = asyncio.run_coroutine_threadsafe(coroutine_function(*args), loop)
+        except BaseException:
+            self.pending.release()
+            raise
+        future.add_done_callback(lambda _: self.pending.release())
+        return future
+
+    def session(self):
+        """当前事件循环中共享的 aiohttp 会话，按需创建；只能在事件循环中调用"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(ttl_dns_cache=self.RESOLVE_TTL)
+            # 只限制建立连接的时间，流式回答的总时长由各个后端的超时控制
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.CONNECT_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout, trust_env=True)
+        return self._session
+
+    async def open_websocket(self, url):
+        """打开 WebSocket 连接，返回 aiohttp 的 ClientWebSocketResponse"""
+        return await self.session().ws_connect(url, ssl=self.websocket_ssl_context,
+                                               max_msg_size=self.MAX_MESSAGE_BYTES)
+
+    async def post_lines(self, url, body, headers=None):
+        """发送 HTTP POST 请求并逐行产出响应正文，用于 SSE 等流式接口；状态码不是 200 时抛出异常"""
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        async with self.session().post(url, data=body, headers=headers) as response:
+            if response.status != 200:
+                error = await response.text(errors='replace')
+                raise ValueError(f"请求错误: {response.status}, {error[:300]}")
+            async for line in response.content:
+                yield line.decode('utf-8').rstrip("\r\n")
+
+    async def close_session(self):
+        """关闭共享会话及其中保持的连接"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def close(self):
+        """取消所有未完成的请求并停止事件循环"""
+        with self._lock:
+            loop, thread = self.loop, self._thread
+            self.loop = None
+            self._thread = None
+        if loop is None:
+            return
+
+        async def cancel_all():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.close_session()
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_all(), loop).result(timeout=2)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=2)
@@ -1,23 +1,20 @@
+import asyncio
 import json
 import os
-import ssl
-import websocket
-import hmac
-import hashlib
+import re
+import time
 from PyQt6.QtWidgets import QScrollArea
-from urllib.parse import urlparse, urlencode
-from wsgiref.handlers import format_date_time
-from datetime import datetime
-from time import mktime
 from typing import Dict, Any
 from PyQt6.QtWidgets import (QWidget,QGridLayout,QComboBox, QVBoxLayout,
                              QTextEdit, QPushButton, QLabel, QHBoxLayout,
-                             QGroupBox)
-
-import base64
-from PyQt6.QtCore import pyqtSignal, QThread
-from enum import Enum
-from bs4 import BeautifulSoup
+                             QGroupBox, QCheckBox)
+
+from PyQt6.QtCore import pyqtSignal, QObject, QTimer
+from PyQt6.QtGui import QTextCursor
+from read_aloud import split_sentences
+from ai_cache import AIResponseCache
+from ai_client import AIClient
+from ai_backends import create_backend, CHAT_TEMPERATURE, CHAT_MAX_TOKENS
 from PyQt6.QtWidgets import QInputDialog
 from PyQt6.QtWidgets import QApplication
 import logging
@@ -27,155 +24,225 @@ logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
-class AIModelType(Enum):
-    """AI模型类型枚举"""
-    XUNFEI = "讯飞星火"
-
-
-class Ws_Param(object):
-    """WebSocket参数类"""
-
-    def __init__(self, APPID, APIKey, APISecret, gpt_url):
-        """初始化WebSocket参数"""
-        self.APPID = APPID
-        self.APIKey = APIKey
-        self.APISecret = APISecret
-        self.host = urlparse(gpt_url).netloc
-        self.path = urlparse(gpt_url).path
-        self.gpt_url = gpt_url
-
-    def create_url(self):
-        """生成WebSocket连接URL"""
-        now = datetime.now()
-        date = format_date_time(mktime(now.timetuple()))
-
-        signature_origin = "host: " + self.host + "\n"
-        signature_origin += "date: " + date + "\n"
-        signature_origin += "GET " + self.path + " HTTP/1.1"
-
-        signature_sha = hmac.new(self.APISecret.encode('utf-8'),
-                               signature_origin.encode('utf-8'),
-                               digestmod=hashlib.sha256).digest()
+# 所有AI请求共用的异步客户端：排队和进行中的请求最多16个，各后端的并发数在配置中单独设置
+AI_CLIENT = AIClient(max_pending=16)
 
-        signature_sha_base64 = base64.b64encode(signature_sha).decode(encoding='utf-8')
 
-        authorization_origin = f'api_key="{self.APIKey}", algorithm="hmac-sha256", headers="host date request-line", signature="{signature_sha_base64}"'
+async def chat(backend, prompt, on_delta=None, cache=None, use_cache=True,
+               temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS):
+    """通过 backend 发出带回答缓存的对话请求，返回 (回答, 是否来自缓存)
 
-        authorization = base64.b64encode(authorization_origin.encode('utf-8')).decode(encoding='utf-8')
+    use_cache 为 False 时跳过读取缓存，但仍用新回答刷新缓存；命中缓存时整段回答作为一次增量回调。
+    缓存的读写是阻塞的 SQLite 操作，放到线程池中执行，不占用事件循环。
+    """
+    key = cache.key_of(prompt, backend.cache_id, temperature, max_tokens) if cache is not None else None
+    if key is not None and use_cache:
+        response = await asyncio.to_thread(cache.get, key)
+        if response is not None:
+            if on_delta is not None:
+                on_delta(response)
+            return response, True
 
-        v = {
-            "authorization": authorization,
-            "date": date,
-            "host": self.host
-        }
-        url = self.gpt_url + '?' + urlencode(v)
-        logger.debug(f"Generated URL: {url}")
-        return url
+    response = await backend.chat(prompt, on_delta, temperature, max_tokens)
+    if key is not None and response:
+        await asyncio.to_thread(cache.put, key, response)
+    return response, False
 
 
-class AIWorker(QThread):
-    """AI工作线程"""
+class AIWorker(QObject):
+    """一次AI请求：在共享的异步客户端中执行，结果和流式增量通过信号送回界面线程"""
 
     response_signal = pyqtSignal(str)
+    # 流式返回的每一段增量文本
+    delta_signal = pyqtSignal(str)
     error_signal = pyqtSignal(str)
 
-    def __init__(self, model_type: AIModelType, prompt: str, config: dict):
-        """初始化工作线程"""
+    def __init__(self, backend, prompt: str, cache=None, use_cache=True, client=AI_CLIENT):
+        """初始化请求，backend 为所选模型的后端，cache 为可选的回答缓存，use_cache 为 False 时不读缓存"""
         super().__init__()
-        self.model_type = model_type
+        self.backend = backend
         self.prompt = prompt
-        self.config = {
-            "app_id": config.get("app_id", "").strip(),
-            "api_key": config.get("api_key", "").strip(),
-            "api_secret": config.get("api_secret", "").strip(),
-            "api_url": config.get("api_url", "wss://spark-api.xf-yun.com/v1.1/chat").strip()
-        }
-
-    def run(self):
-        """执行API调用"""
+        self.cache = cache
+        self.use_cache = use_cache
+        self.from_cache = False
+        self.client = client
+        self.request = None
+
+    def start(self):
+        """提交请求；请求队列已满时直接报错，不阻塞界面"""
         try:
-            if self.model_type == AIModelType.XUNFEI:
-                result = self.call_xunfei()
-                self.response_signal.emit(result)
+            self.request = self.client.submit(self.run, block=False)
         except Exception as e:
             self.error_signal.emit(str(e))
+            return
+        self.request.add_done_callback(self.on_done)
 
-    def call_xunfei(self) -> str:
-        """调用讯飞星火API"""
-        wsParam = Ws_Param(
-            APPID=self.config["app_id"],
-            APIKey=self.config["api_key"],
-            APISecret=self.config["api_secret"],
-            gpt_url=self.config["api_url"]
-        )
-        response_content = []
-
-        def on_message(ws, message):
-            """处理WebSocket消息"""
-            data = json.loads(message)
-            code = data['header']['code']
-            if code != 0:
-                raise ValueError(f'请求错误: {code}, {data}')
-
-            choices = data["payload"]["choices"]
-            status = choices["status"]
-            content = choices["text"][0]["content"]
-            response_content.append(content)
-
-            if status == 2:
-                ws.close()
-
-        def on_error(ws, error):
-            """处理WebSocket错误"""
-            raise ValueError(f"WebSocket错误: {error}")
-
-        def on_close(ws, close_status_code, close_msg):
-            """处理WebSocket关闭"""
-            logger.debug("WebSocket连接关闭")
-
-        def on_open(ws):
-            """处理WebSocket打开"""
-            data = json.dumps(self.gen_params(
-                appid=self.config["app_id"],
-                query=self.prompt,
-                domain="lite"
-            ))
-            ws.send(data)
-
-        websocket.enableTrace(False)
-        wsUrl = wsParam.create_url()
-        ws = websocket.WebSocketApp(
-            wsUrl,
-            on_message=on_message,
-            on_error=on_error,
-            on_close=on_close,
-            on_open=on_open
-        )
-        ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
-
-        return "".join(response_content)
-
-    def gen_params(self, appid, query, domain):
-        """生成请求参数"""
-        return {
-            "header": {
-                "app_id": appid,
-                "uid": "1234",
-            },
-            "parameter": {
-                "chat": {
-                    "domain": domain,
-                    "temperature": 0.5,
-                    "max_tokens": 4096,
-                    "auditing": "default",
-                }
-            },
-            "payload": {
-                "message": {
-                    "text": [{"role": "user", "content": query}]
-                }
-            }
-        }
+    def cancel(self):
+        """取消请求，已取消的请求不再发出任何信号"""
+        if self.request is not None:
+            self.request.cancel()
+
+    def on_done(self, future):
+        """请求结束时发出结果或错误"""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.error_signal.emit(str(error))
+        else:
+            self.response_signal.emit(future.result())
+
+    async def run(self):
+        """执行API调用，流式增量通过 delta_signal 发出"""
+        result, self.from_cache = await chat(self.backend, self.prompt, self.delta_signal.emit,
+                                             self.cache, self.use_cache)
+        return result
+
+
+# 长章节总结：每段的token预算和同时进行的分段请求数
+SUMMARY_CHUNK_TOKENS = 2000
+SUMMARY_WORKERS = 3
+# 分段摘要合并后仍超出预算时，最多再合并几轮
+SUMMARY_MAX_ROUNDS = 3
+
+SUMMARY_PROMPT = "请用简洁的语言总结以下内容，提取关键点:\n\n{text}"
+MAP_PROMPT = "以下是一章内容的第{index}/{total}部分，请用简洁的语言总结这一部分，提取关键点:\n\n{text}"
+REDUCE_PROMPT = "以下是同一章节各部分的摘要，请把它们合并成一份完整、简洁的总结，提取关键点:\n\n{text}"
+
+# 整本书问答：检索的段落数和提示词
+RAG_TOP_K = 6
+RAG_PROMPT = ("以下是从书中检索到的与问题相关的片段:\n\n{passages}\n\n"
+              "请根据这些片段回答问题，片段中没有的信息请说明无法从书中找到。\n问题:{question}")
+
+_CJK_RE = re.compile('[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+
+
+def estimate_tokens(text):
+    """粗略估计文本的token数：汉字按一个token计，其余字符按四个一个计"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def split_by_tokens(text, budget):
+    """按句子边界把文本切成每段不超过 budget 个token的若干段，超长的句子按字数硬切"""
+    chunks = []
+    parts = []
+    used = 0
+    for sentence in split_sentences(text):
+        tokens = estimate_tokens(sentence)
+        if tokens > budget:
+            pieces = [sentence[i:i + budget] for i in range(0, len(sentence), budget)]
+        else:
+            pieces = [sentence]
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if parts and used + tokens > budget:
+                chunks.append(''.join(parts))
+                parts = []
+                used = 0
+            parts.append(piece)
+            used += tokens
+    if parts:
+        chunks.append(''.join(parts))
+    return chunks
+
+
+async def summarize_content(backend, content, cache=None, use_cache=True, on_delta=None, on_progress=None,
+                            chunk_tokens=SUMMARY_CHUNK_TOKENS, max_workers=SUMMARY_WORKERS):
+    """总结一段内容，返回 (摘要, 最后一次请求是否来自缓存)
+
+    不超过 chunk_tokens 的内容一次请求总结；更长的内容按预算切分后并发总结各段（map），再把分段摘要合并（reduce），
+    合并后仍超出预算时分组再合并，直到能放进一次请求。最后一次请求以流式通过 on_delta 返回。
+    """
+    if estimate_tokens(content) <= chunk_tokens:
+        return await chat(backend, SUMMARY_PROMPT.format(text=content), on_delta, cache, use_cache)
+
+    chunks = split_by_tokens(content, chunk_tokens)
+    prompts = [MAP_PROMPT.format(index=i + 1, total=len(chunks), text=chunk) for i, chunk in enumerate(chunks)]
+    summaries = await summarize_all(backend, prompts, "正在分段总结", cache, use_cache, on_progress, max_workers)
+
+    for round_index in range(SUMMARY_MAX_ROUNDS):
+        if len(summaries) <= 1 or estimate_tokens('\n\n'.join(summaries)) <= chunk_tokens:
+            break
+        groups = group_summaries(summaries, chunk_tokens)
+        prompts = [REDUCE_PROMPT.format(text='\n\n'.join(group)) for group in groups]
+        summaries = await summarize_all(backend, prompts, f"正在进行第{round_index + 1}轮合并", cache, use_cache,
+                                        on_progress, max_workers)
+
+    if len(summaries) == 1:
+        if on_delta is not None:
+            on_delta(summaries[0])
+        return summaries[0], False
+
+    if on_progress is not None:
+        on_progress(f"正在合并 {len(summaries)} 段摘要...")
+    return await chat(backend, REDUCE_PROMPT.format(text='\n\n'.join(summaries)), on_delta, cache, use_cache)
+
+
+async def summarize_all(backend, prompts, label, cache=None, use_cache=True, on_progress=None,
+                        max_workers=SUMMARY_WORKERS):
+    """并发发送一组总结请求（同时最多 max_workers 个），按原顺序返回结果；任一请求失败时取消其余请求并抛出异常"""
+    limit = asyncio.Semaphore(max_workers)
+    report = on_progress or (lambda text: None)
+
+    async def summarize(index, prompt):
+        async with limit:
+            return index, (await chat(backend, prompt, None, cache, use_cache))[0]
+
+    results = [None] * len(prompts)
+    report(f"{label}: 0/{len(prompts)}")
+    tasks = [asyncio.ensure_future(summarize(index, prompt)) for index, prompt in enumerate(prompts)]
+    try:
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            index, result = await task
+            results[index] = result
+            report(f"{label}: {done}/{len(prompts)}")
+    finally:
+        for task in tasks:
+            task.cancel()
+    return results
+
+
+def group_summaries(summaries, budget):
+    """把分段摘要分成若干组，每组合计不超过token预算，且每组至少两段以保证每轮都在减少"""
+    groups = []
+    group = []
+    used = 0
+    for summary in summaries:
+        tokens = estimate_tokens(summary)
+        if len(group) >= 2 and used + tokens > budget:
+            groups.append(group)
+            group = []
+            used = 0
+        group.append(summary)
+        used += tokens
+    if group:
+        if len(group) == 1 and groups:
+            groups[-1].extend(group)
+        else:
+            groups.append(group)
+    return groups
+
+
+class SummarizeWorker(AIWorker):
+    """长章节总结：按token预算切分后并发总结各段（map），再把分段摘要合并成一份（reduce），最后一次合并以流式返回"""
+
+    progress_signal = pyqtSignal(str)
+
+    def __init__(self, content, backend, chunk_tokens=SUMMARY_CHUNK_TOKENS, max_workers=SUMMARY_WORKERS,
+                 cache=None, use_cache=True, client=AI_CLIENT):
+        """初始化总结请求，分段总结和合并的结果都经过回答缓存"""
+        super().__init__(backend, "", cache, use_cache, client)
+        self.content = content
+        self.chunk_tokens = chunk_tokens
+        self.max_workers = max_workers
+
+    async def run(self):
+        """执行分段总结与合并"""
+        result, self.from_cache = await summarize_content(self.backend, self.content, self.cache, self.use_cache,
+                                                          self.delta_signal.emit, self.progress_signal.emit,
+                                                          self.chunk_tokens, self.max_workers)
+        return result
 
 
 class AIWidget(QWidget):
@@ -193,13 +260,22 @@ class AIWidget(QWidget):
         main_layout.setContentsMargins(8, 8, 8, 8)
         main_layout.setSpacing(10)
 
+        # 加载模型配置，每一项对应一个可选模型
+        self.model_configs = self.load_model_configs()
+        logger.debug(f"加载的模型配置: {list(self.model_configs)}")
+        # 模型名称 -> 已创建的后端，后端在多次请求之间共用，并发和频率限制才能生效
+        self.backends = {}
+
         # 模型选择区
         model_layout = QHBoxLayout()
         self.model_combo = QComboBox()
-        self.model_combo.addItems([model.value for model in AIModelType])
+        self.model_combo.addItems(list(self.model_configs))
         model_layout.addWidget(QLabel("模型:"))
         model_layout.addWidget(self.model_combo)
         model_layout.addStretch()
+        # 勾选后重新请求，不使用缓存的回答
+        self.bypass_cache_check = QCheckBox("重新生成（不使用缓存）")
+        model_layout.addWidget(self.bypass_cache_check)
         main_layout.addLayout(model_layout, 0, 0, 1, 2)
 
         # 功能区
@@ -224,6 +300,10 @@ class AIWidget(QWidget):
         function_layout.addWidget(self.explain_btn, 0, 2)
         function_layout.addWidget(self.ask_btn, 0, 3)
 
+        self.digest_btn = QPushButton("全书摘要")
+        self.digest_btn.setToolTip("逐章总结整本书，之后总结章节时直接读取；可随时停止，下次从断点继续")
+        function_layout.addWidget(self.digest_btn, 1, 0, 1, 4)
+
         function_layout.setHorizontalSpacing(10)
         function_layout.setVerticalSpacing(10)
 
@@ -243,6 +323,10 @@ class AIWidget(QWidget):
         scroll_area.setWidget(self.output_edit)
         output_layout.addWidget(scroll_area)
 
+        # 首字延迟和总用时
+        self.status_label = QLabel("")
+        output_layout.addWidget(self.status_label)
+
         button_layout = QHBoxLayout()
         self.send_btn = QPushButton("发送")
         self.copy_btn = QPushButton("复制")
@@ -289,16 +373,23 @@ class AIWidget(QWidget):
         self.translate_btn.clicked.connect(self.translate_current_content)
         self.explain_btn.clicked.connect(self.explain_current_content)
         self.ask_btn.clicked.connect(self.ask_about_content)
+        self.digest_btn.clicked.connect(self.toggle_book_digest)
         self.send_btn.clicked.connect(self.send_request)
         self.copy_btn.clicked.connect(self.copy_result)
         self.clear_btn.clicked.connect(self.clear_output)
 
-        # 加载模型配置
-        self.model_configs = self.load_model_configs()
-        logger.debug(f"加载的模型配置: {self.model_configs}")
+        # 回答缓存：同样的提示词和参数再次请求时直接返回
+        self.response_cache = AIResponseCache(os.path.join(os.path.dirname(__file__), "cache", "ai_responses.db"))
 
-        # 当前选择的模型
-        self.current_model = AIModelType.XUNFEI
+        # 流式输出：增量文本先攒在 pending_text 中，每帧（约16毫秒）统一追加一次
+        self.worker = None
+        self.pending_text = []
+        self.stream_started = False
+        self.request_start_time = 0.0
+        self.first_token_ms = None
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setInterval(16)
+        self.stream_timer.timeout.connect(self.flush_stream)
 
     def apply_preset(self, text):
         """应用预设提示词"""
@@ -306,11 +397,13 @@ class AIWidget(QWidget):
         self.input_edit.setPlainText(text)
 
     def get_current_content(self):
-        """获取当前阅读的内容"""
+        """获取当前阅读的内容：优先取共享缓存中的整章纯文本，否则直接读取文档的纯文本"""
+        if self.parent and hasattr(self.parent, 'get_reading_text'):
+            content = self.parent.get_reading_text()[1].strip()
+            logger.debug(f"获取当前内容: {content[:100]}...")
+            return content
         if self.parent and hasattr(self.parent, 'text_browser'):
-            html_content = self.parent.text_browser.toHtml()
-            soup = BeautifulSoup(html_content, 'html.parser')
-            content = soup.get_text().strip()
+            content = self.parent.text_browser.toPlainText().strip()
             logger.debug(f"获取当前内容: {content[:100]}...")
             return content
         logger.warning("无法获取当前内容，parent或text_browser不存在")
@@ -324,9 +417,43 @@ class AIWidget(QWidget):
             self.output_edit.setPlainText("错误：没有可总结的内容")
             return
 
-        self.input_edit.setPlainText(f"请用简洁的语言总结以下内容，提取关键点:\n\n{content}")
+        # 全书摘要中已有本章摘要时直接显示
+        summary = self.digest_summary()
+        if summary and not self.bypass_cache_check.isChecked():
+            self.start_worker(None)
+            self.input_edit.setPlainText("总结当前章节")
+            self.output_edit.setPlainText(summary)
+            self.status_label.setText("来自全书摘要")
+            return
+
+        # 超出单次请求预算的长章节分段总结后再合并
+        if estimate_tokens(content) > SUMMARY_CHUNK_TOKENS:
+            self.input_edit.setPlainText(f"分段总结当前章节（约 {estimate_tokens(content)} tokens）")
+            backend = self.current_backend()
+            if backend is not None:
+                self.output_edit.setPlainText("正在分段总结...")
+                self.start_worker(SummarizeWorker(content, backend, cache=self.response_cache,
+                                                  use_cache=not self.bypass_cache_check.isChecked()))
+            return
+
+        self.input_edit.setPlainText(SUMMARY_PROMPT.format(text=content))
         self.send_request()
 
+    def digest_summary(self):
+        """返回全书摘要中当前章节的摘要，没有时返回 None"""
+        digest = getattr(self.parent, 'book_digest', None)
+        if digest is None or not hasattr(self.parent, 'get_reading_text'):
+            return None
+        key = self.parent.get_reading_text()[0]
+        if key is None:
+            return None
+        return digest.get(key[1], self.parent.book_source.signature(key[1]))
+
+    def toggle_book_digest(self):
+        """开始为当前书籍生成全书摘要，正在生成时停止"""
+        if self.parent is not None and hasattr(self.parent, 'toggle_book_digest'):
+            self.parent.toggle_book_digest()
+
     def translate_current_content(self):
         """翻译当前内容"""
         logger.debug("执行翻译当前内容")
@@ -350,17 +477,48 @@ class AIWidget(QWidget):
         self.send_request()
 
     def ask_about_content(self):
-        """提问当前内容"""
+        """提问当前内容：整本书的段落索引就绪时检索相关段落作为上下文，否则使用当前章节"""
         logger.debug("执行提问当前内容")
-        content = self.get_current_content()
-        if not content:
-            self.output_edit.setPlainText("错误：没有可提问的内容")
-            return
+        passage_index = getattr(self.parent, 'passage_index', None)
+        if passage_index is None or not passage_index.ready.is_set():
+            content = self.get_current_content()
+            if not content:
+                self.output_edit.setPlainText("错误：没有可提问的内容")
+                return
+        else:
+            content = None
 
         question, ok = QInputDialog.getText(self, "提问", "请输入关于当前内容的问题:")
-        if ok and question:
-            self.input_edit.setPlainText(f"关于以下内容:\n\n{content}\n\n问题:{question}")
-            self.send_request()
+        if not ok or not question:
+            return
+        if content is None:
+            passages = self.retrieve_passages(passage_index, question)
+            if passages:
+                self.input_edit.setPlainText(RAG_PROMPT.format(passages=passages, question=question))
+                self.send_request()
+                return
+            content = self.get_current_content()
+            if not content:
+                self.output_edit.setPlainText("错误：没有可提问的内容")
+                return
+        self.input_edit.setPlainText(f"关于以下内容:\n\n{content}\n\n问题:{question}")
+        self.send_request()
+
+    def retrieve_passages(self, passage_index, question):
+        """从整本书中检索与问题最相关的段落，按书中顺序拼成提示词中的上下文，没有结果时返回空字符串"""
+        start = time.perf_counter()
+        results = passage_index.retrieve(question, RAG_TOP_K)
+        logger.debug(f"检索到 {len(results)} 个段落，用时 {(time.perf_counter() - start) * 1000:.1f} ms")
+        if not results:
+            return ""
+        book = getattr(self.parent, 'book', None)
+        spine_order = {href: index for index, href in enumerate(passage_index.hrefs)}
+        results.sort(key=lambda result: spine_order.get(result[0], 0))
+        parts = []
+        for number, (href, text, _) in enumerate(results, 1):
+            title = book.title_of(href) if book is not None else href
+            parts.append(f"[片段{number}·{title}]\n{text}")
+        return '\n\n'.join(parts)
 
     def send_request(self):
         """发送请求到AI模型"""
@@ -371,41 +529,112 @@ class AIWidget(QWidget):
             self.output_edit.setPlainText("错误：请输入问题或指令")
             return
 
-        try:
-            model_type = AIModelType(self.model_combo.currentText())
-            logger.debug(f"选择的模型类型: {model_type}")
-        except ValueError as e:
-            error_msg = f"无效的模型类型: {e}"
-            logger.error(error_msg)
-            self.output_edit.setPlainText(error_msg)
-            return
-
         self.output_edit.setPlainText("正在思考...")
+        self.status_label.setText("")
         QApplication.processEvents()
 
-        config = self.model_configs.get(model_type.value, {})
+        backend = self.current_backend()
+        if backend is None:
+            return
+        self.start_worker(AIWorker(backend, prompt, self.response_cache, not self.bypass_cache_check.isChecked()))
+
+    def current_backend(self):
+        """返回当前所选模型的后端（按需创建），缺少配置或配置无效时在输出区显示错误并返回 None"""
+        model_name = self.model_combo.currentText()
+        backend = self.backends.get(model_name)
+        if backend is not None:
+            return backend
+
+        config = self.model_configs.get(model_name, {})
         if not config:
-            error_msg = f"找不到模型配置: {model_type.value}"
+            error_msg = f"找不到模型配置: {model_name}"
+            logger.error(error_msg)
+            self.output_edit.setPlainText(error_msg)
+            return None
+        try:
+            backend = create_backend(config, AI_CLIENT)
+        except ValueError as e:
+            error_msg = f"无效的模型配置: {e}"
             logger.error(error_msg)
             self.output_edit.setPlainText(error_msg)
+            return None
+
+        logger.debug(f"模型 {model_name} 使用后端: {type(backend).__name__}")
+        self.backends[model_name] = backend
+        return backend
+
+    def start_worker(self, worker):
+        """启动新的AI请求，之前未完成的请求被取消，不再更新输出区；worker 为 None 时只取消之前的请求"""
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.response_signal.disconnect()
+            self.worker.delta_signal.disconnect()
+            self.worker.error_signal.disconnect()
+            if hasattr(self.worker, 'progress_signal'):
+                self.worker.progress_signal.disconnect()
+        self.stream_timer.stop()
+        self.pending_text = []
+        self.stream_started = False
+        self.first_token_ms = None
+        self.request_start_time = time.perf_counter()
+
+        self.worker = worker
+        if worker is None:
             return
-
-        logger.debug(f"使用的配置: {config}")
-
-        self.worker = AIWorker(model_type, prompt, config)
         self.worker.response_signal.connect(self.handle_response)
+        self.worker.delta_signal.connect(self.handle_delta)
         self.worker.error_signal.connect(self.handle_error)
-        logger.debug("启动AI工作线程...")
+        if hasattr(self.worker, 'progress_signal'):
+            self.worker.progress_signal.connect(self.status_label.setText)
+        logger.debug("提交AI请求...")
         self.worker.start()
 
+    def handle_delta(self, text):
+        """收到一段增量文本：第一段到达时记录首字延迟，之后攒到下一帧统一显示"""
+        if not self.stream_started:
+            self.stream_started = True
+            self.first_token_ms = (time.perf_counter() - self.request_start_time) * 1000
+            self.output_edit.clear()
+            self.status_label.setText(f"首字延迟 {self.first_token_ms:.0f} ms")
+        self.pending_text.append(text)
+        if not self.stream_timer.isActive():
+            self.stream_timer.start()
+
+    def flush_stream(self):
+        """把攒下的增量文本一次性追加到输出区末尾，原本停在底部时继续跟随滚动"""
+        if not self.pending_text:
+            self.stream_timer.stop()
+            return
+        scrollbar = self.output_edit.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        cursor = QTextCursor(self.output_edit.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(''.join(self.pending_text))
+        self.pending_text = []
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
     def handle_response(self, response):
         """处理AI响应"""
         logger.debug(f"处理AI响应，长度: {len(response)}")
-        self.output_edit.setPlainText(response)
+        self.stream_timer.stop()
+        if self.stream_started:
+            self.flush_stream()
+        else:
+            self.output_edit.setPlainText(response)
+        elapsed = time.perf_counter() - self.request_start_time
+        if self.worker is not None and self.worker.from_cache:
+            self.status_label.setText(f"来自缓存，用时 {elapsed * 1000:.0f} ms")
+        elif self.first_token_ms is not None:
+            self.status_label.setText(f"首字延迟 {self.first_token_ms:.0f} ms，总用时 {elapsed:.1f} 秒")
+        else:
+            self.status_label.setText(f"总用时 {elapsed:.1f} 秒")
 
     def handle_error(self, error):
         """处理错误"""
         logger.error(f"处理错误: {error}")
+        self.stream_timer.stop()
+        self.pending_text = []
         self.output_edit.setPlainText(f"错误: {error}")
 
     def copy_result(self):
@@ -429,12 +658,28 @@ class AIWidget(QWidget):
             except Exception as e:
                 logger.error(f"加载配置文件出错: {e}")
 ###————————————————————————————————————————填入API接口————————————————————————————————————————————————————————————————————————————
+        # backend 选择后端类型（见 ai_backends.BACKENDS）；max_concurrency、max_qps、timeout 为该后端的并发、频率和超时限制
         return {
             "讯飞星火": {
+                "backend": "spark",
                 "app_id": "",
                 "api_secret": "",
                 "api_key": "",
-                "api_url": ""
+                "api_url": "",
+                "max_concurrency": 3
+            },
+            "本地模型（OpenAI兼容）": {
+                "backend": "openai",
+                "api_url": "http://127.0.0.1:8080/v1/chat/completions",
+                "api_key": "",
+                "model": "",
+                "max_concurrency": 1
+            },
+            "模拟服务（离线测试）": {
+                "backend": "mock",
+                "latency": 0.2,
+                "tokens_per_second": 50,
+                "max_concurrency": 8
             }
         }
 
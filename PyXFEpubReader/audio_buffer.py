@@ -0,0 +1,90 @@
+import threading
+
+
+class PcmRingBuffer:
+    """有界环形缓冲区：语音合成线程写入PCM数据，播放线程边收边读
+
+    缓冲区写满时写入方阻塞等待，内存占用不超过 capacity；growable 为 True 时改为扩容，写入从不等待。
+    close() 表示数据已全部写入，读完剩余数据后 read() 返回空字节；
+    abort() 丢弃缓冲内容并唤醒双方，用于停止播放。
+    """
+
+    def __init__(self, capacity=2 * 1024 * 1024, growable=False):
+        """初始化缓冲区，默认容量约为 16kHz 单声道 16 位音频的一分钟"""
+        self.capacity = capacity
+        self.growable = growable
+        self._buffer = bytearray(capacity)
+        self._start = 0
+        self._size = 0
+        self._closed = False
+        self._aborted = False
+        self._condition = threading.Condition()
+
+    def write(self, data, timeout=None):
+        """写入数据，空间不足时等待读取方腾出空间；已中止或等待超时返回 False"""
+        view = memoryview(data)
+        with self._condition:
+            if self.growable and not self._aborted and self._size + len(view) > self.capacity:
+                self._grow(self._size + len(view))
+            while view:
+                if not self._condition.wait_for(lambda: self._aborted or self._size < self.capacity, timeout):
+                    return False
+                if self._aborted:
+                    return False
+                end = (self._start + self._size) % self.capacity
+                count = min(len(view), self.capacity - self._size, self.capacity - end)
+                self._buffer[end:end + count] = view[:count]
+                self._size += count
+                view = view[count:]
+                self._condition.notify_all()
+        return True
+
+    def _grow(self, needed):
+        """把容量翻倍直到不小于 needed，已有数据搬到新缓冲区的开头（调用方持有锁）"""
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        buffer = bytearray(capacity)
+        head = min(self._size, self.capacity - self._start)
+        buffer[:head] = self._buffer[self._start:self._start + head]
+        buffer[head:self._size] = self._buffer[:self._size - head]
+        self._buffer = buffer
+        self._start = 0
+        self.capacity = capacity
+
+    def read(self, max_size, timeout=None):
+        """读取最多 max_size 字节，没有数据时等待；数据读完且已关闭时返回空字节，等待超时返回 None"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._size > 0 or self._closed or self._aborted, timeout):
+                return None
+            if self._aborted or self._size == 0:
+                return b''
+            count = min(max_size, self._size, self.capacity - self._start)
+            data = bytes(self._buffer[self._start:self._start + count])
+            self._start = (self._start + count) % self.capacity
+            self._size -= count
+            self._condition.notify_all()
+            return data
+
+    def close(self):
+        """标记写入结束"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def abort(self):
+        """丢弃缓冲的数据并结束读写"""
+        with self._condition:
+            self._aborted = True
+            self._closed = True
+            self._start = 0
+            self._size = 0
+            self._condition.notify_all()
+
+    @property
+    def aborted(self):
+        return self._aborted
+
+    def __len__(self):
+        with self._condition:
+            return self._size
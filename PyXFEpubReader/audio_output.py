@@ -0,0 +1,130 @@
+import threading
+import pyaudio
+
+
+class AudioOutput:
+    """常驻的音频输出服务：PortAudio 只初始化一次，输出流在多次播放之间保持打开
+
+    任何生产者都可以把 PcmRingBuffer 交给 play()，由唯一的播放线程按块写入设备；
+    stop() 只丢弃当前音频，不关闭设备。采样率变化时才重新打开输出流。
+    """
+
+    def __init__(self, sample_rate=16000, channels=1, block_size=4096, latency=0.1):
+        """block_size 为每次写入设备的字节数，latency 为设备端缓冲的时长（秒）
+
+        PyAudio 不提供建议延迟参数，这里按 latency 换算成 frames_per_buffer。
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.latency = latency
+        self.pyaudio = None
+        self.stream = None
+        self.stream_rate = None
+        self._source = None
+        self._source_rate = sample_rate
+        self._on_finished = None
+        self._closed = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def play(self, source, sample_rate=None, on_finished=None):
+        """开始播放 source 中的16位PCM数据，正在播放的音频会被丢弃
+
+        on_finished(source) 在播放线程中调用，source 读完或被停止时触发。
+        """
+        with self._condition:
+            if self._closed:
+                return
+            if self._source is not None:
+                self._source.abort()
+            self._source = source
+            self._source_rate = sample_rate or self.sample_rate
+            self._on_finished = on_finished
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audio-output", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def stop(self):
+        """丢弃当前正在播放的音频，输出设备保持打开"""
+        with self._condition:
+            if self._source is not None:
+                self._source.abort()
+
+    def flush(self, timeout=None):
+        """等待当前音频全部写入设备，返回是否在超时前完成"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._source is None, timeout)
+
+    def close(self):
+        """停止播放并释放输出设备"""
+        with self._condition:
+            self._closed = True
+            if self._source is not None:
+                self._source.abort()
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=2)
+
+    def _open_stream(self, sample_rate):
+        """按需初始化 PortAudio 并打开（或按新采样率重新打开）输出流"""
+        if self.stream is not None and self.stream_rate == sample_rate:
+            return
+        self._close_stream()
+        if self.pyaudio is None:
+            self.pyaudio = pyaudio.PyAudio()
+        self.stream = self.pyaudio.open(format=pyaudio.paInt16,
+                                        channels=self.channels,
+                                        rate=sample_rate,
+                                        output=True,
+                                        frames_per_buffer=max(256, int(sample_rate * self.latency)))
+        self.stream_rate = sample_rate
+
+    def _run(self):
+        """播放线程：等待音频来源，逐块写入输出流"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._source is not None or self._closed)
+                if self._closed:
+                    break
+                source = self._source
+                sample_rate = self._source_rate
+                on_finished = self._on_finished
+
+            try:
+                self._open_stream(sample_rate)
+                while True:
+                    data = source.read(self.block_size)
+                    if not data:
+                        break
+                    self.stream.write(data)
+            except Exception as e:
+                print(f"播放错误: {e}")
+                source.abort()
+                # 输出流出错后下次播放时重新打开
+                self._close_stream()
+            finally:
+                with self._condition:
+                    if self._source is source:
+                        self._source = None
+                    self._condition.notify_all()
+                if on_finished is not None:
+                    on_finished(source)
+
+        self._close_stream()
+        if self.pyaudio is not None:
+            self.pyaudio.terminate()
+            self.pyaudio = None
+
+    def _close_stream(self):
+        """关闭输出流"""
+        if self.stream is not None:
+            try:
+                self.stream.stop_stream()
+                self.stream.close()
+            except Exception:
+                pass
+            self.stream = None
+            self.stream_rate = None
@@ -0,0 +1,222 @@
+from PyQt6.QtWidgets import QTextBrowser
+from PyQt6.QtCore import QByteArray, pyqtSignal
+from PyQt6.QtGui import QTextDocument, QTextCursor, QTextBlockFormat, QImage
+from epub_source import resolve_href
+from chapter_segments import LARGE_CHAPTER_CHARS, SEGMENT_ANCHOR, split_chapter
+
+# 分段模式下文档中最多同时保留的分段数
+MAX_LOADED_SEGMENTS = 3
+
+
+class BookTextBrowser(QTextBrowser):
+    """从书籍来源中按需加载样式表和图片的文本浏览器
+
+    超大章节按块级元素切成若干段，文档中只保留可见位置附近的几段，
+    滚动到边缘时追加下一段、淘汰最远的一段，并通过 progress_changed 报告全章进度。
+    """
+
+    # 全章阅读进度（百分比）
+    progress_changed = pyqtSignal(int)
+
+    def __init__(self, *args, **kwargs):
+        """初始化文本浏览器"""
+        super().__init__(*args, **kwargs)
+        self.book_source = None
+        self.chapter_href = ""
+        # 图片缓存，由主窗口设置；为 None 时按原尺寸加载图片
+        self.image_cache = None
+        # 只读浏览不需要撤销记录，避免调整格式时积累撤销栈
+        self.document().setUndoRedoEnabled(False)
+
+        # 分段模式状态：segments 为 None 表示整章一次性渲染
+        self.segments = None
+        self.window = (0, 0)
+        self.segment_blocks = {}
+        self._rebuilding = False
+        self.verticalScrollBar().valueChanged.connect(self.on_scroll)
+
+    def set_chapter(self, book_source, chapter_href, html):
+        """显示章节，章节中的相对链接以 chapter_href 为基准解析；超大章节改用分段渲染"""
+        self.book_source = book_source
+        self.chapter_href = chapter_href
+        if len(html) > LARGE_CHAPTER_CHARS:
+            self.segments = split_chapter(html)
+            self.load_window(0, min(1, len(self.segments) - 1))
+        else:
+            self.segments = None
+            self.setHtml(html)
+        self.report_progress()
+
+    def load_window(self, first, last, keep_segment=None):
+        """只把第 first 到 last 段放入文档；keep_segment 所在段在重建前后保持屏幕位置不变"""
+        scrollbar = self.verticalScrollBar()
+        offset = None
+        if keep_segment is not None and keep_segment in self.segment_blocks:
+            offset = scrollbar.value() - self.segment_top(keep_segment)
+
+        self._rebuilding = True
+        try:
+            self.setHtml(self.segments.build_html(first, last))
+            self.window = (first, last)
+            self.locate_segments()
+            if offset is not None and keep_segment in self.segment_blocks:
+                scrollbar.setValue(self.segment_top(keep_segment) + offset)
+        finally:
+            self._rebuilding = False
+
+    def locate_segments(self):
+        """在排版后的文档中找到每个已加载分段的起始段落"""
+        self.segment_blocks = {}
+        block = self.document().begin()
+        while block.isValid():
+            fragments = block.begin()
+            while not fragments.atEnd():
+                for name in fragments.fragment().charFormat().anchorNames():
+                    if name.startswith(SEGMENT_ANCHOR):
+                        self.segment_blocks.setdefault(int(name[len(SEGMENT_ANCHOR):]), block.blockNumber())
+                fragments += 1
+            block = block.next()
+
+    def segment_top(self, index):
+        """分段在当前文档中的纵向起点（像素）"""
+        block = self.document().findBlockByNumber(self.segment_blocks.get(index, 0))
+        return int(self.document().documentLayout().blockBoundingRect(block).top())
+
+    def on_scroll(self, value):
+        """滚动到已加载内容的边缘时追加相邻分段，并淘汰离可见位置最远的分段"""
+        if self.segments is not None and not self._rebuilding:
+            scrollbar = self.verticalScrollBar()
+            first, last = self.window
+            if value >= scrollbar.maximum() - scrollbar.pageStep() and last < len(self.segments) - 1:
+                self.load_window(max(first, last + 2 - MAX_LOADED_SEGMENTS), last + 1, keep_segment=last)
+            elif value <= scrollbar.pageStep() and first > 0:
+                self.load_window(first - 1, min(last, first + MAX_LOADED_SEGMENTS - 2), keep_segment=first)
+        self.report_progress()
+
+    def chapter_fraction(self):
+        """当前可见位置在整章中的进度（0~1）"""
+        scrollbar = self.verticalScrollBar()
+        value = scrollbar.value()
+        if self.segments is None:
+            return value / scrollbar.maximum() if scrollbar.maximum() > 0 else 0.0
+
+        first, last = self.window
+        current = self.current_segment()
+        top = self.segment_top(current)
+        if current < last and current + 1 in self.segment_blocks:
+            bottom = self.segment_top(current + 1)
+        else:
+            bottom = int(self.document().size().height())
+        return self.segments.fraction_of(current, (value - top) / max(1, bottom - top))
+
+    def current_segment(self):
+        """分段模式下可见位置所在的分段序号"""
+        value = self.verticalScrollBar().value()
+        first, last = self.window
+        current = first
+        for index in range(first, last + 1):
+            if index in self.segment_blocks and self.segment_top(index) <= value:
+                current = index
+        return current
+
+    def reading_position(self):
+        """当前阅读位置 (分段序号, 纵向偏移)：分段模式下偏移相对于该分段的起点，整章渲染时分段序号为 None
+
+        分段模式下滚动条只覆盖已加载的几段，单独记录滚动条位置无法还原。
+        """
+        value = self.verticalScrollBar().value()
+        if self.segments is None:
+            return None, value
+        current = self.current_segment()
+        return current, value - self.segment_top(current)
+
+    def show_position(self, segment, offset):
+        """滚动到 reading_position() 记录的位置，分段模式下先加载对应分段"""
+        scrollbar = self.verticalScrollBar()
+        if self.segments is None or segment is None:
+            scrollbar.setValue(offset)
+            return
+
+        index = min(max(segment, 0), len(self.segments) - 1)
+        first, last = self.window
+        if not first <= index <= last:
+            self.load_window(index, min(index + 1, len(self.segments) - 1))
+        scrollbar.setValue(self.segment_top(index) + offset)
+        self.report_progress()
+
+    def report_progress(self):
+        """发出全章阅读进度"""
+        self.progress_changed.emit(int(self.chapter_fraction() * 100))
+
+    def show_fraction(self, fraction):
+        """滚动到整章进度 fraction（0~1）处，分段模式下先加载对应分段"""
+        scrollbar = self.verticalScrollBar()
+        if self.segments is None:
+            scrollbar.setValue(int(scrollbar.maximum() * fraction))
+            return
+
+        index = self.segments.segment_at_fraction(fraction)
+        first, last = self.window
+        if not first <= index <= last:
+            self.load_window(index, min(index + 1, len(self.segments) - 1))
+        scrollbar.setValue(self.segment_top(index))
+        self.report_progress()
+
+    def set_spacing(self, line_spacing, paragraph_spacing):
+        """设置行间距和段间距：写入默认样式表供之后的章节使用，并直接修改当前文档的段落格式"""
+        self.document().setDefaultStyleSheet(f"""
+            img {{
+                max-width: 100%;
+                height: auto;
+            }}
+            p {{
+                line-height: {line_spacing}px;
+                margin-bottom: {paragraph_spacing}px;
+            }}
+        """)
+
+        if self.document().isEmpty():
+            return
+
+        block_format = QTextBlockFormat()
+        block_format.setLineHeight(line_spacing, QTextBlockFormat.LineHeightTypes.FixedHeight.value)
+        block_format.setBottomMargin(paragraph_spacing)
+
+        # 一次编辑块内合并所有段落格式，只触发一次重新排版；与样式表一样只作用于正文段落，
+        # 跳过标题、列表项和表格中的块
+        cursor = QTextCursor(self.document())
+        cursor.beginEditBlock()
+        block = self.document().begin()
+        while block.isValid():
+            cursor.setPosition(block.position())
+            if (block.blockFormat().headingLevel() == 0 and block.textList() is None
+                    and cursor.currentTable() is None):
+                cursor.mergeBlockFormat(block_format)
+            block = block.next()
+        cursor.endEditBlock()
+
+    def load_image(self, name):
+        """通过图片缓存取得缩小到视口宽度的图片，并按设备像素比标注尺寸"""
+        ratio = self.devicePixelRatioF()
+        image = self.image_cache.get(self.book_source, name, self.viewport().width() * ratio)
+        if image is None:
+            return None
+        # 复制一份再标注像素比，不修改缓存中共享的图片
+        image = QImage(image)
+        image.setDevicePixelRatio(ratio)
+        return image
+
+    def loadResource(self, resource_type, url):
+        """从书籍来源中读取章节引用的样式表和图片"""
+        if self.book_source is not None and url.scheme() in ("", "file"):
+            name = resolve_href(self.chapter_href, url.toString())
+            if self.book_source.exists(name):
+                if resource_type == QTextDocument.ResourceType.ImageResource and self.image_cache is not None:
+                    image = self.load_image(name)
+                    if image is not None:
+                        return image
+                data = self.book_source.read(name)
+                if resource_type == QTextDocument.ResourceType.StyleSheetResource:
+                    return data.decode('utf-8', errors='replace')
+                return QByteArray(data)
+        return super().loadResource(resource_type, url)
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from PyQt6.QtCore import pyqtSignal
+from ai_features import AIWorker, AI_CLIENT, summarize_content
+
+# 摘要文件格式版本
+DIGEST_VERSION = 1
+# 每章失败后最多重试的次数，以及第一次重试前等待的秒数（之后逐次加倍）
+DIGEST_RETRIES = 3
+DIGEST_RETRY_DELAY = 2.0
+# 同时总结的章节数
+DIGEST_WORKERS = 3
+
+
+class BookDigest:
+    """整本书的章节摘要，保存在书籍旁边的 <书名>.digest.json 中
+
+    每条摘要记录章节签名，章节文件变化后对应的摘要自动作废。
+    """
+
+    def __init__(self, book_path):
+        """book_path 为书籍目录或 .epub 文件的路径"""
+        self.path = os.path.splitext(os.path.normpath(book_path))[0] + ".digest.json"
+        self.lock = threading.Lock()
+        # 多个章节同时完成时，保证后写入的文件包含先完成的章节
+        self.save_lock = threading.Lock()
+        self.chapters = {}      # 章节书内路径 -> {'sig', 'summary'}
+        self.load()
+
+    def load(self):
+        """从磁盘加载摘要，文件缺失或版本不符时从空开始"""
+        with self.lock:
+            self.chapters = {}
+            if not os.path.exists(self.path):
+                return
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取全书摘要失败: {e}")
+                return
+            if data.get('version') == DIGEST_VERSION:
+                self.chapters = data['chapters']
+
+    def save(self):
+        """写回磁盘（先写临时文件再替换，中途退出也不会留下写一半的文件）"""
+        with self.save_lock:
+            with self.lock:
+                data = {'version': DIGEST_VERSION, 'chapters': dict(self.chapters)}
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+            try:
+                with open(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=1)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+    def get(self, href, sig):
+        """返回与章节签名一致的摘要，没有时返回 None"""
+        with self.lock:
+            entry = self.chapters.get(href)
+        if entry is not None and entry['sig'] == sig:
+            return entry['summary']
+        return None
+
+    def put(self, href, sig, summary):
+        """记录一章的摘要"""
+        with self.lock:
+            self.chapters[href] = {'sig': sig, 'summary': summary}
+
+
+class DigestWorker(AIWorker):
+    """全书摘要任务：逐章总结整本书，写入 BookDigest
+
+    同时总结的章节数不超过 max_workers，失败的章节按指数退避重试；每完成一章就写一次摘要文件作为断点，
+    中断后再次运行时跳过已有摘要的章节。结束时 response_signal 发出结果说明。
+    """
+
+    # (已完成章数, 总章数)
+    progress_signal = pyqtSignal(int, int)
+
+    def __init__(self, digest, source, chapter_hrefs, text_cache, backend, cache=None,
+                 max_workers=DIGEST_WORKERS, retries=DIGEST_RETRIES, client=AI_CLIENT):
+        """text_cache 为共享的章节文本缓存，backend 为所选模型的后端，cache 为AI回答缓存"""
+        super().__init__(backend, "", cache, True, client)
+        self.digest = digest
+        self.source = source
+        self.chapter_hrefs = list(chapter_hrefs)
+        self.text_cache = text_cache
+        self.max_workers = max_workers
+        self.retries = retries
+
+    async def run(self):
+        """总结所有还没有摘要的章节，返回结果说明"""
+        pending = []
+        failed = []
+        for href in self.chapter_hrefs:
+            try:
+                sig = self.source.signature(href)
+            except (OSError, KeyError) as e:
+                # 读不到的章节算作失败，不计入已完成
+                failed.append(f"{href}: {e}")
+                continue
+            if self.digest.get(href, sig) is None:
+                pending.append((href, sig))
+        total = len(self.chapter_hrefs)
+        done = total - len(pending) - len(failed)
+        self.progress_signal.emit(done, total)
+
+        limit = asyncio.Semaphore(self.max_workers)
+
+        async def digest_chapter(href, sig):
+            async with limit:
+                text = await asyncio.to_thread(self.text_cache.get, self.source, href)
+                summary = await self.summarize_with_retry(text.strip()) if text.strip() else ""
+            self.digest.put(href, sig, summary)
+            # 每章完成后立即落盘，作为断点
+            await asyncio.to_thread(self.digest.save)
+
+        tasks = [asyncio.ensure_future(digest_chapter(href, sig)) for href, sig in pending]
+        try:
+            for task in asyncio.as_completed(tasks):
+                try:
+                    await task
+                    done += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    failed.append(str(e))
+                self.progress_signal.emit(done, total)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if failed:
+            return f"全书摘要完成 {done}/{total} 章，{len(failed)} 章失败（{failed[0]}），再次运行将继续未完成的章节"
+        return f"全书摘要已完成，共 {total} 章"
+
+    async def summarize_with_retry(self, text):
+        """总结一章，失败时等待后重试，重试用尽后抛出最后一次的异常"""
+        for attempt in range(self.retries + 1):
+            try:
+                return (await summarize_content(self.backend, text, self.cache))[0]
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                print(f"章节总结失败，第 {attempt + 1} 次重试: {e}")
+                await asyncio.sleep(DIGEST_RETRY_DELAY * 2 ** attempt)
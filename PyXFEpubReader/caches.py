@@ -0,0 +1,144 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """线程安全的LRU缓存，同时限制条目数和总字节数"""
+
+    def __init__(self, max_items, max_bytes, sizeof=sys.getsizeof):
+        """初始化缓存，sizeof 用于估算每个值占用的字节数"""
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()    # 键 -> (值, 字节数)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """读取缓存并把该项标记为最近使用"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """写入缓存，超出限制时淘汰最久未使用的项；单项超过字节上限时不缓存"""
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._data[key] = (value, size)
+            self.total_bytes += size
+            while len(self._data) > self.max_items or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+
+class DiskCache:
+    """磁盘缓存：文件名取键的SHA-256，按前两位分目录存放；总大小超过上限时按最近使用时间淘汰"""
+
+    def __init__(self, cache_dir, max_bytes):
+        """初始化磁盘缓存，目录在第一次写入时创建"""
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+        self._lock = threading.Lock()
+
+    def path_of(self, key):
+        """键对应的缓存文件路径"""
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def get(self, key):
+        """读取缓存内容并刷新修改时间作为最近使用标记，不存在时返回 None"""
+        path = self.path_of(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        """写入缓存，超出上限时淘汰最久未使用的文件"""
+        path = self.path_of(key)
+        temp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with open(fd, 'wb') as f:
+                f.write(data)
+            # 覆盖已有的键时，替换掉的旧文件不再计入总大小
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            os.replace(temp_path, path)
+        except OSError as e:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            print(f"写入磁盘缓存失败: {e}")
+            return
+
+        with self._lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(stat.st_size for _, stat in self.iter_files())
+            else:
+                self.total_bytes += len(data) - old_size
+            if self.total_bytes > self.max_bytes:
+                self.prune()
+
+    def iter_files(self):
+        """遍历缓存文件，产出 (路径, stat)"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for folder in os.scandir(self.cache_dir):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    yield entry.path, entry.stat()
+                except OSError:
+                    continue
+
+    def prune(self):
+        """按最近使用时间淘汰，直到总大小降到上限的四分之三"""
+        target = self.max_bytes * 3 // 4
+        for path, stat in sorted(self.iter_files(), key=lambda item: item[1].st_mtime):
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self.total_bytes -= stat.st_size
+            except OSError:
+                continue
@@ -0,0 +1,79 @@
+import posixpath
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class ChapterTableModel(QAbstractTableModel):
+    """章节列表模型：按书脊顺序分批提供行，并通过哈希表把章节路径直接映射到行号"""
+
+    # 每次向视图追加的行数
+    BATCH_SIZE = 200
+
+    def __init__(self, parent=None):
+        """初始化空模型"""
+        super().__init__(parent)
+        self.book = None
+        self.loaded_rows = 0
+
+    def set_book(self, book):
+        """切换到另一本书，只先提供第一批行"""
+        self.beginResetModel()
+        self.book = book
+        self.loaded_rows = min(self.BATCH_SIZE, len(book.spine)) if book else 0
+        self.endResetModel()
+
+    def total_rows(self):
+        """书脊中的章节总数（包括尚未提供给视图的行）"""
+        return len(self.book.spine) if self.book else 0
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.loaded_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return 1
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= self.loaded_rows:
+            return None
+        href = self.book.spine[index.row()].href
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.book.title_of(href)
+        if role in (Qt.ItemDataRole.UserRole, Qt.ItemDataRole.ToolTipRole):
+            return href
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return "章节"
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded_rows < self.total_rows()
+
+    def fetchMore(self, parent=QModelIndex()):
+        self.ensure_loaded(self.loaded_rows + self.BATCH_SIZE - 1)
+
+    def ensure_loaded(self, row):
+        """确保第 row 行已经提供给视图（跳转到尚未加载的章节时使用）"""
+        last = min(row, self.total_rows() - 1)
+        if last < self.loaded_rows:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded_rows, last)
+        self.loaded_rows = last + 1
+        self.endInsertRows()
+
+    def row_of(self, href):
+        """按章节书内路径查找行号，兼容只记录了文件名的旧数据；找不到时返回 None"""
+        if self.book is None:
+            return None
+        row = self.book.index_of(href)
+        if row is None:
+            row = self.book.index_by_basename.get(posixpath.basename(href))
+        return row
+
+    def href_at(self, row):
+        """返回第 row 行章节的书内路径"""
+        return self.book.spine[row].href
@@ -0,0 +1,111 @@
+import re
+
+# 超过该字符数的章节按分段模式渲染
+LARGE_CHAPTER_CHARS = 300_000
+# 每个分段的目标字符数
+SEGMENT_CHARS = 60_000
+# 分段起点的锚点名前缀，用于在排版后的文档中找到每段的第一个段落
+SEGMENT_ANCHOR = "__segment_"
+
+BLOCK_TAGS = {'p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table', 'ul', 'ol', 'dl',
+              'blockquote', 'pre', 'section', 'article', 'li', 'tr', 'figure'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'image', 'input', 'link',
+             'meta', 'param', 'source', 'track', 'wbr'}
+
+_TAG_RE = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][\w:.-]*)\b[^>]*?(/?)>', re.S)
+_BODY_START_RE = re.compile(r'<body\b[^>]*>', re.I)
+_BODY_END_RE = re.compile(r'</body\s*>', re.I)
+_STRIP_TAGS_RE = re.compile(r'<[^>]+>')
+
+
+class ChapterSegments:
+    """按块级元素边界切分后的大章节"""
+
+    def __init__(self, head, segments):
+        """head 为 <body> 之前的部分，segments 为各段 body 内容"""
+        self.head = head
+        self.segments = segments
+        self.text_lengths = [max(1, len(_STRIP_TAGS_RE.sub('', segment))) for segment in segments]
+        self.text_starts = []
+        total = 0
+        for length in self.text_lengths:
+            self.text_starts.append(total)
+            total += length
+        self.total_text = total
+
+    def __len__(self):
+        return len(self.segments)
+
+    def build_html(self, first, last):
+        """拼出包含第 first 到 last 段的完整HTML"""
+        return self.head + ''.join(self.segments[first:last + 1]) + '</body></html>'
+
+    def segment_at_fraction(self, fraction):
+        """返回全章进度 fraction（0~1）所在的分段"""
+        target = fraction * self.total_text
+        for index in range(len(self.segments) - 1, -1, -1):
+            if self.text_starts[index] <= target:
+                return index
+        return 0
+
+    def fraction_of(self, index, local_fraction):
+        """把第 index 段内的进度换算成全章进度"""
+        position = self.text_starts[index] + local_fraction * self.text_lengths[index]
+        return min(1.0, position / self.total_text)
+
+
+def split_chapter(html, max_chars=SEGMENT_CHARS):
+    """在块级元素的结束标签处切分章节HTML
+
+    切分点处仍未闭合的外层标签会在本段末尾补上结束标签、在下一段开头按原样重新打开，
+    这样每一段都是结构完整的片段，外层容器的样式也不会丢失。
+    """
+    body_start = _BODY_START_RE.search(html)
+    if body_start:
+        head, body = html[:body_start.end()], html[body_start.end():]
+    else:
+        head, body = '<html><body>', html
+    body_end = _BODY_END_RE.search(body)
+    if body_end:
+        body = body[:body_end.start()]
+
+    segments = []
+    stack = []          # 尚未闭合的标签: (标签名, 原始开始标签)
+    prefix = ''
+    segment_start = 0
+    anchor_at = None    # 本段第一个块级开始标签之后的位置，用于插入分段锚点
+
+    for match in _TAG_RE.finditer(body):
+        closing, name, self_closing = match.groups()
+        if name is None:
+            continue
+        name = name.lower()
+        if not closing:
+            if anchor_at is None and name in BLOCK_TAGS:
+                anchor_at = match.end()
+            if not self_closing and name not in VOID_TAGS:
+                stack.append((name, match.group()))
+            continue
+
+        for depth in range(len(stack) - 1, -1, -1):
+            if stack[depth][0] == name:
+                del stack[depth:]
+                break
+        if name in BLOCK_TAGS and match.end() - segment_start >= max_chars:
+            suffix = ''.join(f'</{tag_name}>' for tag_name, _ in reversed(stack))
+            segments.append(_with_anchor(len(segments), prefix, body, segment_start, match.end(), anchor_at) + suffix)
+            prefix = ''.join(start_tag for _, start_tag in stack)
+            segment_start = match.end()
+            anchor_at = None
+
+    if segment_start < len(body) or not segments:
+        segments.append(_with_anchor(len(segments), prefix, body, segment_start, len(body), anchor_at))
+    return ChapterSegments(head, segments)
+
+
+def _with_anchor(index, prefix, body, start, end, anchor_at):
+    """取出一段内容，并在其第一个块级元素内插入分段锚点"""
+    anchor = f'<a name="{SEGMENT_ANCHOR}{index}"></a>'
+    if anchor_at is None or not start <= anchor_at <= end:
+        return prefix + anchor + body[start:end]
+    return prefix + body[start:anchor_at] + anchor + body[anchor_at:end]
@@ -0,0 +1,55 @@
+import html
+import re
+from caches import LRUCache
+
+# 不含正文的元素整体去掉
+_DROP_RE = re.compile(r'<(script|style|head)\b.*?</\1\s*>|<!--.*?-->|<!\[CDATA\[.*?\]\]>', re.S | re.I)
+# 块级元素的边界和 <br> 换成换行
+_BREAK_RE = re.compile(r'<\s*(?:br|/?(?:p|div|h[1-6]|li|tr|dt|dd|blockquote|pre|section|article|table|ul|ol))\b[^>]*>',
+                       re.I)
+_TAG_RE = re.compile(r'<[^>]*>')
+_SPACES_RE = re.compile(r'[ \t\r\f\v]+')
+_BLANK_LINES_RE = re.compile(r'\s*\n\s*')
+
+
+def html_to_text(html_text):
+    """把章节HTML转成纯文本：只用几次正则替换，不构建文档树
+
+    块级元素之间以换行分隔，连续空白合并，实体字符还原。
+    """
+    text = _DROP_RE.sub('', html_text)
+    text = _BREAK_RE.sub('\n', text)
+    text = _TAG_RE.sub('', text)
+    text = html.unescape(text)
+    text = _SPACES_RE.sub(' ', text)
+    return _BLANK_LINES_RE.sub('\n', text).strip()
+
+
+class ChapterTextCache:
+    """共享的章节纯文本缓存：每章只提取一次，供朗读、AI功能和全文搜索共用
+
+    以 (书籍路径, 章节路径) 为键，同时记录章节签名，章节文件变化后自动重新提取。
+    """
+
+    def __init__(self, max_items=256, max_bytes=16 * 1024 * 1024):
+        """初始化缓存"""
+        self.memory = LRUCache(max_items, max_bytes, sizeof=lambda entry: len(entry[1]) * 2)
+
+    def cached(self, source, href):
+        """只查缓存，不提取；没有或已过期时返回 None"""
+        entry = self.memory.get((source.path, href))
+        if entry is not None and entry[0] == source.signature(href):
+            return entry[1]
+        return None
+
+    def put(self, source, href, text):
+        """放入已经提取好的章节文本"""
+        self.memory.put((source.path, href), (source.signature(href), text))
+
+    def get(self, source, href):
+        """返回章节纯文本，缓存中没有时从书籍来源读取并提取"""
+        text = self.cached(source, href)
+        if text is None:
+            text = html_to_text(source.read_text(href))
+            self.put(source, href, text)
+        return text
@@ -0,0 +1,201 @@
+import posixpath
+import re
+import threading
+import xml.etree.ElementTree as ET
+from epub_source import resolve_href
+
+# 已解析书籍的缓存：书籍路径 -> EpubBook（OPF签名变化时重新解析）
+_book_cache = {}
+_book_cache_lock = threading.Lock()
+
+
+class Chapter:
+    """书脊中的一个章节"""
+
+    __slots__ = ('id', 'href', 'title', 'media_type')
+
+    def __init__(self, chapter_id, href, title, media_type):
+        self.id = chapter_id
+        self.href = href
+        self.title = title
+        self.media_type = media_type
+
+
+class EpubBook:
+    """解析 container.xml、OPF 清单与书脊、NCX/nav 目录得到的书籍结构
+
+    章节路径（href）统一为书内完整路径，可直接交给 BookSource 读取。
+    """
+
+    def __init__(self, source):
+        """解析书籍结构"""
+        self.title = ""
+        self.manifest = {}      # 清单项id -> (书内路径, 媒体类型)
+        self.spine = []         # Chapter 列表，按书脊顺序
+        self.toc_titles = {}    # 书内路径 -> 目录标题
+        self.opf_path = self._find_opf(source)
+        self.opf_signature = _opf_signature(source, self.opf_path)
+        if self.opf_path is not None:
+            self._parse_opf(source)
+        if not self.spine:
+            self._fallback_spine(source)
+        self._build_lookups()
+
+    def to_dict(self):
+        """导出为可写入书库目录的字典"""
+        return {
+            'title': self.title,
+            'opf_path': self.opf_path,
+            'spine': [[chapter.id, chapter.href, chapter.title, chapter.media_type] for chapter in self.spine],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """从书库目录中的字典恢复书籍结构，无需重新读取和解析OPF"""
+        book = cls.__new__(cls)
+        book.title = data['title']
+        book.opf_path = data['opf_path']
+        book.opf_signature = None
+        book.manifest = {}
+        book.toc_titles = {}
+        book.spine = [Chapter(*fields) for fields in data['spine']]
+        book._build_lookups()
+        return book
+
+    def _find_opf(self, source):
+        """从 META-INF/container.xml 中找到 OPF 文件"""
+        if source.exists('META-INF/container.xml'):
+            try:
+                root = ET.fromstring(source.read('META-INF/container.xml'))
+                rootfile = root.find('.//{*}rootfile')
+                if rootfile is not None and source.exists(rootfile.get('full-path', '')):
+                    return rootfile.get('full-path')
+            except ET.ParseError as e:
+                print(f"解析 container.xml 失败: {e}")
+        opf_files = [name for name in source.names() if name.lower().endswith('.opf')]
+        return opf_files[0] if opf_files else None
+
+    def _parse_opf(self, source):
+        """解析OPF的元数据、清单、书脊，并读取目录标题"""
+        try:
+            root = ET.fromstring(source.read(self.opf_path))
+        except ET.ParseError as e:
+            print(f"解析 {self.opf_path} 失败: {e}")
+            return
+
+        title = root.find('.//{*}metadata/{*}title')
+        if title is not None and title.text:
+            self.title = title.text.strip()
+
+        nav_href = None
+        for item in root.iterfind('.//{*}manifest/{*}item'):
+            href = resolve_href(self.opf_path, item.get('href', ''))
+            self.manifest[item.get('id')] = (href, item.get('media-type', ''))
+            if 'nav' in item.get('properties', '').split():
+                nav_href = href
+
+        spine = root.find('.//{*}spine')
+        if spine is None:
+            return
+        ncx = self.manifest.get(spine.get('toc'))
+        if ncx is None:
+            ncx = next((entry for entry in self.manifest.values()
+                        if entry[1] == 'application/x-dtbncx+xml'), None)
+        if ncx is not None and source.exists(ncx[0]):
+            self._parse_ncx(source, ncx[0])
+        elif nav_href is not None and source.exists(nav_href):
+            self._parse_nav(source, nav_href)
+
+        for itemref in spine.iterfind('{*}itemref'):
+            chapter_id = itemref.get('idref')
+            if chapter_id not in self.manifest:
+                continue
+            href, media_type = self.manifest[chapter_id]
+            self.spine.append(Chapter(chapter_id, href, self.toc_titles.get(href, ''), media_type))
+
+    def _parse_ncx(self, source, ncx_href):
+        """从 EPUB2 的 NCX 目录中读取每个章节的标题"""
+        try:
+            root = ET.fromstring(source.read(ncx_href))
+        except ET.ParseError as e:
+            print(f"解析 {ncx_href} 失败: {e}")
+            return
+        for nav_point in root.iter('{http://www.daisy.org/z3986/2005/ncx/}navPoint'):
+            label = nav_point.find('{*}navLabel/{*}text')
+            content = nav_point.find('{*}content')
+            if label is None or content is None or not label.text:
+                continue
+            href = resolve_href(ncx_href, content.get('src', ''))
+            self.toc_titles.setdefault(href, label.text.strip())
+
+    def _parse_nav(self, source, nav_href):
+        """从 EPUB3 的 nav 文档中读取每个章节的标题"""
+        try:
+            root = ET.fromstring(source.read(nav_href))
+        except ET.ParseError as e:
+            print(f"解析 {nav_href} 失败: {e}")
+            return
+        for link in root.iter('{http://www.w3.org/1999/xhtml}a'):
+            text = ''.join(link.itertext()).strip()
+            if text and link.get('href'):
+                self.toc_titles.setdefault(resolve_href(nav_href, link.get('href')), text)
+
+    def _fallback_spine(self, source):
+        """没有可用的OPF时，退回到包含最多章节文件的目录并按文件名自然排序"""
+        content_root = source.find_content_root()
+        if content_root is None:
+            return
+        names = [name for name in source.list_dir(content_root) if name.lower().endswith(('.html', '.xhtml'))]
+        names.sort(key=natural_sort_key)
+        for name in names:
+            href = posixpath.join(content_root, name)
+            self.spine.append(Chapter(href, href, '', 'application/xhtml+xml'))
+
+    def _build_lookups(self):
+        """建立按章节id和书内路径的 O(1) 查找表"""
+        self.index_by_id = {chapter.id: index for index, chapter in enumerate(self.spine)}
+        self.index_by_href = {chapter.href: index for index, chapter in enumerate(self.spine)}
+        self.index_by_basename = {}
+        for index, chapter in enumerate(self.spine):
+            self.index_by_basename.setdefault(posixpath.basename(chapter.href), index)
+
+    def index_of(self, href):
+        """返回章节在书脊中的位置，不存在时返回 None"""
+        return self.index_by_href.get(href)
+
+    def chapter_by_id(self, chapter_id):
+        """按清单id查找章节"""
+        index = self.index_by_id.get(chapter_id)
+        return self.spine[index] if index is not None else None
+
+    def title_of(self, href):
+        """章节的显示名称：优先使用目录标题，否则使用文件名"""
+        index = self.index_by_href.get(href)
+        if index is not None and self.spine[index].title:
+            return self.spine[index].title
+        return posixpath.basename(href)
+
+
+def natural_sort_key(name):
+    """自然排序键：chapter2 排在 chapter10 之前"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split('([0-9]+)', name)]
+
+
+def load_book(source):
+    """解析书籍结构，同一本书在OPF未变化时复用缓存结果"""
+    with _book_cache_lock:
+        book = _book_cache.get(source.path)
+    if book is not None and book.opf_signature == _opf_signature(source, book.opf_path):
+        return book
+
+    book = EpubBook(source)
+    with _book_cache_lock:
+        _book_cache[source.path] = book
+    return book
+
+
+def _opf_signature(source, opf_path):
+    """OPF文件的变化签名，OPF不存在时为 None"""
+    if opf_path is None or not source.exists(opf_path):
+        return None
+    return source.signature(opf_path)
@@ -0,0 +1,129 @@
+import os
+import posixpath
+import threading
+import zipfile
+from urllib.parse import unquote
+
+
+def resolve_href(base_name, href):
+    """把章节中的相对链接解析为书内路径（去掉锚点和查询参数）"""
+    href = unquote(href.split('#', 1)[0].split('?', 1)[0])
+    if not href:
+        return base_name
+    if href.startswith('/'):
+        return posixpath.normpath(href.lstrip('/'))
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_name), href))
+
+
+class BookSource:
+    """书籍内容来源：按书内路径（以 / 分隔）读取章节、样式表和图片"""
+
+    def names(self):
+        """返回书内所有文件的路径列表"""
+        raise NotImplementedError
+
+    def read(self, name):
+        """读取书内文件的原始字节"""
+        raise NotImplementedError
+
+    def signature(self, name):
+        """返回文件的变化签名，内容改变时签名随之改变"""
+        raise NotImplementedError
+
+    def exists(self, name):
+        """判断书内文件是否存在"""
+        return name in self.names()
+
+    def read_text(self, name):
+        """以UTF-8读取书内文本文件"""
+        return self.read(name).decode('utf-8', errors='replace')
+
+    def find_content_root(self):
+        """查找包含大于3个.html或.xhtml文件的目录，浅层目录优先"""
+        counts = {}
+        for name in self.names():
+            if name.lower().endswith(('.html', '.xhtml')):
+                folder = posixpath.dirname(name)
+                counts[folder] = counts.get(folder, 0) + 1
+        folders = sorted((folder for folder, count in counts.items() if count > 3),
+                         key=lambda folder: (folder.count('/') if folder else -1, folder))
+        return folders[0] if folders else None
+
+    def list_dir(self, folder):
+        """列出书内某个目录下直接包含的文件名"""
+        prefix = folder + '/' if folder else ''
+        return [name[len(prefix):] for name in self.names()
+                if name.startswith(prefix) and '/' not in name[len(prefix):]]
+
+
+class ZipBookSource(BookSource):
+    """直接从 .epub 压缩包的中央目录按需读取文件，无需解压"""
+
+    def __init__(self, epub_path):
+        """打开压缩包并缓存中央目录"""
+        self.path = epub_path
+        self.zip_file = zipfile.ZipFile(epub_path, 'r')
+        self.infos = {info.filename: info for info in self.zip_file.infolist() if not info.is_dir()}
+        self._names = list(self.infos)
+        self.lock = threading.Lock()
+
+    def names(self):
+        return self._names
+
+    def exists(self, name):
+        return name in self.infos
+
+    def read(self, name):
+        with self.lock:
+            return self.zip_file.read(self.infos[name])
+
+    def signature(self, name):
+        info = self.infos[name]
+        return [info.CRC, info.file_size]
+
+    def close(self):
+        """关闭压缩包"""
+        self.zip_file.close()
+
+
+class DirBookSource(BookSource):
+    """从已解压的书籍目录读取文件"""
+
+    def __init__(self, root):
+        """记录书籍根目录"""
+        self.path = root
+        self._names = None
+
+    def names(self):
+        if self._names is None:
+            names = []
+            for folder, _, files in os.walk(self.path):
+                relative = os.path.relpath(folder, self.path).replace(os.sep, '/')
+                for file in files:
+                    names.append(file if relative == '.' else f"{relative}/{file}")
+            self._names = names
+        return self._names
+
+    def exists(self, name):
+        return os.path.isfile(self._full_path(name))
+
+    def read(self, name):
+        with open(self._full_path(name), 'rb') as f:
+            return f.read()
+
+    def signature(self, name):
+        stat = os.stat(self._full_path(name))
+        return [stat.st_mtime, stat.st_size]
+
+    def close(self):
+        """目录来源无需释放资源"""
+
+    def _full_path(self, name):
+        return os.path.join(self.path, *name.split('/'))
+
+
+def open_book_source(path):
+    """根据路径打开书籍来源：.epub 文件走压缩包，目录走已解压的文件"""
+    if os.path.isdir(path):
+        return DirBookSource(path)
+    return ZipBookSource(path)
@@ -0,0 +1,77 @@
+import json
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, QSize
+from PyQt6.QtGui import QImage, QImageReader
+from caches import LRUCache, DiskCache
+
+# 目标宽度向上取整到该步长，窗口小幅缩放时仍能命中缓存
+WIDTH_STEP = 256
+
+
+class ImageCache:
+    """章节图片缓存：每张图片只解码一次并缩小到显示宽度，结果放在内存LRU中，缩小过的图片同时写入磁盘缓存"""
+
+    def __init__(self, cache_dir, max_items=64, max_bytes=64 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024):
+        """初始化图片缓存，max_bytes 限制内存中解码后图片的总大小，max_disk_bytes 限制磁盘缓存大小"""
+        self.memory = LRUCache(max_items, max_bytes, sizeof=lambda image: image.sizeInBytes())
+        self.disk = DiskCache(cache_dir, max_disk_bytes)
+
+    def get(self, book_source, name, target_width):
+        """返回适合 target_width（物理像素）显示的图片，读取或解码失败时返回 None"""
+        width = self.bucket_width(target_width)
+        signature = book_source.signature(name)
+        key = (book_source.path, name, json.dumps(signature), width)
+        image = self.memory.get(key)
+        if image is not None:
+            return image
+
+        image = self.load_from_disk(key)
+        if image is None:
+            image, scaled, image_format = self.decode(book_source.read(name), width)
+            if image is None:
+                return None
+            # 只有缩小过的图片才值得落盘，原尺寸图片直接从书中解码即可
+            if scaled:
+                self.save_to_disk(key, image, image_format)
+        self.memory.put(key, image)
+        return image
+
+    @staticmethod
+    def bucket_width(target_width):
+        """把目标宽度向上取整到 WIDTH_STEP 的整数倍"""
+        return max(WIDTH_STEP, -(-int(target_width) // WIDTH_STEP) * WIDTH_STEP)
+
+    @staticmethod
+    def decode(data, width):
+        """解码图片，宽度超过 width 时在解码阶段直接按比例缩小；返回 (图片, 是否缩小, 格式)"""
+        buffer = QBuffer()
+        buffer.setData(QByteArray(data))
+        buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+        reader = QImageReader(buffer)
+        reader.setAutoTransform(True)
+        image_format = bytes(reader.format()).decode('ascii', errors='ignore').lower()
+        size = reader.size()
+        scaled = size.isValid() and size.width() > width
+        if scaled:
+            # JPEG 等格式可以在解码时直接降采样，不必先解出全尺寸位图
+            reader.setScaledSize(QSize(width, max(1, round(size.height() * width / size.width()))))
+        image = reader.read()
+        if image.isNull():
+            print(f"解码图片失败: {reader.errorString()}")
+            return None, False, image_format
+        return image, scaled, image_format
+
+    def load_from_disk(self, key):
+        """读取磁盘缓存中的图片"""
+        data = self.disk.get(repr(key))
+        if data is None:
+            return None
+        image = QImage.fromData(data)
+        return None if image.isNull() else image
+
+    def save_to_disk(self, key, image, image_format):
+        """把缩小后的图片写入磁盘缓存：JPEG 保持 JPEG，其余格式存为 PNG 以保留透明度"""
+        file_format = "JPG" if image_format in ("jpg", "jpeg") else "PNG"
+        buffer = QBuffer()
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        if image.save(buffer, file_format, 90):
+            self.disk.put(repr(key), bytes(buffer.data()))
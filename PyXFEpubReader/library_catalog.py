@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+import threading
+
+# 目录格式版本，格式变化时旧目录自动作废
+CATALOG_VERSION = 1
+
+
+class LibraryCatalog:
+    """书库目录：记录每本书的路径、修改时间和解析好的书脊，启动时只需逐本 stat 校验
+
+    条目结构: {'path', 'kind': 'dir'|'epub', 'stamp': [mtime, size], 'book': EpubBook.to_dict() 或 None}
+    book 为 None 表示该书是新加入或已变化的，首次打开时再解析并回填。
+    """
+
+    def __init__(self, catalog_path):
+        """初始化并加载书库目录"""
+        self.catalog_path = catalog_path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """从磁盘加载书库目录，文件缺失或版本不符时从空目录开始"""
+        if not os.path.exists(self.catalog_path):
+            return
+        try:
+            with open(self.catalog_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取书库目录失败: {e}")
+            return
+        if data.get('version') == CATALOG_VERSION:
+            self.entries = data['books']
+
+    def save(self):
+        """有改动时把书库目录写回磁盘，写入失败时保留改动标记，下次保存时重试"""
+        with self.lock:
+            if not self.dirty:
+                return
+            # 在锁内序列化，条目字典随后可能被其他线程修改
+            text = json.dumps({'version': CATALOG_VERSION, 'books': self.entries}, ensure_ascii=False)
+            # 先清除标记，写入期间的新改动会重新置位；写入失败时再恢复
+            self.dirty = False
+        catalog_dir = os.path.dirname(self.catalog_path)
+        temp_path = None
+        try:
+            os.makedirs(catalog_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=catalog_dir, suffix='.tmp')
+            with open(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, self.catalog_path)
+        except BaseException as e:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            with self.lock:
+                self.dirty = True
+            if not isinstance(e, OSError):
+                raise
+            print(f"保存书库目录失败: {e}")
+
+    def refresh(self, book_dir):
+        """列出书库目录下的书籍并逐本 stat 校验，返回按名称排序的 [(书名, 路径)]
+
+        已解压的目录和 .epub 文件都算作书籍，同名时优先使用目录。
+        只做一次 listdir 和每本书一次 stat，不遍历书籍内部。
+        """
+        found = {}
+        if os.path.exists(book_dir):
+            with os.scandir(book_dir) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        found[entry.name] = (entry.path, 'dir')
+                    elif entry.name.lower().endswith('.epub'):
+                        book_name = os.path.splitext(entry.name)[0]
+                        if book_name not in found or found[book_name][1] != 'dir':
+                            found[book_name] = (entry.path, 'epub')
+
+        with self.lock:
+            for book_name in list(self.entries):
+                if book_name not in found:
+                    del self.entries[book_name]
+                    self.dirty = True
+            for book_name, (path, kind) in found.items():
+                entry = self.entries.get(book_name)
+                if entry is None or entry['path'] != path or entry['kind'] != kind:
+                    self.entries[book_name] = {'path': path, 'kind': kind, 'stamp': None, 'book': None}
+                    self.dirty = True
+                    continue
+                if entry['book'] is not None and entry['stamp'] != self._stamp(entry):
+                    entry['book'] = None
+                    self.dirty = True
+            return [(book_name, self.entries[book_name]['path']) for book_name in sorted(self.entries)]
+
+    def get_book(self, book_name):
+        """返回已缓存且仍然有效的书籍结构字典，没有时返回 None"""
+        with self.lock:
+            entry = self.entries.get(book_name)
+            return entry['book'] if entry else None
+
+    def put_book(self, book_name, path, book_data):
+        """回填一本书解析好的结构"""
+        with self.lock:
+            kind = 'dir' if os.path.isdir(path) else 'epub'
+            entry = {'path': path, 'kind': kind, 'stamp': None, 'book': book_data}
+            entry['stamp'] = self._stamp(entry)
+            self.entries[book_name] = entry
+            self.dirty = True
+
+    def _stamp(self, entry):
+        """书籍的校验戳：.epub 取文件本身，目录取其中的OPF文件"""
+        path = entry['path']
+        if entry['kind'] == 'dir' and entry['book'] and entry['book']['opf_path']:
+            path = os.path.join(path, *entry['book']['opf_path'].split('/'))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_mtime, stat.st_size]
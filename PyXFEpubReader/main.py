@@ -1,21 +1,37 @@
 import os
 import sys
-import re
 from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, \
-    QWidget, QSplitter, QTableWidget, QTableWidgetItem, QTextBrowser, QFileDialog, QProgressBar, QComboBox, \
-    QFontDialog, QSlider, QDialog, QListWidget, QStatusBar
-from PyQt6.QtCore import Qt, QThread
+    QWidget, QSplitter, QTableView, QFileDialog, QProgressBar, QComboBox, \
+    QFontDialog, QSlider, QDialog, QListWidget, QListWidgetItem, QStatusBar
+from PyQt6.QtCore import Qt, QThread, QTimer
 from PyQt6.QtGui import QIcon, QFont
-import zipfile
-import pyaudio
 import threading
 from xfyun_tts import XFYunTTS
+from tts_engines import EspeakTTS
+from audio_buffer import PcmRingBuffer
+from audio_output import AudioOutput
+from read_aloud import TTSWorker, PrerenderWorker, split_sentences
+from tts_pool import TTSClientPool
+from tts_cache import TTSAudioCache
 from PyQt6.QtCore import QObject, pyqtSignal
 import shutil
+import tempfile
 import json
 import time
-from ai_features import AIWidget
+from ai_features import AIWidget, AI_CLIENT
 from search_feature import SearchDialog
+from search_index import SearchIndex
+from passage_index import PassageIndex
+from book_digest import BookDigest, DigestWorker
+from chapter_text import ChapterTextCache
+from epub_source import open_book_source
+from book_browser import BookTextBrowser
+from epub_parser import EpubBook, load_book
+from library_catalog import LibraryCatalog
+from caches import LRUCache
+from image_cache import ImageCache
+from chapter_model import ChapterTableModel
+from concurrent.futures import CancelledError, ThreadPoolExecutor, wait as futures_wait
 
 script_path = os.path.abspath(__file__)
 script_dir = os.path.dirname(script_path)
@@ -23,6 +39,11 @@ os.chdir(script_dir)
 
 
 class EpubReader(QMainWindow):
+    # 播放线程读完缓冲区后发出，参数为该次播放的缓冲区（跨线程排队到主线程处理）
+    playback_finished = pyqtSignal(object)
+    # 后台复制书籍进书库失败时发出，参数为错误说明
+    import_failed = pyqtSignal(str)
+
     def __init__(self, *args, **kwargs):
         """初始化EPUB阅读器主窗口"""
         super().__init__(*args, **kwargs)
@@ -32,8 +53,29 @@ class EpubReader(QMainWindow):
         self.resize(1600, 1000)
 
         # 语音相关初始化
-        self.xfyun_tts = None
         self.is_playing = False
+        self.audio_buffer = None
+        self.reading_chapter = None
+        # 朗读时提前合成的片段数，以及播放缓冲区大小（16kHz 16位单声道约4秒）
+        self.tts_lookahead = 2
+        self.playback_buffer_bytes = 128 * 1024
+        # 合成过的语音按文本和发音参数缓存在磁盘上，重听时不再请求接口
+        self.tts_cache = TTSAudioCache(os.path.join(script_dir, "cache", "tts"))
+        # 常驻的音频输出服务，PortAudio 只初始化一次，输出流在多次播放之间复用
+        self.audio_output = AudioOutput(block_size=4096, latency=0.1)
+        self.playback_finished.connect(self.on_playback_finished)
+        self.import_failed.connect(lambda message: self.status_bar.showMessage(message, 5000))
+        # 可选的语音引擎，切换后从下一次朗读开始生效
+        self.tts_engines = {
+            "讯飞在线语音": XFYunTTS,
+            "espeak-ng 离线语音": EspeakTTS,
+        }
+        self.tts_engine_name = "讯飞在线语音"
+        # 语音引擎池：限制同时进行的合成会话数和每秒发起的请求数，切换引擎时重建
+        self.tts_pool = None
+        self.tts_concurrency = 3
+        self.tts_max_qps = 3.0
+        self.prerender_thread = None
 
         # 初始化行间距和段间距
         self.line_spacing = 20
@@ -50,21 +92,32 @@ class EpubReader(QMainWindow):
         # 创建主内容分割器
         self.main_splitter = QSplitter(Qt.Orientation.Horizontal)
 
-        # 左侧章节表格
-        self.table_widget = QTableWidget()
-        self.table_widget.setColumnCount(1)
-        self.table_widget.setHorizontalHeaderLabels(["章节"])
-        self.table_widget.verticalHeader().setVisible(False)
-        self.table_widget.itemDoubleClicked.connect(self.render_selected_file)
+        # 左侧章节表格（模型按需分批提供行，适合上千章的书）
+        self.chapter_model = ChapterTableModel(self)
+        self.chapter_view = QTableView()
+        self.chapter_view.setModel(self.chapter_model)
+        self.chapter_view.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.chapter_view.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        self.chapter_view.horizontalHeader().setStretchLastSection(True)
+        self.chapter_view.verticalHeader().setVisible(False)
+        self.chapter_view.doubleClicked.connect(self.render_selected_file)
 
         # 中部主文本框
-        self.text_browser = QTextBrowser()
+        self.text_browser = BookTextBrowser()
+        self.text_browser.set_spacing(self.line_spacing, self.paragraph_spacing)
+        self.text_browser.progress_changed.connect(self.update_progress)
+
+        # 间距滑块的防抖定时器：停止拖动一段时间后才重新排版
+        self.spacing_timer = QTimer(self)
+        self.spacing_timer.setSingleShot(True)
+        self.spacing_timer.setInterval(150)
+        self.spacing_timer.timeout.connect(self.apply_spacing)
 
         # 创建右侧AI区域
         self.ai_widget = AIWidget(self)
 
         # 添加到主分割器
-        self.main_splitter.addWidget(self.table_widget)
+        self.main_splitter.addWidget(self.chapter_view)
         self.main_splitter.addWidget(self.text_browser)
         self.main_splitter.addWidget(self.ai_widget)
 
@@ -88,8 +141,28 @@ class EpubReader(QMainWindow):
         self.font_size = 14
         self.sentences = []
         self.current_sentence_index = -1
-        self.html_path_name = []
+        self.book_source = None
+        self.book = None
+        self.book_paths = {}
         self.is_eye_protection_mode_active = False
+        self.search_index = None
+        self.passage_index = None
+        self.index_thread = None
+        # 全书摘要及正在运行的摘要任务
+        self.book_digest = None
+        self.digest_worker = None
+        self.reading_progress = 0
+        self.catalog = LibraryCatalog(os.path.join(script_dir, "cache", "library_catalog.json"))
+
+        # 处理好的章节HTML缓存（按书籍、章节和样式参数区分），以及预取相邻章节的后台线程
+        self.chapter_cache = LRUCache(max_items=32, max_bytes=32 * 1024 * 1024)
+        # 章节纯文本缓存，朗读、AI功能和搜索索引共用，每章只提取一次
+        self.chapter_texts = ChapterTextCache()
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+        # 章节图片只解码一次并缩小到显示宽度，内存LRU之外还有磁盘缓存
+        self.image_cache = ImageCache(os.path.join(script_dir, "cache", "images"))
+        self.text_browser.image_cache = self.image_cache
 
         # 初始化字体
         self.font = QFont("Microsoft YaHei", 14)
@@ -176,53 +249,135 @@ class EpubReader(QMainWindow):
         self.favorites_file = os.path.join(os.path.dirname(__file__), "book", "favorites.txt")
         hbox3.addWidget(QPushButton("收藏", clicked=self.add_to_favorites))
         hbox3.addWidget(QPushButton("查看收藏", clicked=self.show_favorites))
+
+        # 语音引擎
+        hbox3.addWidget(QLabel("语音引擎:"))
+        self.tts_engine_combo = QComboBox()
+        self.tts_engine_combo.addItems(list(self.tts_engines))
+        self.tts_engine_combo.setCurrentText(self.tts_engine_name)
+        self.tts_engine_combo.currentTextChanged.connect(self.set_tts_engine)
+        hbox3.addWidget(self.tts_engine_combo)
+        hbox3.addWidget(QPushButton("预合成本章", clicked=self.prerender_chapter))
         main_layout.addLayout(hbox3)
 
+    def set_tts_engine(self, engine_name):
+        """选择朗读使用的语音引擎"""
+        self.tts_engine_name = engine_name
+
+    def get_tts_pool(self):
+        """取得当前语音引擎的引擎池，引擎切换后重新创建"""
+        if self.tts_pool is None or self.tts_pool.name != self.tts_engine_name:
+            if self.tts_pool is not None:
+                self.tts_pool.close()
+            self.tts_pool = TTSClientPool(self.create_tts_client, self.tts_concurrency, self.tts_max_qps,
+                                          self.tts_engine_name)
+        return self.tts_pool
+
+    def prerender_chapter(self):
+        """在后台把当前章节全部合成到语音缓存，之后朗读时不再等待合成"""
+        if self.prerender_thread is not None and self.prerender_thread.isRunning():
+            self.prerender_worker.stop()
+            self.status_bar.showMessage("已停止预合成", 3000)
+            return
+
+        reading_key, current_text = self.get_reading_text()
+        sentences = split_sentences(current_text)
+        if not sentences:
+            self.status_bar.showMessage("没有可合成的文本内容", 3000)
+            return
+        try:
+            tts_pool = self.get_tts_pool()
+        except Exception as e:
+            self.status_bar.showMessage(f"初始化语音引擎失败: {str(e)}", 5000)
+            return
+
+        self.prerender_thread = QThread()
+        self.prerender_worker = PrerenderWorker(tts_pool, sentences, self.tts_cache)
+        self.prerender_worker.moveToThread(self.prerender_thread)
+        self.prerender_thread.started.connect(self.prerender_worker.run)
+        self.prerender_worker.progress.connect(
+            lambda done, total: self.status_bar.showMessage(f"正在预合成本章: {done}/{total}", 5000))
+        self.prerender_worker.prerender_finished.connect(lambda message: self.status_bar.showMessage(message, 5000))
+        self.prerender_worker.prerender_error.connect(
+            lambda error_msg: self.status_bar.showMessage(f"预合成失败: {error_msg}", 5000))
+        self.prerender_worker.finished.connect(self.prerender_thread.quit)
+        self.prerender_thread.start()
+
+    def create_tts_client(self):
+        """按当前选择的引擎创建语音合成客户端，由引擎池按需调用"""
+        engine_class = self.tts_engines[self.tts_engine_name]
+        if engine_class is not XFYunTTS:
+            return engine_class()
+####———————————————————————————————————————————————————————————————填入API接口——————————————————————————————————————————————————————
+        return XFYunTTS(
+            APPID='',
+            APIKey='',
+            APISecret=''
+        )
+
+    def get_reading_text(self):
+        """取得当前章节的全文，没有选中章节时退回到当前显示的文本"""
+        chapter_href = self.chapter_view.currentIndex().data(Qt.ItemDataRole.UserRole)
+        if self.book_source is not None and chapter_href and self.book_source.exists(chapter_href):
+            return (self.book_source.path, chapter_href), self.get_chapter_text(chapter_href)
+        return None, self.text_browser.toPlainText()
+
+    def get_chapter_text(self, chapter_href):
+        """取得章节纯文本：先查共享的章节文本缓存，没有时才提取"""
+        return self.chapter_texts.get(self.book_source, chapter_href)
+
     def play_current_text(self):
-        """播放当前页面的文本"""
+        """朗读当前章节：从上次停下的句子继续，读完后再次播放则从头开始"""
         if self.is_playing:
             return
 
-        current_text = self.text_browser.toPlainText()
-        if not current_text:
+        reading_key, current_text = self.get_reading_text()
+        if reading_key is None or reading_key != self.reading_chapter:
+            self.sentences = split_sentences(current_text)
+            self.current_sentence_index = 0
+            self.reading_chapter = reading_key
+        if not self.sentences:
             self.status_bar.showMessage("没有可播放的文本内容", 3000)
             return
+        if not 0 <= self.current_sentence_index < len(self.sentences):
+            self.current_sentence_index = 0
 
-        # 限制文本长度
-        if len(current_text) > 500:
-            current_text = current_text[:500] + "..."
-####———————————————————————————————————————————————————————————————填入API接口——————————————————————————————————————————————————————
-        # 初始化 TTS 引擎
-        if not hasattr(self, 'xfyun_tts') or self.xfyun_tts is None:
-            try:
-                self.xfyun_tts = XFYunTTS(
-                    APPID='',
-                    APIKey='',
-                    APISecret=''
-                )
-            except Exception as e:
-                self.status_bar.showMessage(f"初始化语音引擎失败: {str(e)}", 5000)
-                return
+        try:
+            tts_pool = self.get_tts_pool()
+        except Exception as e:
+            self.status_bar.showMessage(f"初始化语音引擎失败: {str(e)}", 5000)
+            return
 
         self.status_bar.showMessage("正在生成语音...", 3000)
         self.is_playing = True
         self.audio_playing = True
 
+        # 合成线程把音频帧写入环形缓冲区，播放线程同时从中读取，收到首帧即开始发声；
+        # 缓冲区只保留几秒音频，朗读进度与实际发声相差不多
+        self.audio_buffer = PcmRingBuffer(self.playback_buffer_bytes)
+        self.tts_start_time = time.perf_counter()
+        self.audio_output.play(self.audio_buffer, tts_pool.sample_rate, on_finished=self.playback_finished.emit)
+
         # 创建线程和 worker
         self.play_thread = QThread()
-        self.play_worker = self.TTSWorker(
-            self.xfyun_tts,
-            current_text,
-            self.max_retries
+        self.play_worker = TTSWorker(
+            tts_pool,
+            self.sentences,
+            self.current_sentence_index,
+            self.audio_buffer,
+            self.tts_lookahead,
+            self.max_retries,
+            self.tts_cache
         )
         self.play_worker.moveToThread(self.play_thread)
 
         # 连接信号
         self.play_thread.started.connect(self.play_worker.run_tts)
+        self.play_worker.first_audio.connect(self.on_first_audio)
+        self.play_worker.sentence_started.connect(self.on_sentence_started)
         self.play_worker.tts_finished.connect(self.on_tts_finished)
         self.play_worker.tts_error.connect(self.on_tts_error)
         self.play_worker.finished.connect(self.play_thread.quit)
-        self.play_thread.finished.connect(self.cleanup_playback)
 
         # 启动线程
         self.play_thread.start()
@@ -249,73 +404,33 @@ class EpubReader(QMainWindow):
         self.is_playing = False
         self.status_bar.showMessage("播放已停止", 3000)
 
-    def on_tts_finished(self, audio_data):
-        """TTS 完成信号处理"""
-        try:
-            # 保存音频到临时文件
-            temp_file = "temp_playback.pcm"
-            with open(temp_file, "wb") as f:
-                f.write(audio_data)
-
-            # 在单独的线程中播放音频
-            self.audio_thread = threading.Thread(
-                target=self.play_audio,
-                args=(temp_file,),
-                daemon=True
-            )
-            self.audio_thread.start()
+    def on_first_audio(self):
+        """收到第一帧音频时显示首帧延迟"""
+        elapsed_ms = (time.perf_counter() - self.tts_start_time) * 1000
+        self.status_bar.showMessage(f"正在播放（首帧 {elapsed_ms:.0f} ms）", 5000)
 
-        except Exception as e:
-            self.status_bar.showMessage(f"播放准备失败: {str(e)}", 5000)
-            self.cleanup_playback()
+    def on_sentence_started(self, index):
+        """记录朗读进度，停止后从这一句继续"""
+        self.current_sentence_index = index
+        self.status_bar.showMessage(f"正在朗读第 {index + 1}/{len(self.sentences)} 句", 5000)
 
-    def play_audio(self, file_path):
-        """播放音频文件"""
-        try:
-            p = pyaudio.PyAudio()
-            stream = None
-            try:
-                stream = p.open(format=pyaudio.paInt16,
-                                channels=1,
-                                rate=16000,
-                                output=True)
-
-                with open(file_path, 'rb') as f:
-                    while self.audio_playing:
-                        data = f.read(1024)
-                        if not data:
-                            break
-                        stream.write(data)
-            finally:
-                if stream:
-                    stream.stop_stream()
-                    stream.close()
-                p.terminate()
-        except Exception as e:
-            print(f"播放错误: {e}")
-        finally:
-            try:
-                os.remove(file_path)
-            except:
-                pass
+    def on_tts_finished(self):
+        """TTS 完成信号处理：音频已全部写入缓冲区，播放线程读完后自行结束"""
+        self.current_sentence_index = len(self.sentences)
 
     def cleanup_audio_resources(self):
-        """清理音频资源"""
+        """清理音频资源：丢弃尚未播放的音频，输出设备保持打开供下次使用"""
         self.audio_playing = False
 
-        if hasattr(self, 'audio_stream') and self.audio_stream:
-            try:
-                self.audio_stream.stop_stream()
-                self.audio_stream.close()
-            except:
-                pass
-        if hasattr(self, 'p') and self.p:
-            try:
-                self.p.terminate()
-            except:
-                pass
-        self.p = None
-        self.audio_stream = None
+        # 唤醒等待中的合成线程和播放线程
+        if self.audio_buffer:
+            self.audio_buffer.abort()
+        self.audio_output.stop()
+
+    def on_playback_finished(self, audio_buffer):
+        """播放线程结束；已停止后又开始的新一次播放不受旧线程影响"""
+        if audio_buffer is self.audio_buffer:
+            self.cleanup_playback()
 
     def cleanup_playback(self):
         """清理播放资源"""
@@ -344,58 +459,22 @@ class EpubReader(QMainWindow):
         }}
         """
         self.text_browser.setStyleSheet(style_sheet)
-    ##注释改====2  详细注释
     def update_line_spacing(self, value):
-        """更新行间距"""
+        """更新行间距（拖动滑块时合并为一次重新排版）"""
         self.line_spacing = value
         self.line_spacing_label.setText(f"行间距: {value}")
-
-        # 更新当前显示的文本样式
-        if self.text_browser.toPlainText():
-            # 获取当前HTML内容
-            html = self.text_browser.toHtml()
-
-            # 使用正则表达式更新或添加行间距样式
-            if "line-height:" in html:
-                html = re.sub(r"line-height:\s*\d+px", f"line-height: {value}px", html)
-            else:
-                # 在第一个<style>标签后添加行间距样式
-                if "<style>" in html:
-                    html = html.replace("<style>", f"<style>\np {{ line-height: {value}px; }}")
-                else:
-                    # 如果没有样式标签，在头部添加
-                    head_end = html.find("</head>")
-                    if head_end != -1:
-                        html = html[:head_end] + f"<style>p {{ line-height: {value}px; }}</style>" + html[head_end:]
-
-            # 重新设置HTML内容
-            self.text_browser.setHtml(html)
+        self.spacing_timer.start()
 
     def update_paragraph_spacing(self, value):
-        """更新段间距"""
+        """更新段间距（拖动滑块时合并为一次重新排版）"""
         self.paragraph_spacing = value
         self.paragraph_spacing_label.setText(f"段间距: {value}")
+        self.spacing_timer.start()
 
-        # 更新当前显示的文本样式
-        if self.text_browser.toPlainText():
-            # 获取当前HTML内容
-            html = self.text_browser.toHtml()
+    def apply_spacing(self):
+        """滑块停止变化后，把行间距和段间距应用到文本浏览器"""
+        self.text_browser.set_spacing(self.line_spacing, self.paragraph_spacing)
 
-            # 使用正则表达式更新或添加段间距样式
-            if "margin-bottom:" in html:
-                html = re.sub(r"margin-bottom:\s*\d+px", f"margin-bottom: {value}px", html)
-            else:
-                # 在第一个<style>标签后添加段间距样式
-                if "<style>" in html:
-                    html = html.replace("<style>", f"<style>\np {{ margin-bottom: {value}px; }}")
-                else:
-                    # 如果没有样式标签，在头部添加
-                    head_end = html.find("</head>")
-                    if head_end != -1:
-                        html = html[:head_end] + f"<style>p {{ margin-bottom: {value}px; }}</style>" + html[head_end:]
-
-            # 重新设置HTML内容
-            self.text_browser.setHtml(html)
     def toggle_sidebar(self):
         """切换左侧章节表格的显示/隐藏"""
         current_sizes = self.main_splitter.sizes()
@@ -468,142 +547,122 @@ class EpubReader(QMainWindow):
 
         if file_path:
             self.epub_file_path = file_path
-            self.unzip_file()
+            self.import_epub_file()
 
-    def unzip_file(self):
-        """解压EPUB文件"""
+    def import_epub_file(self):
+        """导入EPUB文件：直接从压缩包中读取，不再解压；在后台把文件复制进书库"""
         if not self.epub_file_path:
             return
 
-        # 获取 EPUB 文件的基本信息
         epub_file = os.path.basename(self.epub_file_path)
-        epub_folder = os.path.splitext(epub_file)[0]
-
-        book_path = os.path.join("book", epub_folder)
-
-        # 检查目标目录是否已存在
-        if not os.path.exists(book_path):
-            # 创建 book 目录
-            if not os.path.exists("book"):
-                os.makedirs("book")
-
-            # 复制 EPUB 文件到 book 目录
-            shutil.copy2(self.epub_file_path, os.path.join("book", epub_file))
-
-            # 将 EPUB 文件扩展名更改为 .zip
-            zip_file = os.path.splitext(epub_file)[0] + ".zip"
-            zip_file_path = os.path.join("book", zip_file)
-            os.rename(os.path.join("book", epub_file), zip_file_path)
-
-            # 解压缩 EPUB 文件
-            with zipfile.ZipFile(zip_file_path, 'r') as epub_zip:
-                epub_zip.extractall(book_path)
-
-        # 搜索目录并添加到QComboBox中
-        folders = self.search_folders_with_html(book_path)
-        for folder in folders:
-            self.file_combo.addItem(folder)
-        self.html_path_name = folders[0]
-
-        self.update_file_list()
-        self.render_selected_file()
-
-    def search_folders_with_html(self, start_path):
-        """搜索包含大于3个.html或.xhtml文件的目录"""
-        valid_folders = []
+        book_name = os.path.splitext(epub_file)[0]
+        library_path = os.path.join(script_dir, "book", epub_file)
 
-        for root, _, files in os.walk(start_path):
-            count = sum(1 for file in files if file.endswith(('.html', '.xhtml')))
-            if count > 3:
-                valid_folders.append(root)
+        if book_name not in self.book_paths:
+            self.book_paths[book_name] = self.epub_file_path
+            if not os.path.exists(library_path):
+                threading.Thread(target=self.copy_into_library, args=(self.epub_file_path, library_path),
+                                 daemon=True).start()
+            self.file_combo.addItem(book_name)
 
-        return valid_folders
+        index = self.file_combo.findText(book_name)
+        if index == self.file_combo.currentIndex():
+            self.auto_load_book(book_name)
+            self.load_and_render_first_file()
+        else:
+            self.file_combo.setCurrentIndex(index)
 
-    def render_selected_file(self, item=None):
+    def copy_into_library(self, source_path, library_path):
+        """在后台线程中把书籍复制进书库：先复制到同目录的临时文件再替换，中途退出不会留下不完整的书"""
+        temp_path = None
+        try:
+            library_dir = os.path.dirname(library_path)
+            os.makedirs(library_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=library_dir, suffix='.tmp')
+            os.close(fd)
+            shutil.copy2(source_path, temp_path)
+            os.replace(temp_path, library_path)
+        except OSError as e:
+            print(f"复制书籍到书库失败: {e}")
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            self.import_failed.emit(f"复制书籍到书库失败: {e}")
+
+    def render_selected_file(self, index=None):
         """渲染选中的文件内容"""
-        if item is None:
+        if index is None or not index.isValid() or self.book_source is None:
             return
 
-        # 获取双击或选中的文件名
-        selected_file_name = item.text()
+        # 获取双击或选中章节的书内路径
+        chapter_href = index.data(Qt.ItemDataRole.UserRole)
 
-        # 构建文件的完整路径    文件明
-        epub_file = os.path.basename(self.epub_file_path)
-        epub_folder = os.path.splitext(epub_file)[0]
+        file_content = self.get_chapter_html(self.book_source, chapter_href)
+        if file_content is not None:
+            # 在右侧渲染，样式表和图片由文本浏览器从书籍来源中按需加载
+            self.text_browser.set_chapter(self.book_source, chapter_href, file_content)
+            self.prefetch_neighbors(chapter_href)
 
-        selected_file_path0 = self.html_path_name + '/' + selected_file_name
-        selected_file_path = './' + re.sub(r'\\', '/', selected_file_path0)
+    def get_chapter_html(self, book_source, chapter_href):
+        """获取处理好的章节HTML，优先读取渲染缓存，章节不存在时返回 None
 
-        # 获取样式表的完整路径
-        stylesheet_path0 = "./book/" + epub_folder + "/EPUB/"
-        if os.path.exists(stylesheet_path0):
-            stylesheet_path = "./book/" + epub_folder + "/EPUB/stylesheet.css"
-            page_styles = "./book/" + epub_folder + "/EPUB/page_styles.css"
-        else:
-            stylesheet_path = "./book/" + epub_folder + "/stylesheet.css"
-            page_styles = "./book/" + epub_folder + "/page_styles.css"
-
-        if os.path.exists(selected_file_path):
-            # 读取选定文件的内容
-            with open(selected_file_path, "r", encoding="utf-8") as file:
-                file_content = file.read()
-
-                combined_style = f"""
-                        <style>
-                            img {{
-                                max-width: 100%;
-                                height: auto;
-                            }}
-                            p {{
-                                line-height: {self.line_spacing}px;
-                                margin-bottom: {self.paragraph_spacing}px;
-                            }}
-                        </style>
-                        """
+        行间距、段间距和图片尺寸由文本浏览器的默认样式表提供，不写入章节HTML。
+        """
+        cache_key = (book_source.path, chapter_href)
+        file_content = self.chapter_cache.get(cache_key)
+        if file_content is not None:
+            return file_content
+
+        if not book_source.exists(chapter_href):
+            return None
+
+        # 读取选定文件的内容
+        file_content = book_source.read_text(chapter_href)
+        self.chapter_cache.put(cache_key, file_content)
+        return file_content
+
+    def prefetch_neighbors(self, chapter_href):
+        """在后台线程中预先处理书脊上前后相邻的章节，翻章时直接命中缓存"""
+        index = self.book.index_of(chapter_href) if self.book else None
+        if index is None:
+            return
 
-                file_content = combined_style + file_content
-                style_tag = f"<style>{stylesheet_path}</style>"
-                # 将样式内容添加到HTML头部
-                file_content = file_content.replace('href="../../stylesheet.css', f'href="{stylesheet_path}')
-                file_content = file_content.replace('href="../../page_styles.css', f'href="{page_styles}')
+        book_source = self.book_source
+        neighbors = [self.book.spine[i].href for i in (index + 1, index - 1) if 0 <= i < len(self.book.spine)]
 
-                # 修复相对图片路径
-                image_base_path = os.path.join("book", epub_folder, "EPUB", "images")
-                file_content = file_content.replace('src="../images/', f'src="{image_base_path}/')
+        def prefetch():
+            for href in neighbors:
+                try:
+                    self.get_chapter_html(book_source, href)
+                except Exception as e:
+                    print(f"预取章节失败 {href}: {e}")
 
-                # 在右侧渲染修复后的内容
-                self.text_browser.setHtml(file_content)
+        self.prefetch_executor.submit(prefetch)
 
-     #注释改-----
     def update_file_list(self):
-        """更新文件列表，显示当前EPUB书籍的所有HTML/XHTML章节文件"""
-        if not self.epub_file_path or not os.path.exists("book"):
+        """按书脊顺序更新章节列表，显示目录标题，书内路径存放在 UserRole 数据中"""
+        if self.book is None:
             return
 
         try:
-            # 获取书籍基本信息
-            epub_file = os.path.basename(self.epub_file_path)
-            epub_folder = os.path.splitext(epub_file)[0]
-
-            # 确保路径存在
-            if not os.path.exists(self.html_path_name):
-                return
-
-            # 获取并过滤HTML/XHTML文件
-            all_files = os.listdir(self.html_path_name)
-            xhtml_files = sorted(
-                [f for f in all_files if f.lower().endswith(('.html', '.xhtml'))],
-                key=lambda x: [int(s) if s.isdigit() else s.lower() for s in re.split('([0-9]+)', x)]
-            )
-
-            # 更新表格控件
-            self.table_widget.setRowCount(len(xhtml_files))
-            for index, xhtml_file in enumerate(xhtml_files):
-                self.table_widget.setItem(index, 0, QTableWidgetItem(xhtml_file))
+            self.chapter_model.set_book(self.book)
 
         except Exception as e:
             print(f"更新文件列表时出错: {e}")
             self.status_bar.showMessage(f"更新文件列表失败: {str(e)}", 5000)
+
+    def open_chapter(self, document):
+        """跳转到指定章节：通过哈希索引直接找到行，选中并渲染，找不到时返回 False"""
+        row = self.chapter_model.row_of(document)
+        if row is None:
+            return False
+
+        self.chapter_model.ensure_loaded(row)
+        index = self.chapter_model.index(row, 0)
+        self.chapter_view.selectRow(row)
+        self.chapter_view.scrollTo(index)
+        self.render_selected_file(index)
+        return True
+
     def resizeEvent(self, event):
         """处理窗口大小变化事件"""
         super().resizeEvent(event)
@@ -691,54 +750,171 @@ class EpubReader(QMainWindow):
             self.text_browser.setStyleSheet(additional_style)
 
     def update_progress(self, value):
-        """更新进度条的值"""
-        self.progress_bar.setValue(value)
+        """更新进度条的值；生成全书摘要期间进度条显示摘要进度，阅读进度先记下"""
+        self.reading_progress = value
+        if self.digest_worker is None:
+            self.progress_bar.setValue(value)
+
+    def toggle_book_digest(self):
+        """开始为当前书籍生成全书摘要，正在生成时停止（已完成的章节保留，下次继续）"""
+        if self.digest_worker is not None:
+            self.digest_worker.cancel()
+            self.on_digest_finished("全书摘要已停止，下次将从断点继续")
+            return
+        if self.book_digest is None or self.book_source is None:
+            self.status_bar.showMessage("请先打开一本书", 3000)
+            return
+        backend = self.ai_widget.current_backend()
+        if backend is None:
+            return
+
+        self.digest_worker = DigestWorker(self.book_digest, self.book_source, self.get_chapter_hrefs(),
+                                          self.chapter_texts, backend, self.ai_widget.response_cache)
+        self.digest_worker.progress_signal.connect(self.on_digest_progress)
+        self.digest_worker.response_signal.connect(self.on_digest_finished)
+        self.digest_worker.error_signal.connect(lambda error: self.on_digest_finished(f"全书摘要出错: {error}"))
+        self.progress_bar.setFormat("全书摘要 %v/%m 章")
+        self.ai_widget.digest_btn.setText("停止全书摘要")
+        self.digest_worker.start()
+
+    def on_digest_progress(self, done, total):
+        """在进度条上显示全书摘要的进度"""
+        if self.digest_worker is None:
+            return
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def on_digest_finished(self, message):
+        """全书摘要结束或停止：恢复进度条显示阅读进度"""
+        if self.digest_worker is None:
+            return
+        self.digest_worker = None
+        self.progress_bar.setFormat("%p%")
+        self.progress_bar.setMaximum(100)
+        self.progress_bar.setValue(self.reading_progress)
+        self.ai_widget.digest_btn.setText("全书摘要")
+        self.status_bar.showMessage(message, 5000)
 
     def populate_books_combo(self):
         """填充书籍下拉框"""
         book_dir = os.path.join(script_dir, "book")
-        if os.path.exists(book_dir):
-            for book_name in os.listdir(book_dir):
-                book_path = os.path.join(book_dir, book_name)
-                if os.path.isdir(book_path):
-                    self.file_combo.addItem(book_name)
-
-            # 如果有书籍，自动加载第一本
-            if self.file_combo.count() > 0:
-                self.file_combo.setCurrentIndex(0)
-                self.auto_load_book(self.file_combo.currentText())
+
+        # 通过书库目录列出书籍：只做一次 listdir 和逐本 stat，不遍历书籍内部
+        # 填充期间屏蔽信号，避免每加入一项就触发一次加载
+        self.file_combo.blockSignals(True)
+        for book_name, book_path in self.catalog.refresh(book_dir):
+            self.book_paths[book_name] = book_path
+            self.file_combo.addItem(book_name)
+        self.file_combo.blockSignals(False)
+        self.catalog.save()
+
+        # 如果有书籍，自动加载第一本
+        if self.file_combo.count() > 0:
+            self.file_combo.setCurrentIndex(0)
+            self.auto_load_book(self.file_combo.currentText())
         self.load_and_render_first_file()
 
     def load_and_render_first_file(self):
         """加载并渲染第一个文件"""
-        if self.table_widget.rowCount() > 0:
-            first_item = self.table_widget.item(0, 0)
-            print("渲染文件：", first_item.text())
-            self.render_selected_file(first_item)
+        if self.chapter_model.rowCount() > 0:
+            first_index = self.chapter_model.index(0, 0)
+            print("渲染文件：", first_index.data(Qt.ItemDataRole.UserRole))
+            self.render_selected_file(first_index)
 
     def auto_load_book(self, book_name):
         """自动加载书籍"""
         # 设置 epub 文件路径
-        self.epub_file_path = os.path.join(script_dir, "book", book_name)
-        book_path = os.path.relpath(os.path.join(script_dir, "book", book_name), start=os.curdir)
-        folders = self.search_folders_with_html(book_path)
-        print(folders)
-        if folders:
-            self.html_path_name = folders[0]
+        self.epub_file_path = self.book_paths.get(book_name, os.path.join(script_dir, "book", book_name))
+        if self.book_source is not None:
+            self.retire_book_source(self.book_source)
+        try:
+            self.book_source = open_book_source(self.epub_file_path)
+        except Exception as e:
+            self.book_source = None
+            self.status_bar.showMessage(f"打开书籍失败: {str(e)}", 5000)
+            return
+
+        # 优先使用书库目录中缓存的书脊，没有时解析OPF并回填
+        book_data = self.catalog.get_book(book_name)
+        if book_data is not None:
+            self.book = EpubBook.from_dict(book_data)
+        else:
+            self.book = load_book(self.book_source)
+            self.catalog.put_book(book_name, self.epub_file_path, self.book.to_dict())
+            self.catalog.save()
+        self.book_digest = BookDigest(self.epub_file_path)
+        if self.book.spine:
             self.update_file_list()
+            self.refresh_search_index()
             self.render_selected_file()
 
+    def retire_book_source(self, book_source):
+        """换书时关闭旧书的数据源：等已排队的预取、索引线程和仍在处理旧书的全书摘要结束后，在后台线程中关闭"""
+        if self.text_browser.book_source is book_source:
+            self.text_browser.set_chapter(None, "", "")
+        # 预取线程池只有一个线程，排在最后的空任务完成时，之前的预取都已结束
+        prefetched = self.prefetch_executor.submit(lambda: None)
+        index_thread = self.index_thread
+        digest_request = None
+        if self.digest_worker is not None and self.digest_worker.source is book_source:
+            digest_request = self.digest_worker.request
+
+        def close_when_idle():
+            try:
+                prefetched.result()
+            except CancelledError:
+                pass
+            if index_thread is not None:
+                index_thread.join()
+            if digest_request is not None:
+                futures_wait([digest_request])
+            book_source.close()
+
+        threading.Thread(target=close_when_idle, daemon=True).start()
+
+    def get_chapter_hrefs(self):
+        """获取当前书籍按书脊顺序排列的章节书内路径"""
+        if self.book is None:
+            return []
+        return [chapter.href for chapter in self.book.spine]
+
+    def refresh_search_index(self):
+        """打开当前书籍的搜索索引和问答用的段落向量索引，并在后台线程中依次更新"""
+        epub_folder = os.path.splitext(os.path.basename(self.epub_file_path))[0]
+        index_path = os.path.join(script_dir, "cache", "search_index", epub_folder + ".json")
+        if self.search_index is None or self.search_index.index_path != index_path:
+            self.search_index = SearchIndex(index_path, self.chapter_texts)
+        passage_path = os.path.join(script_dir, "cache", "passage_index", epub_folder)
+        if self.passage_index is None or self.passage_index.index_path != passage_path:
+            self.passage_index = PassageIndex(passage_path, self.chapter_texts)
+
+        search_index = self.search_index
+        passage_index = self.passage_index
+        book_source = self.book_source
+        chapter_hrefs = self.get_chapter_hrefs()
+
+        def build():
+            try:
+                search_index.build(book_source, chapter_hrefs)
+            except Exception as e:
+                print(f"更新搜索索引出错: {e}")
+            # 段落索引在搜索索引之后建立，章节文本已在共享缓存中
+            try:
+                passage_index.build(book_source, chapter_hrefs)
+            except Exception as e:
+                print(f"更新段落索引出错: {e}")
+
+        self.index_thread = threading.Thread(target=build, daemon=True)
+        self.index_thread.start()
+
     def get_current_position(self):
-        """获取当前阅读位置"""
-        vertical_scrollbar = self.text_browser.verticalScrollBar()
-        position = vertical_scrollbar.value()
-        return position
+        """获取当前阅读位置 (分段序号, 纵向偏移)，整章渲染时分段序号为 None"""
+        return self.text_browser.reading_position()
 
     def go_to_position(self, position_info):
         """跳转到指定位置"""
         if "position" in position_info:
-            vertical_scrollbar = self.text_browser.verticalScrollBar()
-            vertical_scrollbar.setValue(position_info["position"])
+            self.text_browser.show_position(position_info.get("segment"), int(position_info["position"]))
 
     def show_favorites(self):
         """显示收藏对话框"""
@@ -752,25 +928,19 @@ class EpubReader(QMainWindow):
         print(favorite_info)
         book_name = favorite_info['book']
         document_name = favorite_info['document']
-        position = int(favorite_info['position'])
 
-        # 选中书名列表中的特定书籍
+        # 选中书名列表中的特定书籍（切换下拉框时会自动加载该书）
         index = self.file_combo.findText(book_name)
-        if index >= 0:
-            self.file_combo.setCurrentIndex(index)
+        if index < 0:
             self.auto_load_book(book_name)
-        self.auto_load_book(book_name)
+        elif index != self.file_combo.currentIndex():
+            self.file_combo.setCurrentIndex(index)
 
         # 找到对应的文档
-        for row in range(self.table_widget.rowCount()):
-            if self.table_widget.item(row, 0).text() == document_name:
-                self.table_widget.selectRow(row)
-                self.render_selected_file(self.table_widget.item(row, 0))
-                break
-
-        # 滚动到指定位置
-        scrollbar = self.text_browser.verticalScrollBar()
-        scrollbar.setValue(position)
+        self.open_chapter(document_name)
+
+        # 滚动到指定位置（超大章节先加载收藏时所在的分段）
+        self.go_to_position(favorite_info)
         print(f"打开收藏项: {favorite_info}")
 
     def scroll_to_percentage(self, percentage):
@@ -794,14 +964,20 @@ class EpubReader(QMainWindow):
     def add_to_favorites(self):
         """添加到收藏"""
         current_book = self.file_combo.currentText()
-        current_document = self.table_widget.currentItem().text()
-        current_position = self.get_current_position()
+        current_document = self.chapter_view.currentIndex().data(Qt.ItemDataRole.UserRole)
+        if not current_document:
+            self.status_bar.showMessage("请先选择一个章节", 3000)
+            return
+        segment, current_position = self.get_current_position()
         print(current_position)
         favorite_info = {
             "book": current_book,
             "document": current_document,
             "position": current_position
         }
+        # 分段渲染的超大章节中，position 是相对于该分段起点的偏移
+        if segment is not None:
+            favorite_info["segment"] = segment
 
         with open(self.favorites_file, "a") as file:
             json.dump(favorite_info, file)
@@ -822,69 +998,20 @@ class EpubReader(QMainWindow):
     def closeEvent(self, event):
         """窗口关闭事件"""
         self.stop_playback()  # 确保停止所有播放
-
-        # 清理 TTS 资源
-        if hasattr(self, 'xfyun_tts') and self.xfyun_tts:
-            if hasattr(self.xfyun_tts, 'ws') and self.xfyun_tts.ws:
-                try:
-                    self.xfyun_tts.ws.close()
-                except:
-                    pass
+        self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        self.audio_output.close()
+        if self.prerender_thread is not None and self.prerender_thread.isRunning():
+            self.prerender_worker.stop()
+            self.prerender_thread.quit()
+            self.prerender_thread.wait(2000)
+        if self.tts_pool is not None:
+            self.tts_pool.close()
+        if self.digest_worker is not None:
+            self.digest_worker.cancel()
+        AI_CLIENT.close()
 
         super().closeEvent(event)
 
-    class TTSWorker(QObject):
-        """TTS 工作线程"""
-        tts_finished = pyqtSignal(bytes)
-        tts_error = pyqtSignal(str)
-        finished = pyqtSignal()
-
-        def __init__(self, tts_client, text, max_retries=3):
-            super().__init__()
-            self.tts_client = tts_client
-            self.text = text
-            self.max_retries = max_retries
-            self._stop_requested = False
-            self._lock = threading.Lock()
-
-        def run_tts(self):
-            """执行 TTS 转换"""
-            retry_count = 0
-            last_error = None
-
-            while retry_count < self.max_retries and not self._stop_requested:
-                try:
-                    with self._lock:
-                        if self._stop_requested:
-                            return
-
-                    audio_data = self.tts_client.text_to_speech(self.text)
-
-                    with self._lock:
-                        if not self._stop_requested and audio_data:
-                            self.tts_finished.emit(audio_data)
-                            return
-
-                except Exception as e:
-                    last_error = str(e)
-                    retry_count += 1
-                    time.sleep(1)
-
-            # 所有重试都失败
-            if not self._stop_requested:
-                self.tts_error.emit(f"尝试 {self.max_retries} 次后失败: {last_error}")
-            self.finished.emit()
-
-        def stop(self):
-            """停止 TTS 转换"""
-            with self._lock:
-                self._stop_requested = True
-                if hasattr(self.tts_client, 'ws') and self.tts_client.ws:
-                    try:
-                        self.tts_client.ws.close()
-                    except:
-                        pass
-
 
 class FavoritesDialog(QDialog):
     """收藏对话框"""
@@ -901,7 +1028,10 @@ class FavoritesDialog(QDialog):
         layout.addWidget(self.list_widget)
 
         for favorite in favorites:
-            self.list_widget.addItem(f"{favorite['book']} - {favorite['document']} - {favorite['position']}")
+            item = QListWidgetItem(f"{favorite['book']} - {favorite['document']} - {favorite['position']}")
+            # 保留完整的收藏信息（包括分段序号），打开时不再从显示文本中解析
+            item.setData(Qt.ItemDataRole.UserRole, favorite)
+            self.list_widget.addItem(item)
 
         self.open_button = QPushButton("打开选中项")
         self.open_button.clicked.connect(self.open_selected_favorite)
@@ -911,7 +1041,7 @@ class FavoritesDialog(QDialog):
         """打开选中的收藏项"""
         selected_item = self.list_widget.currentItem()
         if selected_item:
-            favorite_info = self.get_favorite_info(selected_item.text())
+            favorite_info = selected_item.data(Qt.ItemDataRole.UserRole) or self.get_favorite_info(selected_item.text())
             self.open_favorite_signal.emit(favorite_info)
             self.hide()
 
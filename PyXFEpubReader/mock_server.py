@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+
+# 模拟回答使用的词表
+_WORDS = ["这一章", "主要", "讲述了", "人物", "之间", "的", "关系", "和", "事件", "发展", "，", "作者", "通过",
+          "细节", "描写", "表现", "时代", "背景", "。", "其中", "关键", "在于", "变化", "原因", "结果"]
+
+
+def mock_reply(prompt, tokens):
+    """由提示词确定性地生成一段回答：同样的提示词总是得到同样的 tokens 个词"""
+    seed = int.from_bytes(hashlib.sha256(prompt.encode('utf-8')).digest()[:8], 'big')
+    rng = random.Random(seed)
+    return [rng.choice(_WORDS) for _ in range(tokens)]
+
+
+class MockAIServer:
+    """本地模拟AI服务：实现 OpenAI 兼容的 /v1/chat/completions 流式接口，用于离线测试和压测
+
+    回答内容由提示词决定，每次相同；latency 为首字前的等待秒数，tokens_per_second 为之后的输出速度，
+    max_concurrency 为同时处理的请求数（超出的排队）。stats 记录请求数和同时处理的峰值。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, tokens_per_second=50.0, response_tokens=64,
+                 max_concurrency=8):
+        """port 为 0 时自动选择空闲端口"""
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.max_concurrency = max_concurrency
+        self.stats = {"requests": 0, "active": 0, "peak": 0}
+        self.server = None
+        self._slots = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+    async def start(self):
+        """在当前事件循环中开始监听"""
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """停止监听"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle(self, reader, writer):
+        """处理一个连接上的一次请求"""
+        try:
+            head = (await reader.readuntil(b"\r\n\r\n")).decode('latin-1')
+            request_line, *header_lines = head.split("\r\n")
+            length = 0
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value.strip())
+            body = json.loads(await reader.readexactly(length)) if length else {}
+
+            if not request_line.startswith("POST") or not request_line.split()[1].endswith("/chat/completions"):
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                return
+            prompt = "".join(message.get("content", "") for message in body.get("messages", []))
+            tokens = min(self.response_tokens, int(body.get("max_tokens") or self.response_tokens))
+
+            async with self._slots:
+                self.stats["requests"] += 1
+                self.stats["active"] += 1
+                self.stats["peak"] = max(self.stats["peak"], self.stats["active"])
+                try:
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                                 b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+                    await writer.drain()
+                    await asyncio.sleep(self.latency)
+                    interval = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+                    for word in mock_reply(prompt, tokens):
+                        event = {"object": "chat.completion.chunk", "model": body.get("model", "mock"),
+                                 "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                        writer.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+                        await writer.drain()
+                        if interval:
+                            await asyncio.sleep(interval)
+                    writer.write(b"data: [DONE]\n\n")
+                    await writer.drain()
+                finally:
+                    self.stats["active"] -= 1
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟AI服务（OpenAI 兼容接口）")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="首字前的等待秒数")
+    parser.add_argument("--tps", type=float, default=50.0, help="每秒输出的词数")
+    parser.add_argument("--tokens", type=int, default=64, help="每个回答的词数")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时处理的请求数")
+    args = parser.parse_args()
+
+    async def serve():
+        server = MockAIServer(port=args.port, latency=args.latency, tokens_per_second=args.tps,
+                              response_tokens=args.tokens, max_concurrency=args.concurrency)
+        await server.start()
+        print(f"模拟AI服务已启动: {server.url}")
+        await server.server.serve_forever()
+
+    asyncio.run(serve())
@@ -0,0 +1,271 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import zlib
+import numpy as np
+from chapter_text import html_to_text
+from search_index import tokenize
+
+# 索引格式版本，格式或向量化方式变化时旧索引自动作废
+PASSAGE_INDEX_VERSION = 2
+# 哈希向量的维度（2的幂），以及每个段落的字数上限
+VECTOR_DIM = 2048
+PASSAGE_CHARS = 300
+
+_BOUNDARY_RE = re.compile(r'[。！？!?；;…]+[”’"』」]?|\n+')
+
+
+def split_passages(text, max_chars=PASSAGE_CHARS):
+    """按句子边界把章节纯文本切成不超过 max_chars 字的段落，返回 [(起始偏移, 长度)]，超长句子按定长切开"""
+    spans = []
+    start = 0
+    last_end = 0
+    ends = [match.end() for match in _BOUNDARY_RE.finditer(text)]
+    ends.append(len(text))
+    for end in ends:
+        while end - start > max_chars:
+            cut = last_end if last_end > start else start + max_chars
+            spans.append((start, cut - start))
+            start = cut
+        last_end = end
+    if start < len(text):
+        spans.append((start, len(text) - start))
+    return [(offset, length) for offset, length in spans if text[offset:offset + length].strip()]
+
+
+def hash_features(text, dim=VECTOR_DIM):
+    """把文本的词元（中文二元组、拉丁词）哈希到 dim 个桶，返回 (桶编号数组, 符号数组)
+
+    用 crc32 而不是 hash()，保证不同进程算出的桶一致；符号位减轻哈希冲突带来的偏差。
+    """
+    codes = np.fromiter((zlib.crc32(token.encode('utf-8')) for token in tokenize(text)), dtype=np.uint32)
+    buckets = (codes % dim).astype(np.int64)
+    signs = np.where(codes >> 31, -1.0, 1.0).astype(np.float32)
+    return buckets, signs
+
+
+class PassageIndex:
+    """单本书的段落向量索引：用于整本书范围的问答检索
+
+    每章按句子边界切成段落，词元哈希到固定维度得到计数向量，以 float16 存在磁盘上并通过 numpy memmap 读取；
+    按桶统计的IDF和每行乘上IDF后的范数记录在旁边的 JSON 文件中，查询时再乘上IDF并除以范数，得到余弦相似度。
+    向量本身与IDF无关，章节变化后只需重新向量化变化的章节。段落正文不入索引，检索时从共享的章节文本缓存中按偏移取出。
+    """
+
+    def __init__(self, index_path, text_cache=None, dim=VECTOR_DIM):
+        """index_path 为索引文件路径（不含扩展名），text_cache 为共享的章节文本缓存"""
+        self.index_path = index_path
+        self.meta_path = index_path + ".json"
+        self.vectors_path = index_path + ".vec"
+        self.text_cache = text_cache
+        self.dim = dim
+        self.lock = threading.RLock()
+        self.source = None
+        self.hrefs = []        # 章节书内路径，段落用下标引用
+        self.passages = None   # 每行 [章节下标, 偏移, 长度]
+        self.idf = None
+        self.norms = None      # 每行乘上IDF后的范数
+        self.vectors = None    # (段落数, dim) 的 float16 memmap
+        self.ready = threading.Event()
+
+    def build(self, source, chapter_hrefs):
+        """章节签名与磁盘索引一致时直接加载，否则增量更新索引并写回磁盘，完成后置 ready"""
+        try:
+            signatures = {}
+            for href in chapter_hrefs:
+                try:
+                    signatures[href] = source.signature(href)
+                except (OSError, KeyError):
+                    continue
+            with self.lock:
+                self.source = source
+            if not self.load(signatures):
+                self.rebuild(source, chapter_hrefs, signatures)
+        finally:
+            self.ready.set()
+
+    def read_meta(self):
+        """读取磁盘索引的说明文件，文件缺失或格式版本不符时返回 None"""
+        if not os.path.exists(self.meta_path) or not os.path.exists(self.vectors_path):
+            return None
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取段落索引失败: {e}")
+            return None
+        if meta.get('version') != PASSAGE_INDEX_VERSION or meta.get('dim') != self.dim:
+            return None
+        return meta
+
+    def open_vectors(self, rows):
+        """以只读 memmap 打开磁盘上的向量，没有段落时返回 None"""
+        if not rows:
+            return None
+        return np.memmap(self.vectors_path, dtype=np.float16, mode='r', shape=(rows, self.dim))
+
+    def load(self, signatures):
+        """加载磁盘索引，文件缺失、版本不符或章节有变化时返回 False"""
+        meta = self.read_meta()
+        if meta is None or meta.get('signatures') != signatures:
+            return False
+        passages = np.array(meta['passages'], dtype=np.int64).reshape(-1, 3)
+        vectors = self.open_vectors(len(passages))
+        with self.lock:
+            self.hrefs = meta['hrefs']
+            self.passages = passages
+            self.idf = np.array(meta['idf'], dtype=np.float32)
+            self.norms = np.array(meta['norms'], dtype=np.float32)
+            self.vectors = vectors
+        return True
+
+    def rebuild(self, source, chapter_hrefs, signatures, block_rows=4096):
+        """更新索引：签名未变的章节沿用旧索引中的行，只切分并向量化有变化的章节，
+        再重算IDF和每行的范数，写入临时文件后替换旧索引"""
+        old_meta = self.read_meta()
+        old_passages = np.zeros((0, 3), dtype=np.int64)
+        reusable = {}       # 章节书内路径 -> 该章在旧向量文件中的行号
+        if old_meta is not None:
+            old_passages = np.array(old_meta['passages'], dtype=np.int64).reshape(-1, 3)
+            old_signatures = old_meta['signatures']
+            for chapter_index, href in enumerate(old_meta['hrefs']):
+                if href in signatures and old_signatures.get(href) == signatures[href]:
+                    reusable[href] = np.flatnonzero(old_passages[:, 0] == chapter_index)
+
+        hrefs = []
+        passages = []
+        rows = []           # 每个段落：旧向量文件中的行号，或新算出的 (桶编号数组, 符号数组)
+        for href in chapter_hrefs:
+            if href not in signatures:
+                continue
+            if href in reusable:
+                chapter_index = len(hrefs)
+                hrefs.append(href)
+                for row in reusable[href]:
+                    passages.append((chapter_index, int(old_passages[row][1]), int(old_passages[row][2])))
+                    rows.append(int(row))
+                continue
+            try:
+                if self.text_cache is not None:
+                    text = self.text_cache.get(source, href)
+                else:
+                    text = html_to_text(source.read_text(href))
+            except (OSError, KeyError) as e:
+                print(f"索引章节失败 {href}: {e}")
+                continue
+            chapter_index = len(hrefs)
+            hrefs.append(href)
+            for offset, length in split_passages(text):
+                passages.append((chapter_index, offset, length))
+                rows.append(hash_features(text[offset:offset + length], self.dim))
+
+        index_dir = os.path.dirname(self.index_path)
+        os.makedirs(index_dir, exist_ok=True)
+        temp_paths = []
+        try:
+            fd, temp_vectors = tempfile.mkstemp(dir=index_dir, suffix='.tmp')
+            os.close(fd)
+            temp_paths.append(temp_vectors)
+            # 按桶统计文档频率得到IDF，常见的桶权重低
+            document_freq = np.zeros(self.dim, dtype=np.float32)
+            vectors = None
+            if rows:
+                old_vectors = self.open_vectors(len(old_passages))
+                vectors = np.memmap(temp_vectors, dtype=np.float16, mode='w+', shape=(len(rows), self.dim))
+                for row, features in enumerate(rows):
+                    if isinstance(features, int):
+                        vectors[row] = old_vectors[features]
+                    else:
+                        buckets, signs = features
+                        vector = np.zeros(self.dim, dtype=np.float32)
+                        np.add.at(vector, buckets, signs)
+                        vectors[row] = vector
+                del old_vectors
+                for start in range(0, len(rows), block_rows):
+                    document_freq += np.count_nonzero(vectors[start:start + block_rows], axis=0)
+            idf = (np.log((len(rows) + 1) / (document_freq + 1)) + 1).astype(np.float32)
+            norms = np.zeros(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), block_rows):
+                block = vectors[start:start + block_rows].astype(np.float32) * idf
+                norms[start:start + len(block)] = np.linalg.norm(block, axis=1)
+            if vectors is not None:
+                vectors.flush()
+                del vectors
+
+            meta = {
+                'version': PASSAGE_INDEX_VERSION,
+                'dim': self.dim,
+                'signatures': signatures,
+                'hrefs': hrefs,
+                'passages': passages,
+                'idf': [round(float(value), 4) for value in idf],
+                'norms': [round(float(value), 4) for value in norms],
+            }
+            fd, temp_meta = tempfile.mkstemp(dir=index_dir, suffix='.tmp')
+            temp_paths.append(temp_meta)
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+            with self.lock:
+                # 替换前先放开旧的 memmap，否则 Windows 上无法覆盖正在映射的文件
+                self.vectors = None
+                os.replace(temp_vectors, self.vectors_path)
+                os.replace(temp_meta, self.meta_path)
+        except BaseException:
+            for path in temp_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        self.load(signatures)
+
+    def embed(self, text):
+        """把查询文本向量化，与段落向量使用同样的哈希和IDF"""
+        buckets, signs = hash_features(text, self.dim)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        np.add.at(vector, buckets, signs * self.idf[buckets])
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def search(self, question, top_k=5, block_rows=4096):
+        """返回与问题最相关的 top_k 个段落 [(章节书内路径, 偏移, 长度, 相似度)]，按相似度从高到低
+
+        查询向量很稀疏，只读出它非零的那几列参与计算；向量分块从 memmap 读取，内存占用与书的长度无关。
+        """
+        with self.lock:
+            vectors, passages, hrefs, idf, norms = self.vectors, self.passages, self.hrefs, self.idf, self.norms
+            if vectors is None or not len(passages):
+                return []
+            query = self.embed(question)
+        columns = np.flatnonzero(query)
+        if not len(columns):
+            return []
+        # 段落向量存的是计数，在这里乘上IDF
+        weights = query[columns] * idf[columns]
+        scores = np.empty(len(passages), dtype=np.float32)
+        for start in range(0, len(passages), block_rows):
+            block = vectors[start:start + block_rows, columns].astype(np.float32)
+            scores[start:start + len(block)] = block @ weights
+        scores /= np.where(norms > 0, norms, 1.0)
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(hrefs[passages[row][0]], int(passages[row][1]), int(passages[row][2]), float(scores[row]))
+                for row in best if scores[row] > 0]
+
+    def retrieve(self, question, top_k=5):
+        """检索相关段落并取出正文，返回 [(章节书内路径, 段落文本, 相似度)]"""
+        with self.lock:
+            source = self.source
+        results = []
+        for href, offset, length, score in self.search(question, top_k):
+            try:
+                if self.text_cache is not None:
+                    text = self.text_cache.get(source, href)
+                else:
+                    text = html_to_text(source.read_text(href))
+            except (OSError, KeyError):
+                continue
+            results.append((href, text[offset:offset + length].strip(), score))
+        return results
@@ -0,0 +1,291 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import QObject, pyqtSignal
+from audio_buffer import PcmRingBuffer
+
+# 句子结束符，后面可以跟引号或右括号
+_SENTENCE_RE = re.compile(r'[^。！？!?；;…\n]*[。！？!?；;…\n]+[”’」』）)]*|[^。！？!?；;…\n]+$')
+# 超长句子优先在这些标点处断开
+_CLAUSE_RE = re.compile(r'[^，,、：:]*[，,、：:]+|[^，,、：:]+$')
+
+# 每个合成片段的最大字数
+CHUNK_CHARS = 200
+# 第一个片段只取很短的一段，尽快发出声音
+FIRST_CHUNK_CHARS = 40
+# 单个片段缓冲区的初始容量（约16秒的16kHz单声道音频）。合成回调在讯飞的 WebSocket 线程上执行，
+# 阻塞会让服务端超时断开，所以缓冲区写满时扩容而不是等待，占用上限是一个片段的完整音频
+CHUNK_BUFFER_BYTES = 512 * 1024
+
+
+def split_sentences(text):
+    """把章节纯文本切成句子，去掉空白句"""
+    sentences = []
+    for match in _SENTENCE_RE.finditer(text):
+        sentence = match.group().strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+def build_chunks(sentences, start_index=0, max_chars=CHUNK_CHARS, first_chars=FIRST_CHUNK_CHARS):
+    """从第 start_index 句开始，把相邻句子合并成不超过 max_chars 的合成片段
+
+    返回 [(片段第一句的序号, 片段文本)]；超长句子按逗号等标点或定长再切开。
+    """
+    chunks = []
+    chunk_start = start_index
+    parts = []
+    length = 0
+    for index in range(start_index, len(sentences)):
+        limit = first_chars if not chunks else max_chars
+        for piece in _split_long(sentences[index], max_chars):
+            if parts and length + len(piece) > limit:
+                chunks.append((chunk_start, ''.join(parts)))
+                limit = max_chars
+                chunk_start = index
+                parts = []
+                length = 0
+            if not parts:
+                chunk_start = index
+            parts.append(piece)
+            length += len(piece)
+    if parts:
+        chunks.append((chunk_start, ''.join(parts)))
+    return chunks
+
+
+def chunks_from(sentences, start_index=0):
+    """整章按固定边界分片后，返回从第 start_index 句所在片段开始的片段
+
+    分片边界与起点无关，继续朗读和预合成得到的片段相同，可以共用语音缓存。
+    """
+    chunks = build_chunks(sentences)
+    first = 0
+    for index, (sentence_index, _) in enumerate(chunks):
+        if sentence_index <= start_index:
+            first = index
+    return chunks[first:]
+
+
+def _split_long(sentence, max_chars):
+    """把超过 max_chars 的句子切成若干段"""
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces = []
+    current = ''
+    for clause in _CLAUSE_RE.findall(sentence):
+        while len(clause) > max_chars:
+            pieces.append(clause[:max_chars])
+            clause = clause[max_chars:]
+        if current and len(current) + len(clause) > max_chars:
+            pieces.append(current)
+            current = ''
+        current += clause
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class TTSWorker(QObject):
+    """整章朗读线程：按顺序把各片段的音频写入播放缓冲区，同时提前并发合成后面 lookahead 个片段
+
+    每个片段合成到自己的缓冲区中，当前片段的音频随到随转入播放缓冲区；
+    播放缓冲区写满时本线程阻塞，因此内存占用只与 lookahead 和缓冲区容量有关。
+    """
+    # 开始把某个片段送入播放缓冲区时发出，参数为该片段第一句的序号
+    sentence_started = pyqtSignal(int)
+    first_audio = pyqtSignal()
+    tts_finished = pyqtSignal()
+    tts_error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, tts_pool, sentences, start_index, audio_buffer, lookahead=2, max_retries=3,
+                 audio_cache=None):
+        """tts_pool 为所用语音引擎的引擎池（TTSClientPool），决定使用哪种引擎朗读；
+        audio_cache 为可选的语音缓存"""
+        super().__init__()
+        self.tts_pool = tts_pool
+        self.sentences = sentences
+        self.start_index = start_index
+        self.audio_buffer = audio_buffer
+        self.lookahead = max(0, lookahead)
+        self.max_retries = max_retries
+        self.audio_cache = audio_cache
+        self.cache_hits = 0
+        self.executor = None
+        self.chunk_buffers = {}
+        self._stop_requested = False
+        self._lock = threading.Lock()
+
+    def run_tts(self):
+        """依次朗读从 start_index 开始的所有片段"""
+        chunks = chunks_from(self.sentences, self.start_index)
+        self.executor = ThreadPoolExecutor(max_workers=self.lookahead + 1, thread_name_prefix="tts")
+        pending = {}
+        delivered = False
+
+        try:
+            for index in range(len(chunks)):
+                # 当前片段和其后 lookahead 个片段都应已在合成中
+                for ahead in range(index, min(index + self.lookahead + 1, len(chunks))):
+                    if ahead not in pending and not self._stop_requested:
+                        pending[ahead] = self.submit(ahead, chunks[ahead][1])
+                if self._stop_requested:
+                    return
+
+                future = pending.pop(index)
+                chunk_buffer = self.chunk_buffers[index]
+                self.sentence_started.emit(chunks[index][0])
+                while True:
+                    data = chunk_buffer.read(4096)
+                    if not data:
+                        break
+                    if not delivered:
+                        delivered = True
+                        self.first_audio.emit()
+                    if not self.audio_buffer.write(data):
+                        return
+                with self._lock:
+                    self.chunk_buffers.pop(index, None)
+                if self._stop_requested:
+                    return
+
+                error = future.exception()
+                if error is not None:
+                    if not self._stop_requested:
+                        self.tts_error.emit(str(error))
+                    return
+
+            if not self._stop_requested:
+                self.tts_finished.emit()
+        finally:
+            with self._lock:
+                for chunk_buffer in self.chunk_buffers.values():
+                    chunk_buffer.abort()
+                self.chunk_buffers.clear()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.audio_buffer.close()
+            self.finished.emit()
+
+    def submit(self, index, text):
+        """为第 index 个片段分配缓冲区并提交合成任务"""
+        chunk_buffer = PcmRingBuffer(CHUNK_BUFFER_BYTES, growable=True)
+        with self._lock:
+            self.chunk_buffers[index] = chunk_buffer
+        return self.executor.submit(self.synthesize, text, chunk_buffer)
+
+    def synthesize(self, text, chunk_buffer):
+        """在合成线程中把一个片段合成到它的缓冲区，已有音频输出后失败则不再重试
+
+        命中语音缓存时直接写入缓存的音频；完整合成成功的音频写回缓存。
+        """
+        cache_key = None
+        if self.audio_cache is not None:
+            cache_key = self.audio_cache.key_for_client(text, self.tts_pool)
+            cached = self.audio_cache.get(cache_key)
+            if cached is not None:
+                with self._lock:
+                    self.cache_hits += 1
+                chunk_buffer.write(cached)
+                chunk_buffer.close()
+                return
+
+        delivered_bytes = 0
+        last_error = None
+        audio_data = bytearray() if cache_key is not None else None
+
+        def on_audio(chunk):
+            nonlocal delivered_bytes
+            if self._stop_requested:
+                return False
+            delivered_bytes += len(chunk)
+            if audio_data is not None:
+                audio_data.extend(chunk)
+            return chunk_buffer.write(chunk)
+
+        try:
+            for attempt in range(self.max_retries):
+                if self._stop_requested or chunk_buffer.aborted:
+                    return
+                try:
+                    self.tts_pool.synthesize(text, on_audio=on_audio, owner=self)
+                    # 缓冲区被中止（出错收尾或播放设备出错）时音频可能不完整，不写入缓存
+                    if cache_key is not None and not self._stop_requested and not chunk_buffer.aborted:
+                        self.audio_cache.put(cache_key, bytes(audio_data))
+                    return
+                except Exception as e:
+                    last_error = e
+                    # 已经写出部分音频时重试会重复朗读
+                    if delivered_bytes:
+                        break
+                    time.sleep(1)
+            if not self._stop_requested:
+                raise Exception(f"尝试 {attempt + 1} 次后失败: {last_error}")
+        finally:
+            chunk_buffer.close()
+
+    def stop(self):
+        """停止朗读：中止所有缓冲区，正在进行的合成在收到下一帧时结束"""
+        with self._lock:
+            self._stop_requested = True
+            self.audio_buffer.abort()
+            for chunk_buffer in self.chunk_buffers.values():
+                chunk_buffer.abort()
+        # 中断正在等待引擎输出的合成
+        self.tts_pool.cancel(self)
+
+
+class PrerenderWorker(QObject):
+    """整章预合成线程：通过引擎池并发合成整章所有片段并写入语音缓存，之后朗读全部命中缓存"""
+    progress = pyqtSignal(int, int)
+    prerender_finished = pyqtSignal(str)
+    prerender_error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, tts_pool, sentences, audio_cache):
+        """初始化预合成任务"""
+        super().__init__()
+        self.tts_pool = tts_pool
+        self.sentences = sentences
+        self.audio_cache = audio_cache
+        self._stop_requested = False
+
+    def run(self):
+        """合成缓存中还没有的片段，按片段顺序写入缓存并报告进度"""
+        try:
+            texts = [text for _, text in build_chunks(self.sentences)]
+            keys = [self.audio_cache.key_for_client(text, self.tts_pool) for text in texts]
+            missing = [index for index, key in enumerate(keys) if self.audio_cache.get(key) is None]
+            done = len(texts) - len(missing)
+            self.progress.emit(done, len(texts))
+
+            start_time = time.perf_counter()
+            audio_bytes = 0
+            results = self.tts_pool.map_ordered((texts[index] for index in missing), owner=self)
+            try:
+                for index, audio_data in zip(missing, results):
+                    if self._stop_requested:
+                        return
+                    self.audio_cache.put(keys[index], audio_data)
+                    audio_bytes += len(audio_data)
+                    done += 1
+                    self.progress.emit(done, len(texts))
+            finally:
+                results.close()
+
+            elapsed = time.perf_counter() - start_time
+            audio_seconds = audio_bytes / 2 / self.tts_pool.sample_rate
+            self.prerender_finished.emit(
+                f"预合成完成：{len(missing)} 段，音频 {audio_seconds:.0f} 秒，用时 {elapsed:.1f} 秒")
+        except Exception as e:
+            if not self._stop_requested:
+                self.prerender_error.emit(str(e))
+        finally:
+            self.finished.emit()
+
+    def stop(self):
+        """停止预合成"""
+        self._stop_requested = True
+        self.tts_pool.cancel(self)
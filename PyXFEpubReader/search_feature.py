@@ -1,11 +1,102 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QLineEdit, QPushButton,
-                             QListWidget, QLabel, QListWidgetItem, QHBoxLayout,
+                             QListView, QLabel, QHBoxLayout,
                              QTextEdit, QSplitter, QApplication)
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QAbstractListModel, QModelIndex
 from PyQt6.QtGui import QTextCursor, QTextCharFormat, QColor, QFont
-import os
-import re
-from bs4 import BeautifulSoup
+import threading
+import time
+from search_index import SearchHit
+
+# 仍在运行的搜索线程，保持引用直到线程结束，避免对话框关闭后线程对象被提前回收
+_active_workers = set()
+
+
+class SearchWorker(QThread):
+    """后台搜索线程，每处理完一个章节就把该章的结果发送出去"""
+
+    results_found = pyqtSignal(int, list)
+    search_done = pyqtSignal(int)
+
+    def __init__(self, search_id, search_index, keyword, html_files):
+        """初始化搜索线程"""
+        super().__init__()
+        self.search_id = search_id
+        self.search_index = search_index
+        self.keyword = keyword
+        self.html_files = html_files
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """请求取消搜索"""
+        self._cancelled.set()
+
+    def run(self):
+        """通过倒排索引逐章查找匹配项并分批发送"""
+        try:
+            for file_name, _, spans in self.search_index.iter_search(self.keyword, self.html_files):
+                if self._cancelled.is_set():
+                    return
+                hits = [SearchHit(file_name, start_pos, end_pos - start_pos) for start_pos, end_pos in spans]
+                self.results_found.emit(self.search_id, hits)
+        except Exception as e:
+            print(f"搜索出错: {e}")
+        if not self._cancelled.is_set():
+            self.search_done.emit(self.search_id)
+
+
+class SearchResultModel(QAbstractListModel):
+    """搜索结果列表模型：只保存 SearchHit，条目文字在视图需要显示时才从章节纯文本中截取
+
+    结果可能有十几万条，不为每条预先生成摘录或列表项。
+    """
+
+    # 列表条目中命中位置前后各显示的字数
+    LABEL_CONTEXT = 30
+
+    def __init__(self, parent=None):
+        """初始化空模型"""
+        super().__init__(parent)
+        self.hits = []
+        self.search_index = None
+        self.book = None
+
+    def reset(self, search_index=None, book=None):
+        """清空结果，之后的结果来自 search_index 所属的书籍"""
+        self.beginResetModel()
+        self.hits = []
+        self.search_index = search_index
+        self.book = book
+        self.endResetModel()
+
+    def append(self, hits):
+        """追加一批结果"""
+        if not hits:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.hits), len(self.hits) + len(hits) - 1)
+        self.hits.extend(hits)
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.hits)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.hits):
+            return None
+        hit = self.hits[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            # 章节纯文本来自共享的文本缓存，滚动时只为可见的几行截取摘录
+            text_content = self.search_index.text_of(hit.chapter) or ""
+            start = max(0, hit.offset - self.LABEL_CONTEXT)
+            snippet = text_content[start:hit.offset + hit.length + self.LABEL_CONTEXT]
+            return f"{self.book.title_of(hit.chapter)}: {' '.join(snippet.split())}"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return f"在 {hit.chapter} 中找到匹配"
+        if role == Qt.ItemDataRole.UserRole:
+            return index.row()
+        return None
+
 
 class SearchDialog(QDialog):
     def __init__(self, epub_reader, parent=None):
@@ -35,10 +126,13 @@ class SearchDialog(QDialog):
         self.splitter = QSplitter(Qt.Orientation.Horizontal)
         layout.addWidget(self.splitter)
 
-        # 结果列表
-        self.results_list = QListWidget()
-        self.results_list.itemSelectionChanged.connect(self.show_preview)
-        self.results_list.itemDoubleClicked.connect(self.go_to_result)
+        # 结果列表：所有条目都是单行，统一行高后视图不必逐条测量
+        self.results_model = SearchResultModel(self)
+        self.results_list = QListView()
+        self.results_list.setModel(self.results_model)
+        self.results_list.setUniformItemSizes(True)
+        self.results_list.selectionModel().currentChanged.connect(self.show_preview)
+        self.results_list.doubleClicked.connect(self.go_to_result)
         self.splitter.addWidget(self.results_list)
 
         # 预览面板
@@ -51,139 +145,150 @@ class SearchDialog(QDialog):
         self.status_label = QLabel("准备搜索")
         layout.addWidget(self.status_label)
 
-        # 存储搜索结果
-        self.search_results = []
-        self.current_html_content = ""
+        # 搜索结果（SearchHit 列表，与结果列表模型共用，章节正文统一从搜索索引中读取）
+        self.search_results = self.results_model.hits
+        self.search_index = None
+
+        # 后台搜索状态
+        self.worker = None
+        self.search_id = 0
+        self.search_keyword = ""
+        self.search_start_time = 0.0
+        self.first_result_ms = None
 
         # 设置分割器初始比例
         self.splitter.setSizes([300, 700])
 
     def do_search(self):
-        """执行搜索操作"""
+        """执行搜索操作：取消进行中的搜索，并在后台线程中启动新的搜索"""
         keyword = self.search_edit.text().strip()
         if not keyword:
             self.status_label.setText("错误: 请输入搜索关键词")
             return
 
-        self.results_list.clear()
+        search_index = self.epub_reader.search_index
+        if search_index is None:
+            self.status_label.setText("错误: 当前没有打开的书籍")
+            return
+
+        self.cancel_search()
+        self.results_model.reset(search_index, self.epub_reader.book)
         self.preview_pane.clear()
+        self.search_results = self.results_model.hits
         self.status_label.setText(f"正在搜索: {keyword}...")
-        QApplication.processEvents()
-
-        self.search_results = []
-
-        # 获取当前书籍的所有HTML文件
-        html_files = []
-        for row in range(self.epub_reader.table_widget.rowCount()):
-            item = self.epub_reader.table_widget.item(row, 0)
-            if item:
-                html_files.append(item.text())
-
-        # 搜索每个文件
-        results = []
-        for file_name in html_files:
-            file_path = os.path.join(self.epub_reader.html_path_name, file_name)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    soup = BeautifulSoup(content, 'html.parser')
-                    text_content = soup.get_text()
-
-                    # 使用正则表达式查找所有匹配项
-                    matches = re.finditer(re.escape(keyword), text_content, re.IGNORECASE)
-
-                    for match in matches:
-                        start_pos = match.start()
-                        end_pos = match.end()
-
-                        # 获取上下文片段
-                        context_start = max(0, start_pos - 100)
-                        context_end = min(len(text_content), end_pos + 100)
-                        snippet = text_content[context_start:context_end]
-
-                        # 高亮关键词
-                        highlighted_snippet = (
-                                snippet[:start_pos - context_start] +
-                                f"<span style='background-color:yellow;font-weight:bold;'>{snippet[start_pos - context_start:end_pos - context_start]}</span>" +
-                                snippet[end_pos - context_start:]
-                        )
-
-                        # 存储结果信息
-                        result_info = {
-                            'file_name': file_name,
-                            'file_path': file_path,
-                            'content': content,
-                            'text_content': text_content,
-                            'keyword': keyword,
-                            'keyword_position': start_pos,
-                            'keyword_length': len(keyword),
-                            'snippet': highlighted_snippet,
-                            'full_snippet': snippet
-                        }
-                        results.append(result_info)
-                        self.search_results.append(result_info)
-
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
-
-        # 显示结果
-        if not results:
-            self.status_label.setText(f"未找到包含'{keyword}'的结果")
+
+        # 按书脊顺序获取当前书籍的所有章节
+        html_files = self.epub_reader.get_chapter_hrefs()
+
+        self.search_id += 1
+        self.search_keyword = keyword
+        self.search_start_time = time.perf_counter()
+        self.first_result_ms = None
+
+        self.search_index = search_index
+        self.worker = SearchWorker(self.search_id, search_index, keyword, html_files)
+        self.worker.results_found.connect(self.on_results_found)
+        self.worker.search_done.connect(self.on_search_done)
+        _active_workers.add(self.worker)
+        self.worker.finished.connect(lambda worker=self.worker: _active_workers.discard(worker))
+        self.worker.start()
+
+    def cancel_search(self):
+        """取消进行中的搜索（后台线程会在处理完当前章节后退出）"""
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    def on_results_found(self, search_id, results):
+        """接收后台线程按章节送来的一批结果，并追加到结果列表"""
+        if search_id != self.search_id:
             return
 
-        self.status_label.setText(f"找到{len(results)}个结果")
+        if self.first_result_ms is None:
+            self.first_result_ms = (time.perf_counter() - self.search_start_time) * 1000
 
-        for i, result in enumerate(results):
-            # 显示更友好的结果条目
-            short_name = os.path.splitext(result['file_name'])[0]
-            item_text = f"{short_name}: {result['full_snippet'].strip()}"
+        # 条目文字由模型在显示时生成
+        self.results_model.append(results)
 
-            item = QListWidgetItem(item_text)
-            item.setToolTip(f"在 {result['file_name']} 中找到匹配")
-            item.setData(Qt.ItemDataRole.UserRole, i)
-            self.results_list.addItem(item)
+        self.status_label.setText(
+            f"正在搜索: {self.search_keyword}... 已找到{len(self.search_results)}个结果"
+            f"（首个结果用时 {self.first_result_ms:.0f} ms）")
+
+    def on_search_done(self, search_id):
+        """搜索完成后更新状态栏"""
+        if search_id != self.search_id:
+            return
+
+        self.worker = None
+        elapsed_ms = (time.perf_counter() - self.search_start_time) * 1000
+        if not self.search_results:
+            self.status_label.setText(f"未找到包含'{self.search_keyword}'的结果（用时 {elapsed_ms:.0f} ms）")
+            return
+
+        self.status_label.setText(
+            f"找到{len(self.search_results)}个结果"
+            f"（首个结果用时 {self.first_result_ms:.0f} ms，总用时 {elapsed_ms:.0f} ms）")
+
+    def done(self, result):
+        """关闭对话框时取消进行中的搜索"""
+        self.cancel_search()
+        super().done(result)
+
+    def get_snippet(self, text_content, hit, highlight=False):
+        """截取命中位置前后约100个字符的上下文，可选高亮关键词"""
+        context_start = max(0, hit.offset - 100)
+        context_end = min(len(text_content), hit.offset + hit.length + 100)
+        if not highlight:
+            return text_content[context_start:context_end]
+
+        # 高亮关键词
+        return (
+                text_content[context_start:hit.offset] +
+                f"<span style='background-color:yellow;font-weight:bold;'>{text_content[hit.offset:hit.offset + hit.length]}</span>" +
+                text_content[hit.offset + hit.length:context_end]
+        )
 
     def show_preview(self):
         """显示选中结果的预览"""
-        current_item = self.results_list.currentItem()
-        if not current_item:
+        current = self.results_list.currentIndex()
+        if not current.isValid():
             return
 
-        result_index = current_item.data(Qt.ItemDataRole.UserRole)
+        result_index = current.row()
         if 0 <= result_index < len(self.search_results):
-            result = self.search_results[result_index]
+            hit = self.search_results[result_index]
+            snippet = self.get_snippet(self.search_index.text_of(hit.chapter) or "", hit, highlight=True)
 
             # 显示带格式的预览
             preview_html = f"""
             <div style='font-family:Microsoft YaHei; font-size:12pt;'>
-                <h3>{result['file_name']}</h3>
-                <p>位置: 约 {result['keyword_position']} 字符处</p>
+                <h3>{hit.chapter}</h3>
+                <p>位置: 约 {hit.offset} 字符处</p>
                 <hr>
-                <div style='margin:10px;'>{result['snippet']}</div>
+                <div style='margin:10px;'>{snippet}</div>
             </div>
             """
             self.preview_pane.setHtml(preview_html)
 
-    def go_to_result(self, item):
+    def go_to_result(self, index):
         """跳转到选中结果的位置"""
-        result_index = item.data(Qt.ItemDataRole.UserRole)
+        result_index = index.row()
         if 0 <= result_index < len(self.search_results):
-            result = self.search_results[result_index]
-
-            # 在表格中找到并选中对应的文件
-            for row in range(self.epub_reader.table_widget.rowCount()):
-                if self.epub_reader.table_widget.item(row, 0).text() == result['file_name']:
-                    self.epub_reader.table_widget.selectRow(row)
-                    self.epub_reader.render_selected_file(self.epub_reader.table_widget.item(row, 0))
-
-                    # 等待渲染完成
-                    QApplication.processEvents()
-
-                    # 定位到关键词
-                    self.scroll_to_keyword(result['text_content'],
-                                           result['keyword_position'],
-                                           result['keyword_length'])
-                    break
+            hit = self.search_results[result_index]
+
+            # 通过章节索引直接找到并选中对应的文件
+            if self.epub_reader.open_chapter(hit.chapter):
+                # 等待渲染完成
+                QApplication.processEvents()
+
+                # 超大章节分段渲染时，先加载命中位置所在的分段
+                text_content = self.search_index.text_of(hit.chapter) or ""
+                self.epub_reader.text_browser.show_fraction(hit.offset / max(1, len(text_content)))
+
+                # 定位到关键词
+                self.scroll_to_keyword(text_content,
+                                       hit.offset,
+                                       hit.length)
         self.close()
 
     def scroll_to_keyword(self, text_content, keyword_pos, keyword_len):
@@ -0,0 +1,270 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from chapter_text import html_to_text
+
+# 索引格式版本，格式变化时旧索引自动作废
+INDEX_VERSION = 5
+
+_CJK_CHARS = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_CJK_RUN = re.compile(f'[{_CJK_CHARS}]')
+_TOKEN_RE = re.compile(f'[{_CJK_CHARS}]+|[0-9a-z]+')
+
+
+def tokenize(text):
+    """切分词元：中文按相邻二元组，孤立汉字保留单字，拉丁字母和数字按整词"""
+    tokens = set()
+    for match in _TOKEN_RE.finditer(text.lower()):
+        run = match.group()
+        if _CJK_RUN.match(run):
+            if len(run) == 1:
+                tokens.add(run)
+            else:
+                tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.add(run)
+    return tokens
+
+
+def query_terms(keyword):
+    """将查询拆成 (精确词元集合, 需在词表中做子串匹配的片段集合)"""
+    exact, partial = set(), set()
+    lowered = keyword.lower()
+    for match in _TOKEN_RE.finditer(lowered):
+        run = match.group()
+        if _CJK_RUN.match(run):
+            if len(run) == 1:
+                partial.add(run)
+            else:
+                exact.update(run[i:i + 2] for i in range(len(run) - 1))
+        elif match.start() > 0 and match.end() < len(lowered):
+            # 两侧都被非字母数字字符截断，在文档中必然是完整词元
+            exact.add(run)
+        else:
+            # 位于查询边缘的拉丁词可能只是文档中某个词的一部分
+            partial.add(run)
+    return exact, partial
+
+
+class SearchHit:
+    """一条搜索命中：只记录章节名、在章节纯文本中的偏移和长度，正文从索引中按需取"""
+
+    __slots__ = ('chapter', 'offset', 'length')
+
+    def __init__(self, chapter, offset, length):
+        self.chapter = chapter
+        self.offset = offset
+        self.length = length
+
+
+class SearchIndex:
+    """单本书的持久化倒排索引
+
+    倒排表只记录词元出现在哪些章节中，查询时先求候选章节的交集，
+    再在共享的章节文本缓存中取出章节纯文本，定位关键词的精确位置。章节正文不入索引。
+    """
+
+    def __init__(self, index_path, text_cache=None):
+        """初始化索引，index_path 为索引文件在磁盘上的位置，text_cache 为共享的章节文本缓存"""
+        self.index_path = index_path
+        self.text_cache = text_cache
+        # lock 只保护下面几项的读取和整体替换，重建倒排表和写文件都不持有它，不会卡住界面线程的查询
+        self.lock = threading.RLock()
+        # 同一时间只允许一个线程更新或写回索引
+        self.update_lock = threading.Lock()
+        self.source = None
+        self.chapters = []     # 章节槽位: {'name': 书内路径, 'sig'}，有章节删除时重新紧凑编号
+        self.name_to_id = {}
+        self.postings = {}     # 词元 -> 章节槽位编号集合
+        self.ready = threading.Event()
+        self.loaded = False
+
+    def build(self, source, chapter_hrefs):
+        """首次调用时加载磁盘索引，然后增量更新，完成后置 ready，有改动时写回磁盘"""
+        try:
+            with self.lock:
+                self.source = source
+                if not self.loaded:
+                    self.load()
+            changed = self.update(source, chapter_hrefs)
+        finally:
+            self.ready.set()
+        if changed:
+            self.save()
+
+    def load(self):
+        """从磁盘加载索引，文件缺失或版本不符时从空索引开始"""
+        chapters, name_to_id, postings = [], {}, {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取搜索索引失败: {e}")
+                data = {}
+            if data.get('version') == INDEX_VERSION:
+                chapters = data['chapters']
+                name_to_id = {chapter['name']: chapter_id for chapter_id, chapter in enumerate(chapters)}
+                postings = {token: set(ids) for token, ids in data['postings'].items()}
+        with self.lock:
+            self.loaded = True
+            self.chapters, self.name_to_id, self.postings = chapters, name_to_id, postings
+
+    def save(self):
+        """将索引写回磁盘（先写临时文件再替换，避免写一半的索引）
+
+        锁内只取当前索引的引用（更新时整体替换，不会原地修改），序列化和写文件都在锁外进行。
+        """
+        with self.update_lock:
+            with self.lock:
+                chapters, postings = self.chapters, self.postings
+            data = {
+                'version': INDEX_VERSION,
+                'chapters': [{'name': chapter['name'], 'sig': chapter['sig']} for chapter in chapters],
+                'postings': {token: sorted(ids) for token, ids in postings.items()},
+            }
+            index_dir = os.path.dirname(self.index_path)
+            os.makedirs(index_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=index_dir, suffix='.tmp')
+            try:
+                with open(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(temp_path, self.index_path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+    def update(self, source, chapter_hrefs):
+        """按章节书内路径列表增量更新索引，只重建签名有变化的章节，返回是否有改动
+
+        新的倒排表在锁外建好，最后在锁内一次替换，查询期间看到的始终是完整的旧索引或新索引。
+        """
+        with self.update_lock:
+            with self.lock:
+                chapters, name_to_id, postings = self.chapters, self.name_to_id, self.postings
+
+            wanted = set()
+            added = []          # [(书内路径, 签名, 词元集合)]
+            for href in chapter_hrefs:
+                wanted.add(href)
+                try:
+                    sig = source.signature(href)
+                except (OSError, KeyError):
+                    continue
+                chapter_id = name_to_id.get(href)
+                if chapter_id is not None and chapters[chapter_id]['sig'] == sig:
+                    continue
+                try:
+                    added.append((href, sig, tokenize(self.read_text(source, href))))
+                except (OSError, KeyError) as e:
+                    print(f"索引章节失败 {href}: {e}")
+
+            removed = {name_to_id[href] for href, _, _ in added if href in name_to_id}
+            removed.update(chapter_id for name, chapter_id in name_to_id.items() if name not in wanted)
+            if not added and not removed:
+                return False
+
+            # 复制出新的索引：旧的仍在被查询线程使用，不能原地修改
+            if removed:
+                # 有章节删除或变化时把剩下的章节重新紧凑编号，空出的槽位不会随重建次数累积
+                new_chapters = [chapter for chapter_id, chapter in enumerate(chapters) if chapter_id not in removed]
+                renumber = {name_to_id[chapter['name']]: chapter_id for chapter_id, chapter in enumerate(new_chapters)}
+                new_names = {chapter['name']: chapter_id for chapter_id, chapter in enumerate(new_chapters)}
+                new_postings = {}
+                for token, ids in postings.items():
+                    kept = {renumber[chapter_id] for chapter_id in ids if chapter_id in renumber}
+                    if kept:
+                        new_postings[token] = kept
+                copied = set(new_postings)
+            else:
+                # 没有删除时沿用旧的集合，只复制要追加章节的那些
+                new_chapters = list(chapters)
+                new_names = dict(name_to_id)
+                new_postings = dict(postings)
+                copied = set()
+            for href, sig, tokens in added:
+                chapter_id = len(new_chapters)
+                new_chapters.append({'name': href, 'sig': sig})
+                new_names[href] = chapter_id
+                for token in tokens:
+                    if token not in copied:
+                        new_postings[token] = set(new_postings.get(token, ()))
+                        copied.add(token)
+                    new_postings[token].add(chapter_id)
+
+            with self.lock:
+                self.chapters, self.name_to_id, self.postings = new_chapters, new_names, new_postings
+        return True
+
+    def read_text(self, source, name):
+        """通过共享的章节文本缓存取得章节纯文本，没有缓存时直接提取"""
+        if self.text_cache is not None:
+            return self.text_cache.get(source, name)
+        return html_to_text(source.read_text(name))
+
+    def candidate_chapters(self, keyword):
+        """通过倒排表求出可能包含关键词的章节编号（按槽位顺序）"""
+        with self.lock:
+            postings, name_to_id = self.postings, self.name_to_id
+        exact, partial = query_terms(keyword)
+        candidates = None
+        for token in exact:
+            ids = postings.get(token, set())
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        for fragment in partial:
+            ids = set()
+            for token, token_ids in postings.items():
+                if fragment in token:
+                    ids |= token_ids
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        if candidates is None:
+            candidates = name_to_id.values()
+        return sorted(candidates)
+
+    def text_of(self, name, sig=None):
+        """返回已索引章节的纯文本；给出 sig 时只在索引内容与该签名一致时返回，读取失败时返回 None"""
+        with self.lock:
+            chapter_id = self.name_to_id.get(name)
+            if chapter_id is None or self.source is None:
+                return None
+            chapter = self.chapters[chapter_id]
+            source = self.source
+        if sig is not None and chapter['sig'] != sig:
+            return None
+        try:
+            return self.read_text(source, name)
+        except (OSError, KeyError):
+            return None
+
+    def iter_search(self, keyword, chapter_order=None):
+        """逐章查询关键词，每个命中章节产出 (章节名, 章节纯文本, [(起始, 结束), ...])
+
+        chapter_order 为章节名列表时按该顺序输出结果，否则按索引顺序。
+        """
+        pattern = re.compile(re.escape(keyword), re.IGNORECASE)
+        self.ready.wait()
+        with self.lock:
+            chapters = [self.chapters[chapter_id] for chapter_id in self.candidate_chapters(keyword)]
+            source = self.source
+        if chapter_order is not None:
+            order = {name: i for i, name in enumerate(chapter_order)}
+            chapters.sort(key=lambda chapter: order.get(chapter['name'], len(order)))
+
+        for chapter in chapters:
+            try:
+                text = self.read_text(source, chapter['name'])
+            except (OSError, KeyError):
+                continue
+            spans = [match.span() for match in pattern.finditer(text)]
+            if spans:
+                yield chapter['name'], text, spans
+
+    def search(self, keyword, chapter_order=None):
+        """查询关键词，一次性返回 iter_search 的全部结果"""
+        return list(self.iter_search(keyword, chapter_order))
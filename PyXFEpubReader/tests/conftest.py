@@ -0,0 +1,23 @@
+import os
+import sys
+import pytest
+
+# 各模块按文件名直接导入，与在 PyXFEpubReader 目录下运行 main.py 时一致
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from epub_source import DirBookSource
+
+
+@pytest.fixture
+def make_book(tmp_path):
+    """在临时目录中写出 {书内路径: HTML} 的章节文件并返回该目录的书籍来源；再次调用可修改或增加章节"""
+    book_dir = tmp_path / "book"
+
+    def make(chapters):
+        for name, html in chapters.items():
+            path = book_dir / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(html, encoding='utf-8')
+        return DirBookSource(str(book_dir))
+
+    return make
@@ -0,0 +1,42 @@
+from ai_features import estimate_tokens, group_summaries, split_by_tokens
+
+
+def test_estimate_tokens_counts_cjk_per_char():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("汉字") == 3
+    assert estimate_tokens("abcdefgh") == 3
+
+
+def test_split_by_tokens_respects_budget_and_keeps_text():
+    text = "这是第一句。" * 30 + "很长的句子" * 40 + "。"
+    chunks = split_by_tokens(text, 50)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 51 for chunk in chunks)
+    assert "".join(chunks) == text
+
+
+def test_group_summaries_fits_budget_with_at_least_two_per_group():
+    summaries = ["摘" * 30] * 6
+    groups = group_summaries(summaries, 100)
+    assert [summary for group in groups for summary in group] == summaries
+    assert all(len(group) >= 2 for group in groups)
+    assert all(sum(estimate_tokens(summary) for summary in group) <= 100 for group in groups)
+    # 每轮都在减少
+    assert len(groups) < len(summaries)
+
+
+def test_group_summaries_merges_trailing_single_summary():
+    summaries = ["摘" * 30] * 7
+    groups = group_summaries(summaries, 100)
+    assert [len(group) for group in groups] == [3, 4]
+
+
+def test_group_summaries_oversized_items_still_pair_up():
+    summaries = ["摘" * 300] * 3
+    groups = group_summaries(summaries, 100)
+    assert all(len(group) >= 2 for group in groups)
+    assert sum(len(group) for group in groups) == 3
+
+
+def test_group_summaries_single_group_when_everything_fits():
+    assert group_summaries(["甲", "乙", "丙"], 100) == [["甲", "乙", "丙"]]
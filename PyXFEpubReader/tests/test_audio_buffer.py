@@ -0,0 +1,63 @@
+import threading
+from audio_buffer import PcmRingBuffer
+
+
+def read_all(buffer):
+    chunks = []
+    while True:
+        data = buffer.read(7)
+        if not data:
+            return b"".join(chunks)
+        chunks.append(data)
+
+
+def test_wraps_around_and_preserves_order():
+    buffer = PcmRingBuffer(16)
+    assert buffer.write(b"0123456789")
+    assert buffer.read(6) == b"012345"
+    assert buffer.write(b"abcdefghij")      # 写入跨过缓冲区末尾
+    assert len(buffer) == 14
+    buffer.close()
+    assert read_all(buffer) == b"6789abcdefghij"
+    assert buffer.read(4) == b""
+
+
+def test_full_buffer_blocks_writer_until_read():
+    buffer = PcmRingBuffer(8)
+    data = bytes(range(100))
+    writer = threading.Thread(target=lambda: (buffer.write(data), buffer.close()))
+    writer.start()
+    assert read_all(buffer) == data
+    writer.join(timeout=5)
+    assert not writer.is_alive()
+
+
+def test_write_and_read_timeouts():
+    buffer = PcmRingBuffer(4)
+    assert buffer.read(4, timeout=0.01) is None
+    assert buffer.write(b"abcd")
+    assert buffer.write(b"e", timeout=0.01) is False
+
+
+def test_abort_wakes_blocked_writer_and_drops_data():
+    buffer = PcmRingBuffer(4)
+    buffer.write(b"abcd")
+    results = []
+    writer = threading.Thread(target=lambda: results.append(buffer.write(b"efgh")))
+    writer.start()
+    buffer.abort()
+    writer.join(timeout=5)
+    assert results == [False]
+    assert buffer.aborted
+    assert buffer.read(4) == b""
+
+
+def test_growable_buffer_never_blocks_writer():
+    buffer = PcmRingBuffer(8, growable=True)
+    assert buffer.write(b"01234")
+    assert buffer.read(3) == b"012"
+    # 数据跨过末尾时扩容，原有内容按顺序搬到新缓冲区
+    assert buffer.write(b"abcdefghijklmnopqrstuvwxyz", timeout=0)
+    assert buffer.capacity >= 28
+    buffer.close()
+    assert read_all(buffer) == b"34abcdefghijklmnopqrstuvwxyz"
@@ -0,0 +1,67 @@
+import os
+import pytest
+from ai_backends import MockBackend
+from ai_client import AIClient
+from book_digest import BookDigest, DigestWorker
+from chapter_text import ChapterTextCache
+
+
+@pytest.fixture
+def client():
+    client = AIClient(max_pending=4)
+    yield client
+    client.close()
+
+
+def run_digest(client, digest, source, hrefs):
+    """用模拟服务跑一次全书摘要，返回 (结果说明, 实际发出的请求数)"""
+    backend = MockBackend({"backend": "mock", "latency": 0, "tokens_per_second": 0, "response_tokens": 8}, client)
+    worker = DigestWorker(digest, source, hrefs, ChapterTextCache(), backend, client=client)
+    message = client.submit(worker.run).result(timeout=30)
+    return message, backend.server.stats["requests"]
+
+
+def test_digest_round_trip_and_signature_check(tmp_path):
+    digest = BookDigest(str(tmp_path / "书.epub"))
+    assert digest.path == str(tmp_path / "书.digest.json")
+    digest.put("c1.html", [1, 2], "摘要")
+    digest.save()
+
+    reloaded = BookDigest(str(tmp_path / "书.epub"))
+    assert reloaded.get("c1.html", [1, 2]) == "摘要"
+    assert reloaded.get("c1.html", [1, 3]) is None
+    assert reloaded.get("c2.html", [1, 2]) is None
+
+
+def test_failed_save_leaves_no_temp_file(tmp_path):
+    digest = BookDigest(str(tmp_path / "书.epub"))
+    digest.put("c1.html", [1, 2], object())
+    with pytest.raises(TypeError):
+        digest.save()
+    assert os.listdir(tmp_path) == []
+
+
+def test_digest_resumes_from_saved_chapters(tmp_path, make_book, client):
+    source = make_book({f"c{i}.html": f"<p>第{i}章的内容。</p>" for i in range(1, 4)})
+    book_path = str(tmp_path / "书")
+
+    message, requests = run_digest(client, BookDigest(book_path), source, ["c1.html", "c2.html"])
+    assert requests == 2 and "共 2 章" in message
+
+    # 再次运行只总结新增的章节和内容变化的章节
+    make_book({"c1.html": "<p>第一章改写过了。</p>"})
+    digest = BookDigest(book_path)
+    message, requests = run_digest(client, digest, source, ["c1.html", "c2.html", "c3.html"])
+    assert requests == 2 and "共 3 章" in message
+    for href in ["c1.html", "c2.html", "c3.html"]:
+        assert digest.get(href, source.signature(href))
+
+    _, requests = run_digest(client, BookDigest(book_path), source, ["c1.html", "c2.html", "c3.html"])
+    assert requests == 0
+
+
+def test_unreadable_chapters_count_as_failed(tmp_path, make_book, client):
+    source = make_book({"c1.html": "<p>第一章的内容。</p>"})
+    message, requests = run_digest(client, BookDigest(str(tmp_path / "书")), source, ["c1.html", "missing.html"])
+    assert requests == 1
+    assert message.startswith("全书摘要完成 1/2 章，1 章失败（missing.html")
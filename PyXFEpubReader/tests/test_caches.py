@@ -0,0 +1,77 @@
+import os
+from caches import DiskCache, LRUCache
+
+
+def test_lru_evicts_least_recently_used_by_count():
+    cache = LRUCache(max_items=2, max_bytes=1000, sizeof=len)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.hits == 1
+
+
+def test_lru_byte_accounting_on_overwrite_and_eviction():
+    cache = LRUCache(max_items=10, max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("a", "xxxxxx")
+    assert cache.total_bytes == 6 and len(cache) == 1
+
+    cache.put("b", "yyyy")
+    assert cache.total_bytes == 10
+    cache.put("c", "z")
+    assert "a" not in cache
+    assert cache.total_bytes == 5
+
+    # 单项超过上限时不缓存，也不影响已有内容
+    cache.put("d", "w" * 11)
+    assert "d" not in cache and cache.total_bytes == 5
+
+    cache.clear()
+    assert cache.total_bytes == 0 and len(cache) == 0
+    assert cache.get("b", "默认") == "默认"
+
+
+def disk_usage(cache):
+    return sum(stat.st_size for _, stat in cache.iter_files())
+
+
+def test_disk_cache_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=1000)
+    assert cache.get("missing") is None
+    cache.put("键", b"value")
+    assert cache.get("键") == b"value"
+
+
+def test_disk_cache_overwrite_keeps_total_in_sync(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=1000)
+    cache.put("a", b"x" * 10)
+    cache.put("a", b"y" * 100)
+    cache.put("a", b"z" * 50)
+    assert cache.get("a") == b"z" * 50
+    assert cache.total_bytes == disk_usage(cache) == 50
+
+
+def test_disk_cache_prunes_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=300)
+    for index, key in enumerate(["a", "b", "c"]):
+        cache.put(key, b"x" * 100)
+        # 修改时间作为最近使用标记，拉开间隔以免同一时刻
+        os.utime(cache.path_of(key), (index, index))
+    os.utime(cache.path_of("a"), (10, 10))
+
+    cache.put("d", b"x" * 100)
+    assert cache.total_bytes <= 225
+    assert cache.total_bytes == disk_usage(cache)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("d") is not None
+
+
+def test_disk_cache_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=1000)
+    monkeypatch.setattr(os, "replace", lambda *args: (_ for _ in ()).throw(OSError("disk full")))
+    cache.put("key", b"x" * 10)
+    assert cache.get("key") is None
+    assert [name for _, _, names in os.walk(tmp_path) for name in names] == []
@@ -0,0 +1,45 @@
+import re
+from chapter_segments import SEGMENT_ANCHOR, split_chapter
+
+ANCHOR_RE = re.compile(f'<a name="{SEGMENT_ANCHOR}\\d+"></a>')
+
+
+def chapter(paragraphs):
+    body = "".join(f"<p>第{i}段 {'字' * 50}</p>" for i in range(paragraphs))
+    return f'<html><head><title>t</title></head><body><div class="main">{body}</div></body></html>'
+
+
+def test_small_chapter_is_one_segment():
+    segments = split_chapter("<html><body><p>短</p></body></html>")
+    assert len(segments) == 1
+    assert segments.head == "<html><body>"
+    assert f'<a name="{SEGMENT_ANCHOR}0"></a>' in segments.segments[0]
+
+
+def test_segments_cut_at_block_ends_and_reopen_outer_tags():
+    html = chapter(200)
+    segments = split_chapter(html, max_chars=2000)
+    assert len(segments) > 3
+    assert segments.head.endswith("<body>")
+
+    for index, segment in enumerate(segments.segments):
+        # 每段都带自己的锚点，外层 div 在段首重新打开、段尾补上结束标签
+        assert f'<a name="{SEGMENT_ANCHOR}{index}"></a>' in segment
+        assert segment.startswith('<div class="main">')
+        assert segment.count("<div") == segment.count("</div>")
+        assert segment.count("<p>") == segment.count("</p>")
+
+    # 去掉锚点和补出的标签后，正文按顺序完整保留
+    text = "".join(re.sub(r"<[^>]+>", "", ANCHOR_RE.sub("", segment)) for segment in segments.segments)
+    assert text == re.sub(r"<[^>]+>", "", html[html.index("<body>"):])
+
+
+def test_fraction_round_trip():
+    segments = split_chapter(chapter(200), max_chars=2000)
+    last = len(segments) - 1
+    assert segments.segment_at_fraction(0.0) == 0
+    assert segments.segment_at_fraction(1.0) == last
+    for index in range(len(segments)):
+        assert segments.segment_at_fraction(segments.fraction_of(index, 0.5)) == index
+    assert segments.fraction_of(last, 1.0) == 1.0
+    assert "</body></html>" in segments.build_html(0, 1)
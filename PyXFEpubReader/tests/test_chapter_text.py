@@ -0,0 +1,38 @@
+from chapter_text import ChapterTextCache, html_to_text
+
+
+def test_html_to_text_breaks_blocks_and_drops_markup():
+    html = """<?xml version="1.0"?>
+<html><head><title>标题不算正文</title><style>p { color: red; }</style></head>
+<body>
+  <h1>第一章</h1>
+  <!-- 注释 -->
+  <p>他说：&ldquo;你好&rdquo;&nbsp;<b>世界</b>。</p>
+  <p>第二行<br/>第三行</p>
+  <script>var x = "<p>脚本</p>";</script>
+  <ul><li>甲</li><li>乙</li></ul>
+</body></html>"""
+    assert html_to_text(html) == '第一章\n他说：“你好”\xa0世界。\n第二行\n第三行\n甲\n乙'
+
+
+def test_html_to_text_collapses_whitespace():
+    assert html_to_text("<p>  a \t  b  </p>\n\n\n<div>c</div>") == "a b\nc"
+    assert html_to_text("") == ""
+
+
+def test_chapter_text_cache_extracts_once_until_chapter_changes(make_book):
+    source = make_book({"c1.html": "<p>旧内容</p>"})
+    cache = ChapterTextCache()
+    assert cache.cached(source, "c1.html") is None
+    assert cache.get(source, "c1.html") == "旧内容"
+
+    calls = []
+    read_text = source.read_text
+    source.read_text = lambda name: calls.append(name) or read_text(name)
+    assert cache.get(source, "c1.html") == "旧内容"
+    assert calls == []
+
+    make_book({"c1.html": "<p>改过的新内容</p>"})
+    assert cache.cached(source, "c1.html") is None
+    assert cache.get(source, "c1.html") == "改过的新内容"
+    assert calls == ["c1.html"]
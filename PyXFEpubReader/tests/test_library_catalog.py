@@ -0,0 +1,21 @@
+import os
+
+from library_catalog import LibraryCatalog
+
+
+def test_failed_save_leaves_no_temp_file_and_is_retried(tmp_path, monkeypatch):
+    (tmp_path / "book" / "三国演义").mkdir(parents=True)
+    catalog_path = tmp_path / "cache" / "catalog.json"
+    catalog = LibraryCatalog(str(catalog_path))
+    assert [name for name, _ in catalog.refresh(str(tmp_path / "book"))] == ["三国演义"]
+
+    real_replace = os.replace
+    monkeypatch.setattr(os, "replace", lambda *args: (_ for _ in ()).throw(OSError("disk full")))
+    catalog.save()
+    assert catalog.dirty
+    assert os.listdir(catalog_path.parent) == []
+
+    monkeypatch.setattr(os, "replace", real_replace)
+    catalog.save()
+    assert not catalog.dirty
+    assert list(LibraryCatalog(str(catalog_path)).entries) == ["三国演义"]
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import pytest
+from ai_backends import OpenAICompatibleBackend, create_backend
+from ai_cache import AIResponseCache
+from ai_client import AIClient
+from ai_features import chat
+from mock_server import MockAIServer, mock_reply
+
+
+def serve(test, **options):
+    """启动一个模拟服务，执行 test(服务, 后端) 协程后关闭"""
+    async def main():
+        server = MockAIServer(latency=0, tokens_per_second=0, **options)
+        await server.start()
+        client = AIClient()
+        backend = OpenAICompatibleBackend({"backend": "openai", "api_url": server.url, "model": "m",
+                                           "max_concurrency": 8}, client)
+        try:
+            return await test(server, backend)
+        finally:
+            await client.close_session()
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_mock_reply_is_deterministic():
+    assert mock_reply("同一个问题", 20) == mock_reply("同一个问题", 20)
+    assert mock_reply("同一个问题", 20) != mock_reply("另一个问题", 20)
+    assert len(mock_reply("问题", 5)) == 5
+
+
+def test_streaming_round_trip():
+    async def test(server, backend):
+        deltas = []
+        response = await backend.chat("总结这一章", deltas.append, max_tokens=12)
+        assert response == "".join(mock_reply("总结这一章", 12))
+        assert "".join(deltas) == response and len(deltas) == 12
+        assert server.stats["requests"] == 1 and server.stats["active"] == 0
+
+    serve(test, response_tokens=32)
+
+
+def test_server_limits_concurrent_requests():
+    async def test(server, backend):
+        responses = await asyncio.gather(*[backend.chat(f"问题{i}") for i in range(10)])
+        assert responses == ["".join(mock_reply(f"问题{i}", 8)) for i in range(10)]
+        assert server.stats["requests"] == 10
+        assert server.stats["peak"] <= 3
+
+    serve(test, response_tokens=8, max_concurrency=3)
+
+
+def test_unknown_path_is_an_error():
+    async def test(server, backend):
+        backend.api_url = server.url.replace("/chat/completions", "/models")
+        with pytest.raises(ValueError, match="404"):
+            await backend.chat("问题")
+        lines = [line async for line in backend.client.post_lines(server.url, json.dumps({}).encode())]
+        assert "data: [DONE]" in lines
+
+    serve(test)
+
+
+def test_chat_answers_repeated_prompts_from_cache(tmp_path):
+    cache = AIResponseCache(str(tmp_path / "ai_cache.db"))
+
+    async def test(server, backend):
+        first = await chat(backend, "缓存的问题", cache=cache)
+        second = await chat(backend, "缓存的问题", cache=cache)
+        assert first == (second[0], False) and second[1] is True
+        assert server.stats["requests"] == 1
+
+    serve(test)
+
+
+def test_create_backend_rejects_unknown_type():
+    with pytest.raises(ValueError, match="未知的AI后端类型"):
+        create_backend({"backend": "foo"}, AIClient())
+    assert isinstance(create_backend({"backend": "openai"}, AIClient()), OpenAICompatibleBackend)
@@ -0,0 +1,97 @@
+import numpy as np
+from chapter_text import ChapterTextCache
+from passage_index import PassageIndex, hash_features, split_passages
+
+CHAPTERS = {
+    "c1.html": "<p>慈禧太后在颐和园里听戏，身边的太监李莲英小心伺候。</p><p>园中的昆明湖风景很好。</p>",
+    "c2.html": "<p>北洋水师在甲午海战中全军覆没，邓世昌驾驶致远舰撞向敌舰。</p>",
+    "c3.html": "<p>戊戌变法只维持了一百零三天，康有为和梁启超出逃海外。</p>",
+}
+
+
+def test_split_passages_cuts_at_sentence_ends_within_limit():
+    text = "第一句话。第二句话！" + "长" * 25 + "。"
+    spans = split_passages(text, max_chars=12)
+    assert all(length <= 12 for _, length in spans)
+    assert "".join(text[offset:offset + length] for offset, length in spans) == text
+    assert text[spans[0][0]:spans[0][0] + spans[0][1]] == "第一句话。第二句话！"
+    assert split_passages("   ") == []
+
+
+def test_hash_features_is_stable():
+    buckets, signs = hash_features("慈禧太后", 64)
+    again, again_signs = hash_features("慈禧太后", 64)
+    assert sorted(buckets) == sorted(again)
+    assert len(buckets) == 3 and buckets.max() < 64
+    assert set(np.unique(signs)) <= {-1.0, 1.0}
+
+
+def build(tmp_path, source):
+    index = PassageIndex(str(tmp_path / "passages"), ChapterTextCache())
+    index.build(source, sorted(CHAPTERS))
+    return index
+
+
+def test_retrieve_ranks_the_relevant_passage_first(tmp_path, make_book):
+    source = make_book(CHAPTERS)
+    index = build(tmp_path, source)
+    assert index.ready.is_set()
+
+    href, text, score = index.retrieve("甲午海战中的致远舰", top_k=2)[0]
+    assert href == "c2.html" and "邓世昌" in text and 0 < score <= 1.001
+
+    [(href, text, _)] = index.retrieve("戊戌变法", top_k=1)
+    assert href == "c3.html" and text.startswith("戊戌变法")
+
+    assert index.search("") == []
+
+
+def test_index_is_reused_until_a_chapter_changes(tmp_path, make_book):
+    source = make_book(CHAPTERS)
+    build(tmp_path, source)
+    signatures = {href: source.signature(href) for href in CHAPTERS}
+
+    reloaded = PassageIndex(str(tmp_path / "passages"), ChapterTextCache())
+    assert reloaded.load(signatures)
+    reloaded.source = source
+    assert reloaded.retrieve("颐和园听戏")[0][0] == "c1.html"
+
+    source = make_book({"c3.html": "<p>改写后的章节。</p>"})
+    signatures["c3.html"] = source.signature("c3.html")
+    assert not PassageIndex(str(tmp_path / "passages"), ChapterTextCache()).load(signatures)
+
+
+def test_rebuild_only_vectorizes_changed_chapters(tmp_path, make_book, monkeypatch):
+    import passage_index
+    source = make_book(CHAPTERS)
+    build(tmp_path, source)
+
+    rewritten = {"c3.html": "<p>戊戌变法失败后，光绪皇帝被囚禁在瀛台。</p>"}
+    changed = dict(CHAPTERS, **rewritten)
+    source = make_book(rewritten)
+    hashed = []
+    real_hash = passage_index.hash_features
+    monkeypatch.setattr(passage_index, "hash_features",
+                        lambda text, dim=passage_index.VECTOR_DIM: hashed.append(text) or real_hash(text, dim))
+    index = build(tmp_path, source)
+    assert hashed and all("瀛台" in text for text in hashed)
+
+    fresh = PassageIndex(str(tmp_path / "fresh"), ChapterTextCache())
+    fresh.build(source, sorted(changed))
+    for question in ("光绪皇帝瀛台", "颐和园听戏"):
+        assert [(href, round(score, 3)) for href, _, score in index.retrieve(question)] == \
+            [(href, round(score, 3)) for href, _, score in fresh.retrieve(question)]
+
+
+def test_failed_rebuild_leaves_no_temp_files(tmp_path, make_book, monkeypatch):
+    import json
+    import os
+    source = make_book(CHAPTERS)
+    monkeypatch.setattr(json, "dump", lambda *args, **kwargs: (_ for _ in ()).throw(OSError("disk full")))
+    index = PassageIndex(str(tmp_path / "passages"), ChapterTextCache())
+    try:
+        index.build(source, sorted(CHAPTERS))
+    except OSError:
+        pass
+    assert index.ready.is_set()
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
@@ -0,0 +1,105 @@
+import json
+from chapter_text import ChapterTextCache
+from search_index import SearchIndex, query_terms, tokenize
+
+
+def test_tokenize_cjk_bigrams_and_latin_words():
+    assert tokenize("慈禧太后") == {"慈禧", "禧太", "太后"}
+    assert tokenize("天 Hello, World 2024") == {"天", "hello", "world", "2024"}
+
+
+def test_query_terms_edge_words_are_partial():
+    exact, partial = query_terms("慈禧太后")
+    assert exact == {"慈禧", "禧太", "太后"} and partial == set()
+
+    # 查询边缘的拉丁词可能只是文档中某个词的一部分，中间被截断的词必然完整
+    exact, partial = query_terms("ab cd ef")
+    assert exact == {"cd"}
+    assert partial == {"ab", "ef"}
+
+    assert query_terms("后") == (set(), {"后"})
+
+
+def chapters():
+    return {
+        "c1.html": "<p>咸丰皇帝驾崩于热河。</p>",
+        "c2.html": "<p>慈禧太后垂帘听政。</p><p>咸丰皇帝的遗诏。</p>",
+        "c3.html": "<p>Hello world, hello again.</p>",
+    }
+
+
+def build(index_path, source):
+    index = SearchIndex(str(index_path), ChapterTextCache())
+    index.build(source, sorted(chapters()))
+    return index
+
+
+def test_search_finds_exact_spans_in_chapter_order(tmp_path, make_book):
+    source = make_book(chapters())
+    index = build(tmp_path / "index.json", source)
+
+    results = index.search("咸丰皇帝", chapter_order=["c2.html", "c1.html"])
+    assert [name for name, _, _ in results] == ["c2.html", "c1.html"]
+    for name, text, spans in results:
+        assert [text[start:end] for start, end in spans] == ["咸丰皇帝"]
+
+    # 不区分大小写，同一章的多个命中都返回
+    [(name, text, spans)] = index.search("HELLO")
+    assert name == "c3.html" and len(spans) == 2
+
+    # 二元组都在但并不相邻的词不算命中
+    assert index.search("皇帝太后") == []
+
+
+def test_partial_query_matches_inside_words(tmp_path, make_book):
+    index = build(tmp_path / "index.json", make_book(chapters()))
+    assert [name for name, _, _ in index.search("ell")] == ["c3.html"]
+
+
+def test_saved_index_has_no_chapter_text_and_reloads(tmp_path, make_book):
+    source = make_book(chapters())
+    index_path = tmp_path / "index.json"
+    build(index_path, source)
+
+    data = json.loads(index_path.read_text(encoding='utf-8'))
+    assert all(set(chapter) == {"name", "sig"} for chapter in data["chapters"])
+    assert "垂帘听政" not in index_path.read_text(encoding='utf-8')
+
+    reloaded = build(index_path, source)
+    assert [name for name, _, _ in reloaded.search("垂帘听政")] == ["c2.html"]
+    assert reloaded.text_of("c1.html") == "咸丰皇帝驾崩于热河。"
+    assert reloaded.text_of("c1.html", sig=["旧签名"]) is None
+    assert reloaded.text_of("missing.html") is None
+
+
+def test_update_reindexes_changed_and_removes_missing_chapters(tmp_path, make_book):
+    source = make_book(chapters())
+    index = build(tmp_path / "index.json", source)
+
+    source = make_book({"c1.html": "<p>同治皇帝即位，年纪尚幼。</p>"})
+    assert index.update(source, ["c1.html", "c2.html"])
+    assert [name for name, _, _ in index.search("咸丰皇帝")] == ["c2.html"]
+    assert [name for name, _, _ in index.search("同治")] == ["c1.html"]
+    assert index.search("hello") == []
+    assert "hello" not in index.postings
+
+    # 没有变化时不重建
+    assert not index.update(source, ["c1.html", "c2.html"])
+
+
+def test_reindexing_keeps_chapter_slots_compact(tmp_path, make_book):
+    source = make_book(chapters())
+    index_path = tmp_path / "index.json"
+    index = build(index_path, source)
+
+    for reign in ("同治", "光绪", "宣统"):
+        source = make_book({"c1.html": f"<p>{reign}皇帝即位。</p>"})
+        assert index.update(source, sorted(chapters()))
+        assert [name for name, _, _ in index.search(reign)] == ["c1.html"]
+    assert index.update(source, ["c1.html", "c2.html"])
+
+    assert sorted(chapter["name"] for chapter in index.chapters) == ["c1.html", "c2.html"]
+    assert {chapter_id for ids in index.postings.values() for chapter_id in ids} == {0, 1}
+    assert [name for name, _, _ in index.search("垂帘听政")] == ["c2.html"]
+    index.save()
+    assert len(json.loads(index_path.read_text(encoding='utf-8'))["chapters"]) == 2
@@ -0,0 +1,44 @@
+import os
+import sys
+import pytest
+from tts_engines import EspeakTTS
+
+# 代替 espeak-ng 的脚本：读完标准输入后输出WAV文件头和每个字 4096 字节的PCM
+FAKE_ESPEAK = f"""#!{sys.executable}
+import sys
+text = sys.stdin.buffer.read().decode('utf-8').strip()
+header = b'RIFF' + bytes(20) + (22050).to_bytes(4, 'little') + bytes(16)
+sys.stdout.buffer.write(header + b'\\x01\\x00' * 2048 * len(text))
+"""
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="需要可直接执行的脚本")
+
+
+@pytest.fixture
+def espeak(tmp_path):
+    path = tmp_path / "espeak-ng"
+    path.write_text(FAKE_ESPEAK, encoding='utf-8')
+    path.chmod(0o755)
+    return EspeakTTS(executable=str(path))
+
+
+def test_returns_pcm_without_header(espeak):
+    assert espeak.text_to_speech("你好") == b'\x01\x00' * 4096
+
+
+def test_streams_audio_to_callback(espeak):
+    chunks = []
+    assert espeak.text_to_speech("你好呀", on_audio=chunks.append) == b''
+    assert len(b''.join(chunks)) == 3 * 4096
+
+
+def test_stop_from_callback_raises_instead_of_returning_partial_audio(espeak):
+    received = []
+
+    def on_audio(chunk):
+        received.append(chunk)
+        return False
+
+    with pytest.raises(Exception, match="未完成"):
+        espeak.text_to_speech("很长的一段文字" * 20, on_audio=on_audio)
+    assert len(received) == 1
@@ -0,0 +1,78 @@
+import threading
+import time
+import pytest
+from tts_pool import RateLimiter, TTSClientPool
+
+
+class FakeTTS:
+    """按文本长度返回音频、记录并发数的引擎"""
+    vcn = "fake"
+    aue = "raw"
+    sample_rate = 16000
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def text_to_speech(self, text, on_audio=None):
+        with FakeTTS.lock:
+            FakeTTS.active += 1
+            FakeTTS.peak = max(FakeTTS.peak, FakeTTS.active)
+        try:
+            # 文本越短完成得越快，打乱完成顺序
+            time.sleep(0.002 * (10 - len(text) % 10))
+            if text == "坏":
+                raise Exception("合成失败")
+            return text.encode('utf-8')
+        finally:
+            with FakeTTS.lock:
+                FakeTTS.active -= 1
+
+    def cancel(self):
+        pass
+
+
+def test_rate_limiter_spaces_out_requests():
+    limiter = RateLimiter(100)
+    starts = []
+    for _ in range(5):
+        limiter.wait()
+        starts.append(time.monotonic())
+    assert starts[-1] - starts[0] >= 0.035
+
+    unlimited = RateLimiter(0)
+    start = time.monotonic()
+    for _ in range(100):
+        unlimited.wait()
+    assert time.monotonic() - start < 0.05
+
+
+def test_rate_limiter_reserve_returns_the_delay():
+    limiter = RateLimiter(10)
+    delays = [limiter.reserve() for _ in range(3)]
+    assert delays[0] <= 0
+    assert 0.09 < delays[1] <= 0.1 and 0.19 < delays[2] <= 0.2
+    assert RateLimiter(0).reserve() <= 0
+
+
+def test_map_ordered_keeps_input_order_within_concurrency():
+    FakeTTS.peak = 0
+    pool = TTSClientPool(FakeTTS, max_concurrency=3, max_qps=0)
+    texts = ["第" * (i + 1) for i in range(12)]
+    assert list(pool.map_ordered(texts)) == [text.encode('utf-8') for text in texts]
+    assert 1 < FakeTTS.peak <= 3
+    assert pool.vcn == "fake" and pool.sample_rate == 16000
+
+
+def test_map_ordered_raises_on_failure():
+    pool = TTSClientPool(FakeTTS, max_concurrency=2, max_qps=0)
+    results = pool.map_ordered(["好", "坏", "好"])
+    assert next(results) == "好".encode('utf-8')
+    with pytest.raises(Exception, match="合成失败"):
+        next(results)
+
+
+def test_closed_pool_refuses_new_sessions():
+    pool = TTSClientPool(FakeTTS, max_concurrency=1, max_qps=0)
+    pool.close()
+    with pytest.raises(Exception, match="已关闭"):
+        pool.synthesize("文本")
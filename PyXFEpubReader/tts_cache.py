@@ -0,0 +1,39 @@
+import hashlib
+import json
+import zlib
+from caches import DiskCache
+
+
+class TTSAudioCache:
+    """合成语音的磁盘缓存：以文本和发音参数的哈希为键，保存 zlib 压缩后的PCM数据"""
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        """初始化缓存，max_bytes 为磁盘占用上限，超出后按最近使用时间淘汰"""
+        self.disk = DiskCache(cache_dir, max_bytes)
+
+    @staticmethod
+    def key_of(text, vcn, sample_rate, aue):
+        """由文本、发音人、采样率和音频编码生成缓存键"""
+        payload = json.dumps([text, vcn, sample_rate, aue], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def key_for_client(cls, text, tts_client):
+        """按合成客户端当前的发音参数生成缓存键"""
+        return cls.key_of(text, tts_client.vcn, tts_client.sample_rate, tts_client.aue)
+
+    def get(self, key):
+        """读取缓存的音频，不存在或已损坏时返回 None"""
+        data = self.disk.get(key)
+        if data is None:
+            return None
+        try:
+            return zlib.decompress(data)
+        except zlib.error as e:
+            print(f"语音缓存已损坏: {e}")
+            return None
+
+    def put(self, key, audio_data):
+        """压缩后写入缓存"""
+        if audio_data:
+            self.disk.put(key, zlib.compress(audio_data, 6))
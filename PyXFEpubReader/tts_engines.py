@@ -0,0 +1,113 @@
+import shutil
+import subprocess
+import threading
+
+
+class TTSEngine:
+    """语音合成引擎接口
+
+    text_to_speech(text, on_audio) 合成16位单声道PCM：传入 on_audio 时每段音频随到随交出（返回 False 表示停止），
+    否则返回完整音频。vcn、aue、sample_rate 描述输出音频，同时用作语音缓存键。
+    """
+    vcn = ""
+    aue = "raw"
+    sample_rate = 16000
+
+    def text_to_speech(self, text, on_audio=None):
+        """合成语音"""
+        raise NotImplementedError
+
+    def cancel(self):
+        """中断正在进行的合成"""
+
+
+class EspeakTTS(TTSEngine):
+    """离线语音引擎：通过子进程调用本机的 espeak-ng，不需要网络"""
+    aue = "raw"
+    sample_rate = 22050
+
+    # WAV 文件头长度，espeak-ng --stdout 输出的是不带长度信息的标准文件头
+    WAV_HEADER_BYTES = 44
+
+    def __init__(self, voice="cmn", speed=175, executable=None):
+        """voice 为 espeak-ng 的语音名，speed 为每分钟词数"""
+        self.voice = voice
+        self.speed = speed
+        self.executable = executable or shutil.which("espeak-ng") or shutil.which("espeak")
+        # 缓存键中区分引擎、语音和语速
+        self.vcn = f"espeak-ng/{voice}/{speed}"
+        self.process = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def text_to_speech(self, text, on_audio=None):
+        """调用 espeak-ng 把文本合成为PCM，边读子进程输出边交给 on_audio"""
+        if not self.executable:
+            raise Exception("未找到 espeak-ng，请先安装离线语音引擎")
+
+        audio_data = bytearray()
+        stopped = False
+        with self.lock:
+            self.cancelled = False
+            self.process = subprocess.Popen(
+                [self.executable, "--stdout", "-b", "1", "-v", self.voice, "-s", str(self.speed)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+            )
+            process = self.process
+
+        try:
+            # 文本通过标准输入传入，避免命令行长度限制和参数转义问题
+            writer = threading.Thread(target=self._write_text, args=(process, text), daemon=True)
+            writer.start()
+
+            header = process.stdout.read(self.WAV_HEADER_BYTES)
+            if len(header) == self.WAV_HEADER_BYTES and header[:4] == b'RIFF':
+                rate = int.from_bytes(header[24:28], 'little')
+                if rate != self.sample_rate:
+                    print(f"espeak-ng 输出采样率为 {rate}，与预期的 {self.sample_rate} 不符")
+
+            while True:
+                chunk = process.stdout.read(4096)
+                if not chunk:
+                    break
+                if on_audio is not None:
+                    if on_audio(chunk) is False:
+                        stopped = True
+                        process.kill()
+                        break
+                else:
+                    audio_data.extend(chunk)
+
+            process.wait()
+            writer.join()
+            if self.cancelled:
+                raise Exception("语音合成已取消")
+            # 与讯飞引擎一致：接收方中途停止时不返回残缺的音频，避免被当作完整结果缓存
+            if stopped:
+                raise Exception("语音合成未完成")
+            if process.returncode != 0:
+                error = process.stderr.read().decode('utf-8', errors='replace').strip()
+                raise Exception(f"espeak-ng 运行失败({process.returncode}): {error}")
+            return bytes(audio_data)
+        finally:
+            with self.lock:
+                self.process = None
+            process.stdout.close()
+            process.stderr.close()
+
+    @staticmethod
+    def _write_text(process, text):
+        """把待合成的文本写入子进程的标准输入"""
+        try:
+            process.stdin.write(text.encode('utf-8'))
+            process.stdin.close()
+        except OSError:
+            pass
+
+    def cancel(self):
+        """结束正在运行的 espeak-ng 进程"""
+        with self.lock:
+            if self.process is not None:
+                self.cancelled = True
+                self.process.kill()
@@ -0,0 +1,135 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RateLimiter:
+    """按每秒请求数限制请求的发起时间，多个线程共享"""
+
+    def __init__(self, max_qps):
+        """max_qps 为 0 或 None 时不限速"""
+        self.interval = 1.0 / max_qps if max_qps else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """预约下一个可用的发起时间，返回距那一刻还需等待的秒数；线程和协程共用"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        return start - now
+
+    def wait(self):
+        """预约下一个可用的发起时间并等待到那一刻"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class TTSClientPool:
+    """线程安全的语音引擎池：每个引擎实例同一时间只服务一个合成会话
+
+    同时进行的会话数不超过 max_concurrency，会话发起频率不超过 max_qps；
+    map_ordered() 并发合成一组文本并按输入顺序返回音频。
+    """
+
+    def __init__(self, tts_factory, max_concurrency=3, max_qps=3.0, name=""):
+        """tts_factory 用于按需创建引擎实例，name 为引擎名称"""
+        self.tts_factory = tts_factory
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.limiter = RateLimiter(max_qps)
+        self._idle = [tts_factory()]
+        self._busy = {}         # 引擎实例 -> 使用者
+        self._created = 1
+        self._closed = False
+        self._condition = threading.Condition()
+        # 第一个实例同时用来描述输出音频的参数
+        self.prototype = self._idle[0]
+
+    @property
+    def vcn(self):
+        return self.prototype.vcn
+
+    @property
+    def aue(self):
+        return self.prototype.aue
+
+    @property
+    def sample_rate(self):
+        return self.prototype.sample_rate
+
+    def acquire(self, owner=None):
+        """取得一个空闲的引擎实例，已达并发上限时等待"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._closed or self._idle or self._created < self.max_concurrency)
+            if self._closed:
+                raise Exception("语音引擎池已关闭")
+            if self._idle:
+                client = self._idle.pop()
+            else:
+                self._created += 1
+                client = None
+        if client is None:
+            try:
+                client = self.tts_factory()
+            except Exception:
+                with self._condition:
+                    self._created -= 1
+                    self._condition.notify()
+                raise
+        with self._condition:
+            self._busy[client] = owner
+        return client
+
+    def release(self, client):
+        """归还引擎实例"""
+        with self._condition:
+            self._busy.pop(client, None)
+            self._idle.append(client)
+            self._condition.notify()
+
+    def synthesize(self, text, on_audio=None, owner=None):
+        """用池中的一个实例合成文本，owner 用于之后按使用者取消"""
+        client = self.acquire(owner)
+        try:
+            self.limiter.wait()
+            return client.text_to_speech(text, on_audio=on_audio)
+        finally:
+            self.release(client)
+
+    def map_ordered(self, texts, owner=None):
+        """并发合成 texts 中的每段文本，按输入顺序逐个产出音频；任一段失败时抛出异常
+
+        已完成但尚未取走的结果最多保留 2 * max_concurrency 个。
+        """
+        texts = list(texts)
+        window = self.max_concurrency * 2
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="tts-pool")
+        futures = {}
+        try:
+            for index in range(len(texts)):
+                for ahead in range(index, min(index + window, len(texts))):
+                    if ahead not in futures:
+                        futures[ahead] = executor.submit(self.synthesize, texts[ahead], None, owner)
+                yield futures.pop(index).result()
+        finally:
+            self.cancel(owner)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def cancel(self, owner):
+        """中断某个使用者正在进行的全部合成"""
+        with self._condition:
+            clients = [client for client, client_owner in self._busy.items() if client_owner is owner]
+        for client in clients:
+            client.cancel()
+
+    def close(self):
+        """关闭引擎池，中断所有正在进行的合成"""
+        with self._condition:
+            self._closed = True
+            clients = list(self._busy)
+            self._condition.notify_all()
+        for client in clients:
+            client.cancel()
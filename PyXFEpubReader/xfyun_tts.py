@@ -12,9 +12,16 @@ from datetime import datetime
 from time import mktime
 import _thread as thread
 import threading
+from tts_engines import TTSEngine
 
 
-class XFYunTTS:
+class XFYunTTS(TTSEngine):
+    """讯飞在线语音合成，通过 WebSocket 接口边合成边返回音频帧"""
+    # 发音人、音频编码和采样率，同时也是音频缓存键的一部分
+    vcn = "x4_yezi"
+    aue = "raw"
+    sample_rate = 16000
+
     def __init__(self, APPID, APIKey, APISecret):
         """初始化TTS引擎，设置API凭证"""
         self.APPID = APPID
@@ -28,6 +35,8 @@ class XFYunTTS:
         self.connection_timeout = 10
         self.sid = None
         self._close_event = threading.Event()
+        # 流式模式下每收到一帧音频就调用的回调，返回 False 表示接收方已停止
+        self.on_audio = None
 
     def create_url(self):
         """生成带鉴权的WebSocket连接URL"""
@@ -69,8 +78,16 @@ class XFYunTTS:
             audio = message["data"]["audio"]
             status = message["data"]["status"]
 
+            chunk = base64.b64decode(audio)
+            if self.on_audio is not None:
+                # 流式模式：音频帧直接交给接收方，不在内存中累积
+                if chunk and self.on_audio(chunk) is False:
+                    ws.close()
+                    return
+                chunk = b''
+
             with self.lock:
-                self.audio_data.extend(base64.b64decode(audio))
+                self.audio_data.extend(chunk)
                 if status == 2:  # 最后一帧
                     self.is_finished = True
                     ws.close()
@@ -92,9 +109,9 @@ class XFYunTTS:
         def run(*args):
             common_args = {"app_id": self.APPID}
             business_args = {
-                "aue": "raw",
-                "auf": "audio/L16;rate=16000",
-                "vcn": "x4_yezi",
+                "aue": self.aue,
+                "auf": f"audio/L16;rate={self.sample_rate}",
+                "vcn": self.vcn,
                 "tte": "utf8"
             }
             data = {
@@ -111,9 +128,22 @@ class XFYunTTS:
 
         thread.start_new_thread(run, ())
 
-    def text_to_speech(self, text):
-        """主接口：将文本转换为语音并返回音频数据"""
+    def cancel(self):
+        """关闭正在进行合成的连接"""
+        ws = self.ws
+        if ws:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def text_to_speech(self, text, on_audio=None):
+        """主接口：将文本转换为语音并返回音频数据
+
+        传入 on_audio 时为流式模式：每帧解码后的PCM数据随到随交给 on_audio，返回值为空字节。
+        """
         self.current_text = text
+        self.on_audio = on_audio
         self.audio_data = bytearray()
         self.is_finished = False
         self.error_message = None
@@ -154,4 +184,5 @@ class XFYunTTS:
                 self.ws.close()
             raise
         finally:
-            self.ws = None
\ No newline at end of file
+            self.ws = None
+            self.on_audio = None
\ No newline at end of file